@@ -9,45 +9,125 @@ import sys
 import sqlite3
 import json
 import logging
-import requests
+import math
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
 import threading
 import time
+import uuid
+
+from startup import Startup, PROCESS_STARTED, WARMING, FAILED, lazy_import
+
+# requests takes ~100 ms to import and isn't needed until the first Grott call
+requests = lazy_import('requests')
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from apscheduler.triggers.date import DateTrigger
 import pytz
 
+from fire_calendar import FireCalendar, CalendarTrigger, is_valid_timezone
+from dynamic_times import DynamicTimes, DYNAMIC_TYPES
+from conditions import compile_condition, legacy_expression, format_terms, ConditionError
+from register_events import RegisterEvents
+from device_workers import DeviceWorkers, DeviceQueueFull
+from circuit_breaker import CircuitBreakers
+from command_journal import CommandJournal
+from notifications import Notifier, PushoverTransport
+from logging_setup import LogSetup, correlation, parse_levels, is_valid_level, invalid_levels
+from tracing import tracing, span, current_trace, unpack, summarize, GROTT, DB, WAIT, CODE
+from migrations import Migrator
+from codec import CodecError, RegisterFormat, DECIMAL, encode, decode, encode_block, decode_block
+from register_catalog import RegisterCatalog, RegisterInfo
+from delta_sync import DeltaSync
+from streaming import stream_records
+from simulator import ScheduleSimulator, RunPlan, Request, MAX_DAYS
+from write_index import WriteIndex
+from custom_commands import CustomCommands, CustomCommandError
+
+Startup.record('imports', PROCESS_STARTED)
+
 # Configuration
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATABASE_PATH = os.path.join(BASE_DIR, '..', 'database', 'scheduler.db')
+SCHEMA_FILE = os.path.join(BASE_DIR, '..', 'database', 'schema.sql')
 LOG_FILE = os.path.join(BASE_DIR, '..', 'logs', 'scheduler.log')
 
-# Ensure logs directory exists
-os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(LOG_FILE),
-        logging.StreamHandler(sys.stdout)
-    ]
-)
+# Logging is set up by main() (records are queued and written by a listener thread);
+# configure_logging() applies the format, rotation and per-subsystem levels from config
 logger = logging.getLogger('grott-scheduler')
 
 # Flask app
 app = Flask(__name__)
 CORS(app)  # Enable CORS for Node-RED integration
 
-# Scheduler
+# Scheduler, started by start_scheduler() once configuration is loaded
 scheduler = BackgroundScheduler(timezone=pytz.timezone('UTC'))
-scheduler.start()
+
+# Registers that the inverter only accepts as a complete block write
+REGISTER_BLOCKS = [(1070, 1088), (1090, 1108)]
+
+# Round-trips avoided by skip-if-unchanged since startup
+suppression_metrics = {'writes_suppressed': 0, 'verify_reads': 0, 'registers_not_resent': 0}
+suppression_lock = threading.Lock()
+
+# Schedules fired by register changes rather than by time
+EVENT_SCHEDULE_TYPE = 'event'
+
+# Columns that decide when (or on which inverter's events) a schedule fires; other fields are
+# read from the database at execution time, so changing them needs no rescheduling
+TIMING_FIELDS = (
+    'enabled', 'schedule_type', 'time', 'days_of_week', 'specific_date', 'timezone',
+    'offset_minutes', 'window_minutes', 'inverter_serial',
+    'trigger_expression', 'trigger_hysteresis', 'trigger_debounce_seconds'
+)
+
+# Numeric settings: key -> (type, default, minimum, maximum). PUT /api/config rejects values outside
+# these, and a bad value already stored falls back to the default rather than stopping startup
+NUMERIC_CONFIG = {
+    'max_retries': (int, 5, 1, None),
+    'retry_delay': (int, 10, 0, None),
+    'calendar_days': (int, 7, 1, None),
+    'conflict_window_minutes': (int, 5, 0, None),
+    'register_cache_seconds': (int, 30, 0, None),
+    'skip_unchanged_max_age': (int, 300, 0, None),
+    'verify_delay_seconds': (int, 2, 0, None),
+    'verify_retries': (int, 2, 0, None),
+    'event_poll_seconds': (int, 0, 0, None),
+    'device_queue_size': (int, 20, 1, None),
+    'device_workers': (int, 1, 1, None),
+    'custom_workers': (int, 2, 1, None),
+    'custom_queue_size': (int, 20, 1, None),
+    'custom_timeout': (float, 10, 1, 300),
+    'custom_max_output_kb': (int, 64, 1, None),
+    'custom_memory_mb': (int, 256, 16, None),
+    'circuit_window': (int, 10, 1, None),
+    'circuit_min_calls': (int, 4, 1, None),
+    'circuit_failure_threshold': (float, 0.5, 0.01, 1),
+    'circuit_open_seconds': (float, 30, 1, None),
+    'circuit_max_open_seconds': (float, 600, 1, None),
+    'circuit_requeue_max_age': (float, 3600, 0, None),
+    'circuit_probe_register': (int, 1044, 0, 65535),
+    'journal_commit_window_ms': (float, 5, 0, None),
+    'journal_replay_max_age': (float, 900, 0, None),
+    'journal_retention_days': (int, 7, 0, None),
+    'notify_batch_seconds': (float, 30, 0, None),
+    'notify_dedup_seconds': (float, 600, 0, None),
+    'notify_max_per_hour': (int, 6, 1, None),
+    'log_max_bytes': (int, 10 * 1024 * 1024, 0, None),
+    'log_backup_count': (int, 5, 0, None),
+    'log_sample_burst': (int, 20, 0, None),
+    'log_sample_seconds': (float, 10, 0, None),
+}
+
+# schedule_id -> timing fields the schedule is currently registered with
+registered_timing: Dict[int, tuple] = {}
+registration_lock = threading.RLock()
+
+# Inverters whose grottserver answered a multiregister read with something unusable, so their reads
+# use single registers; cleared when the inverter's circuit closes, as grottserver may have changed
+multiregister_unsupported = set()
 
 
 class Database:
@@ -62,17 +142,22 @@ class Database:
     
     @staticmethod
     def init_database():
-        """Initialize database with schema"""
-        schema_file = os.path.join(BASE_DIR, '..', 'database', 'schema.sql')
-        if os.path.exists(schema_file):
-            conn = Database.get_connection()
-            with open(schema_file, 'r') as f:
-                conn.executescript(f.read())
-            conn.commit()
+        """Apply pending schema migrations; large backfills continue in the background"""
+        if not os.path.exists(SCHEMA_FILE):
+            logger.error(f"Schema file not found: {SCHEMA_FILE}")
+            return
+        # WAL lets a streamed response keep its read transaction open while schedules still write;
+        # the mode is stored in the database file, so this only changes anything the first time
+        conn = Database.get_connection()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        finally:
             conn.close()
-            logger.info("Database initialized successfully")
-        else:
-            logger.error(f"Schema file not found: {schema_file}")
+        applied = schema_migrator.migrate()
+        RegisterCatalog.invalidate()
+        WriteIndex.invalidate()
+        schema_migrator.start_online()
+        logger.info(f"Database initialized successfully ({len(applied)} migrations applied)")
     
     @staticmethod
     def execute(query: str, params: tuple = ()) -> sqlite3.Cursor:
@@ -93,6 +178,20 @@ class Database:
         conn.close()
         return results
     
+    @staticmethod
+    def iterate(query: str, params: tuple = (), batch_size: int = 500) -> Iterator[sqlite3.Row]:
+        """Yield results as they are fetched from the cursor instead of loading them all"""
+        conn = Database.get_connection()
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            conn.close()
+    
     @staticmethod
     def fetch_one(query: str, params: tuple = ()) -> Optional[sqlite3.Row]:
         """Fetch one result"""
@@ -104,6 +203,13 @@ class Database:
         return result
 
 
+# Schema versions live in the schema_version table; see migrations.py
+schema_migrator = Migrator(Database.get_connection, SCHEMA_FILE)
+
+# Register metadata is served from memory; see register_catalog.py
+RegisterCatalog.attach(Database.get_connection, REGISTER_BLOCKS)
+
+
 class InverterCommand:
     """Handle inverter commands via Grott"""
     
@@ -113,6 +219,11 @@ class InverterCommand:
         rows = Database.fetch_all("SELECT key, value FROM config")
         return {row['key']: row['value'] for row in rows}
     
+    @staticmethod
+    def resolve_serial(inverter_serial: str = None) -> str:
+        """Inverter serial to use: the given one or the configured default"""
+        return inverter_serial or InverterCommand.get_config().get('inverter_serial', 'NTCRBLR00Y')
+    
     @staticmethod
     def execute_command(command_data: Dict, inverter_serial: str = None, max_retries: int = 5) -> Tuple[bool, str, int]:
         """
@@ -123,254 +234,661 @@ class InverterCommand:
         host = config.get('grott_host', '<grottserver>')
         port = config.get('grott_port', '5782')
         serial = inverter_serial or config.get('inverter_serial', 'NTCRBLR00Y')
-        max_retries = int(config.get('max_retries', max_retries))
-        retry_delay = int(config.get('retry_delay', 10))
+        max_retries = config_number(config, 'max_retries') if config.get('max_retries') else max_retries
+        retry_delay = config_number(config, 'retry_delay')
         
         base_url = f"http://{host}:{port}/inverter"
         
+        # Values that can't be valid are rejected before anything is sent or retried
+        error = validate_command(command_data)
+        if error:
+            logger.warning(f"Command not sent: {error}")
+            return False, error, 0
+        
+        # Custom commands don't go through Grott, so the Grott circuit doesn't apply
+        uses_grott = command_data.get('type') != 'custom'
+        if uses_grott and not CircuitBreakers.allow(serial):
+            logger.warning(f"Grott circuit open for {serial}, command not sent")
+            return False, f"Grott circuit open for {serial}", 0
+        
         for attempt in range(1, max_retries + 1):
             try:
                 if command_data['type'] == 'read':
                     # Read register value
                     url = f"{base_url}?command=register&inverter={serial}&register={command_data['register']}"
-                    response = requests.get(url, timeout=10)
+                    with span('grott_read', GROTT):
+                        response = requests.get(url, timeout=10)
                     
                     if response.status_code == 200:
+                        CircuitBreakers.record(serial, True)
                         try:
                             data = response.json()
                             value = data.get('value', 'N/A')
+                            if value != 'N/A':
+                                register_num = int(command_data['register'])
+                                value = decode(value, RegisterCatalog.formats([register_num])[register_num])
+                                RegisterEvents.publish(serial, {register_num: value})
                             logger.info(f"Read register {command_data['register']}: {value}")
                             return True, f"Register {command_data['register']} = {value}", attempt
                         except:
                             return True, response.text, attempt
-                    else:
-                        logger.warning(f"Attempt {attempt}/{max_retries} failed: {response.status_code} - {response.text}")
-                        if attempt < max_retries:
-                            time.sleep(retry_delay)
+                    # Failed reads are handled with the other responses below
                     
                 elif command_data['type'] == 'register':
                     # Single register write
                     register_num = command_data['register']
                     
-                    # Special handling: registers 1070-1088 must be written together
-                    if 1070 <= register_num <= 1088:
-                        logger.info(f"Register {register_num} is in range 1070-1088, using database values for multiregister write")
+                    # Registers in a block (1070-1088, 1090-1108) must be written together
+                    block = register_block(register_num)
+                    if block:
+                        start, end = block
+                        logger.debug(f"Register {register_num} is in range {start}-{end}, using database values for multiregister write")
                         try:
-                            # Get all register values and metadata from database
-                            register_values = {}
-                            register_metadata = {}
-                            for reg in range(1070, 1089):
-                                row = Database.fetch_one(
-                                    """SELECT rv.current_value, r.type, r.value_type 
-                                       FROM register_values rv
-                                       LEFT JOIN registers r ON rv.register_number = r.register_number
-                                       WHERE rv.register_number = ?""",
-                                    (reg,)
-                                )
-                                if row:
-                                    register_values[reg] = row['current_value'] if row['current_value'] is not None else 0
-                                    register_metadata[reg] = {'type': row['type'], 'value_type': row['value_type']}
-                                else:
-                                    register_values[reg] = 0
-                                    register_metadata[reg] = {'type': 0, 'value_type': 'decimal'}
-                            
-                            # Update the target register with new value
-                            register_values[register_num] = command_data['value']
-                            
-                            # Update database with new value
-                            Database.execute(
-                                """INSERT OR REPLACE INTO register_values 
-                                   (register_number, current_value, last_updated) 
-                                   VALUES (?, ?, CURRENT_TIMESTAMP)""",
-                                (register_num, command_data['value'])
-                            )
+                            with span('block_payload', DB, block=f'{start}-{end}'):
+                                hex_values = InverterCommand.block_payload(serial, start, end, register_num, command_data['value'])
                             
-                            # Build hex value string for multiregister write
-                            # Handle time conversion: if type=hex (0) and value_type=time, convert HHmm to (HH*256+mm)
-                            hex_parts = []
-                            for reg in range(1070, 1089):
-                                value = int(register_values[reg])
-                                metadata = register_metadata[reg]
-                                
-                                # Convert time format if needed
-                                if metadata['type'] == 0 and metadata['value_type'] == 'time':
-                                    # Value is stored as HHmm (e.g., 1915), convert to (HH*256 + mm)
-                                    hours = value // 100
-                                    minutes = value % 100
-                                    value = (hours * 256) + minutes
-                                
-                                hex_parts.append(f"{value:04x}")
-                            
-                            hex_values = ''.join(hex_parts)
-                            
-                            logger.info(f"Writing all registers 1070-1088 with {register_num}={command_data['value']} (hex: {hex_values})")
-                            url = f"{base_url}?command=multiregister&inverter={serial}&startregister=1070&endregister=1088&value={hex_values}"
-                            response = requests.put(url, timeout=30)
+                            logger.info(f"Writing all registers {start}-{end} with {register_num}={command_data['value']}")
+                            logger.debug(f"Registers {start}-{end} payload: {hex_values}")
+                            url = f"{base_url}?command=multiregister&inverter={serial}&startregister={start}&endregister={end}&value={hex_values}"
+                            with span('grott_write', GROTT):
+                                response = requests.put(url, timeout=30)
                             
+                        except CodecError as e:
+                            return False, f"Invalid value for registers {start}-{end}: {str(e)}", attempt
                         except Exception as e:
-                            logger.error(f"Error handling registers 1070-1088: {str(e)}")
+                            logger.error(f"Error handling registers {start}-{end}: {str(e)}")
                             # Fall back to simple single register write
                             url = f"{base_url}?command=register&inverter={serial}&register={register_num}&value={command_data['value']}"
-                            response = requests.put(url, timeout=30)
+                            with span('grott_write', GROTT):
+                                response = requests.put(url, timeout=30)
                     
-                    # Special handling: registers 1090-1108 must be written together
-                    elif 1090 <= register_num <= 1108:
-                        logger.info(f"Register {register_num} is in range 1090-1108, using database values for multiregister write")
+                    else:
+                        # Normal single register write, in the register's wire format
                         try:
-                            # Get all register values and metadata from database
-                            register_values = {}
-                            register_metadata = {}
-                            for reg in range(1090, 1109):
-                                row = Database.fetch_one(
-                                    """SELECT rv.current_value, r.type, r.value_type 
-                                       FROM register_values rv
-                                       LEFT JOIN registers r ON rv.register_number = r.register_number
-                                       WHERE rv.register_number = ?""",
-                                    (reg,)
-                                )
-                                if row:
-                                    register_values[reg] = row['current_value'] if row['current_value'] is not None else 0
-                                    register_metadata[reg] = {'type': row['type'], 'value_type': row['value_type']}
-                                else:
-                                    register_values[reg] = 0
-                                    register_metadata[reg] = {'type': 0, 'value_type': 'decimal'}
-                            
-                            # Update the target register with new value
-                            register_values[register_num] = command_data['value']
-                            
-                            # Update database with new value
-                            Database.execute(
-                                """INSERT OR REPLACE INTO register_values 
-                                   (register_number, current_value, last_updated) 
-                                   VALUES (?, ?, CURRENT_TIMESTAMP)""",
-                                (register_num, command_data['value'])
-                            )
-                            
-                            # Build hex value string for multiregister write
-                            # Handle time conversion: if type=hex (0) and value_type=time, convert HHmm to (HH*256+mm)
-                            hex_parts = []
-                            for reg in range(1090, 1109):
-                                value = int(register_values[reg])
-                                metadata = register_metadata[reg]
-                                
-                                # Convert time format if needed
-                                if metadata['type'] == 0 and metadata['value_type'] == 'time':
-                                    # Value is stored as HHmm (e.g., 1915), convert to (HH*256 + mm)
-                                    hours = value // 100
-                                    minutes = value % 100
-                                    value = (hours * 256) + minutes
-                                
-                                hex_parts.append(f"{value:04x}")
-                            
-                            hex_values = ''.join(hex_parts)
-                            
-                            logger.info(f"Writing all registers 1090-1108 with {register_num}={command_data['value']} (hex: {hex_values})")
-                            url = f"{base_url}?command=multiregister&inverter={serial}&startregister=1090&endregister=1108&value={hex_values}"
-                            response = requests.put(url, timeout=30)
-                            
-                        except Exception as e:
-                            logger.error(f"Error handling registers 1090-1108: {str(e)}")
-                            # Fall back to simple single register write
-                            url = f"{base_url}?command=register&inverter={serial}&register={register_num}&value={command_data['value']}"
+                            word = encode(command_data['value'], RegisterCatalog.formats([register_num])[register_num])
+                        except CodecError as e:
+                            return False, f"Invalid value for register {register_num}: {str(e)}", attempt
+                        url = f"{base_url}?command=register&inverter={serial}&register={register_num}&value={word}"
+                        with span('grott_write', GROTT):
                             response = requests.put(url, timeout=30)
                     
-                    else:
-                        # Normal single register write
-                        url = f"{base_url}?command=register&inverter={serial}&register={register_num}&value={command_data['value']}"
-                        response = requests.put(url, timeout=30)
-                    
                 elif command_data['type'] == 'multiregister':
                     # Multi-register write
                     url = f"{base_url}?command=multiregister&inverter={serial}&startregister={command_data['start_register']}&endregister={command_data['end_register']}&value={command_data['value']}"
-                    response = requests.put(url, timeout=10)
+                    with span('grott_write', GROTT):
+                        response = requests.put(url, timeout=10)
                     
                 elif command_data['type'] == 'custom':
-                    # Custom curl command - parse and execute
-                    # This is a simplified version, you might need more robust parsing
-                    response = requests.request(
-                        method=command_data.get('method', 'GET'),
-                        url=command_data['url'],
-                        timeout=10
-                    )
+                    # HTTP request or script, run on the custom command pool under its own limits
+                    with span('custom_command', GROTT):
+                        success, result = CustomCommands.run(command_data)
+                    if success:
+                        logger.info(f"Custom command executed successfully on attempt {attempt}")
+                        return True, result, attempt
+                    if command_data.get('script'):
+                        # Scripts may have side effects, so a failed one isn't run again
+                        logger.warning(f"Script step failed: {result}")
+                        return False, result, attempt
+                    raise CustomCommandError(result)
                 else:
                     return False, f"Unknown command type: {command_data['type']}", attempt
                 
                 # Check response
                 if response.status_code == 200 and response.text.strip() == 'OK':
                     logger.info(f"Command executed successfully on attempt {attempt}")
+                    if uses_grott:
+                        CircuitBreakers.record(serial, True)
+                    if command_data['type'] == 'register':
+                        InverterCommand.record_write(serial, command_data['register'], command_data['value'])
                     return True, response.text, attempt
                 else:
                     logger.warning(f"Attempt {attempt}/{max_retries} failed: {response.status_code} - {response.text}")
-                    if attempt < max_retries:
-                        time.sleep(retry_delay)
+                    if uses_grott:
+                        CircuitBreakers.record(serial, False, f"HTTP {response.status_code}: {response.text[:100]}")
                     
             except Exception as e:
                 logger.error(f"Attempt {attempt}/{max_retries} error: {str(e)}")
-                if attempt < max_retries:
+                if uses_grott:
+                    CircuitBreakers.record(serial, False, str(e))
+            
+            # Stop retrying once the link is considered down; the run is re-queued when it recovers
+            if uses_grott and not CircuitBreakers.is_closed(serial):
+                logger.warning(f"Grott circuit opened for {serial} after {attempt} attempts")
+                return False, f"Grott circuit open for {serial}", attempt
+            if attempt < max_retries:
+                with span('retry_sleep', WAIT):
                     time.sleep(retry_delay)
         
         return False, f"Failed after {max_retries} attempts", max_retries
     
     @staticmethod
-    def check_condition(condition_type: str, condition_register: int, condition_operator: str, condition_value: str) -> Tuple[bool, str]:
+    def block_payload(serial: str, start: int, end: int, register_num: int, value) -> str:
+        """
+        Hex payload for writing register_num = value as part of the block start..end, with the
+        other registers taken from register_values; stores the new value once it encodes cleanly
+        """
+        rows = Database.fetch_all(
+            """SELECT register_number, current_value FROM register_values
+               WHERE inverter_serial = ? AND register_number BETWEEN ? AND ?""",
+            (serial, start, end)
+        )
+        stored = {row['register_number']: row['current_value'] for row in rows}
+        stored[register_num] = value
+        formats = RegisterCatalog.formats(range(start, end + 1))
+        payload = encode_block(
+            [stored.get(reg) if stored.get(reg) is not None else 0 for reg in range(start, end + 1)],
+            [formats[reg] for reg in range(start, end + 1)]
+        )
+        
+        # Update database with new value
+        Database.execute(
+            """INSERT OR REPLACE INTO register_values 
+               (inverter_serial, register_number, current_value, last_updated) 
+               VALUES (?, ?, ?, CURRENT_TIMESTAMP)""",
+            (serial, register_num, value)
+        )
+        return payload
+    
+    @staticmethod
+    def record_write(serial: str, register_num: int, value):
+        """Record a write the inverter acknowledged as the register's last-confirmed state"""
+        try:
+            register_num = int(register_num)
+            value = stored_value(register_num, value)
+        except (TypeError, ValueError):
+            return
+        block = register_block(register_num)
+        if block:
+            # The whole block was resent from register_values, so every register in it is confirmed
+            Database.execute(
+                """UPDATE register_values SET last_written_at = CURRENT_TIMESTAMP
+                   WHERE inverter_serial = ? AND register_number BETWEEN ? AND ?""",
+                (serial,) + block
+            )
+        else:
+            Database.execute(
+                """INSERT INTO register_values (inverter_serial, register_number, current_value, last_updated, last_written_at)
+                   VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                   ON CONFLICT(inverter_serial, register_number) DO UPDATE SET
+                       current_value = excluded.current_value,
+                       last_updated = excluded.last_updated,
+                       last_written_at = excluded.last_written_at""",
+                (serial, register_num, value)
+            )
+    
+    @staticmethod
+    def check_unchanged(command_data: Dict, inverter_serial: str = None) -> Optional[str]:
+        """
+        Skip-if-unchanged: compare a planned register write with last-confirmed state
+        State counts as confirmed when a read or acknowledged write within skip_unchanged_max_age
+        is at least as recent as the last local change to the value
+        Returns: suppression reason, or None if the write should go ahead
+        """
+        config = InverterCommand.get_config()
+        if config.get('skip_unchanged_writes', '0') != '1' or command_data.get('type') != 'register':
+            return None
+        
+        serial = inverter_serial or config.get('inverter_serial', 'NTCRBLR00Y')
+        
+        try:
+            register_num = int(command_data['register'])
+            target = stored_value(register_num, command_data['value'])
+        except (KeyError, TypeError, ValueError):
+            return None
+        
+        max_age = config_number(config, 'skip_unchanged_max_age')
+        row = Database.fetch_one(
+            """SELECT current_value,
+                      MAX(COALESCE(last_read_from_inverter, ''), COALESCE(last_written_at, '')) AS confirmed_at
+               FROM register_values
+               WHERE inverter_serial = ? AND register_number = ?""",
+            (serial, register_num)
+        )
+        if not row or not same_word(register_num, row['current_value'], target) or not row['confirmed_at']:
+            return None
+        
+        fresh = Database.fetch_one(
+            """SELECT ? >= datetime('now', ?) AS fresh, ? >= last_updated AS current
+               FROM register_values WHERE inverter_serial = ? AND register_number = ?""",
+            (row['confirmed_at'], f'-{max_age} seconds', row['confirmed_at'], serial, register_num)
+        )
+        if not fresh['fresh'] or not fresh['current']:
+            return None
+        
+        verified = ''
+        if config.get('skip_unchanged_verify', '0') == '1':
+            # One read of the register (or the register it is read back from) before trusting the cache
+            info = RegisterCatalog.get(register_num)
+            read_reg = (info and info.read_register) or register_num
+            values = InverterCommand.read_registers([read_reg], serial, max_age=0)
+            with suppression_lock:
+                suppression_metrics['verify_reads'] += 1
+            if values.get(read_reg) is None or not same_word(register_num, values[read_reg], target):
+                logger.info(f"Skip-if-unchanged: register {read_reg} reads {values.get(read_reg)}, writing {target}")
+                return None
+            verified = f", verified by reading {read_reg}"
+        
+        block = register_block(register_num)
+        with suppression_lock:
+            suppression_metrics['writes_suppressed'] += 1
+            suppression_metrics['registers_not_resent'] += (block[1] - block[0] + 1) if block else 1
+        
+        return f"Register {register_num} already {target:g} (confirmed {row['confirmed_at']}{verified})"
+    
+    @staticmethod
+    def write_targets(command_data: Dict) -> List[Tuple[int, object]]:
+        """(register, stored value) pairs a write command should leave on the inverter"""
+        try:
+            if command_data.get('type') == 'register':
+                register_num = int(command_data['register'])
+                return [(register_num, stored_value(register_num, command_data['value']))]
+            if command_data.get('type') == 'multiregister':
+                start = int(command_data['start_register'])
+                end = int(command_data['end_register'])
+                formats = RegisterCatalog.formats(range(start, end + 1))
+                values = decode_block(str(command_data['value']), [formats[reg] for reg in range(start, end + 1)])
+                return list(enumerate(values, start))
+        except (KeyError, TypeError, ValueError):
+            pass
+        return []
+    
+    @staticmethod
+    def confirm_writes(commands: List[Dict], inverter_serial: str = None) -> List[Tuple[Dict, str]]:
+        """
+        Read back every register written by a batch of commands in one pass
+        Write-only registers are read through their read_register alias; registers
+        with neither are skipped. Confirmed targets get last_read_from_inverter set.
+        Returns: [(command, mismatch details)] for commands that did not land
+        """
+        targets = [(command, InverterCommand.write_targets(command)) for command in commands]
+        registers = sorted({reg for _, pairs in targets for reg, _ in pairs})
+        if not registers:
+            return []
+        
+        read_back = [r for r in map(read_back_register, registers) if r is not None]
+        values = InverterCommand.read_registers(read_back, inverter_serial, max_age=0)
+        
+        confirmed = []
+        mismatches = []
+        for command, pairs in targets:
+            problems = []
+            for reg, expected in pairs:
+                read_reg = read_back_register(reg)
+                if read_reg is None:
+                    continue
+                # Reads are decoded by the codec, so values compare as the words they encode to
+                actual = values.get(read_reg)
+                if actual is None:
+                    problems.append(f"register {read_reg} could not be read")
+                elif not same_word(reg, actual, expected):
+                    label = f"register {reg}" if read_reg == reg else f"register {reg} (read via {read_reg})"
+                    problems.append(f"{label} is {actual:g}, expected {expected:g}")
+                elif read_reg != reg:
+                    confirmed.append(reg)
+            if problems:
+                mismatches.append((command, '; '.join(problems)))
+        
+        if confirmed:
+            serial = InverterCommand.resolve_serial(inverter_serial)
+            conn = Database.get_connection()
+            conn.executemany(
+                """UPDATE register_values SET last_read_from_inverter = CURRENT_TIMESTAMP
+                   WHERE inverter_serial = ? AND register_number = ?""",
+                [(serial, reg) for reg in confirmed]
+            )
+            conn.commit()
+            conn.close()
+        
+        return mismatches
+    
+    @staticmethod
+    def verify_writes(commands: List[Dict], inverter_serial: str = None) -> Tuple[bool, str, int]:
+        """
+        Read-after-write verification for a batch of write commands
+        Commands whose values did not land are re-sent and re-checked up to verify_retries times
+        Returns: (verified, details, extra write attempts)
+        """
+        config = InverterCommand.get_config()
+        retries = config_number(config, 'verify_retries')
+        delay = config_number(config, 'verify_delay_seconds')
+        
+        pending = commands
+        attempts = 0
+        for round_number in range(retries + 1):
+            # Give the inverter time to apply the write before reading it back
+            if delay > 0:
+                with span('verify_delay', WAIT):
+                    time.sleep(delay)
+            mismatches = InverterCommand.confirm_writes(pending, inverter_serial)
+            if not mismatches:
+                return True, f"Verified {len(commands)} write(s)", attempts
+            
+            for command, details in mismatches:
+                logger.warning(f"Write verification mismatch ({round_number + 1}/{retries + 1}): {details}")
+            if round_number == retries:
+                break
+            
+            pending = []
+            for command, _ in mismatches:
+                success, response, command_attempts = InverterCommand.execute_command(command, inverter_serial)
+                attempts += command_attempts
+                pending.append(command)
+        
+        return False, "Verification failed: " + '; '.join(details for _, details in mismatches), attempts
+    
+    @staticmethod
+    def read_registers(registers: List[int], inverter_serial: str = None, max_age: int = None) -> Dict[int, float]:
+        """
+        Read several registers at once
+        Values read from the inverter within max_age seconds are served from register_values;
+        the rest are fetched with one multiregister read per contiguous range
+        Returns: {register: value} for every register that could be read
+        """
+        config = InverterCommand.get_config()
+        host = config.get('grott_host', '<grottserver>')
+        port = config.get('grott_port', '5782')
+        serial = inverter_serial or config.get('inverter_serial', 'NTCRBLR00Y')
+        if max_age is None:
+            max_age = config_number(config, 'register_cache_seconds')
+        base_url = f"http://{host}:{port}/inverter"
+        
+        registers = sorted(set(int(r) for r in registers))
+        values = {}
+        
+        if registers and max_age > 0:
+            placeholders = ','.join('?' * len(registers))
+            rows = Database.fetch_all(
+                f"""SELECT register_number, current_value FROM register_values
+                    WHERE inverter_serial = ? AND register_number IN ({placeholders})
+                      AND last_read_from_inverter >= datetime('now', ?)""",
+                (serial,) + tuple(registers) + (f'-{max_age} seconds',)
+            )
+            values = {row['register_number']: float(row['current_value']) for row in rows}
+        
+        stale = [r for r in registers if r not in values]
+        read = {}
+        formats = RegisterCatalog.formats(stale) if stale else {}
+        for start, end in register_ranges(stale):
+            read.update(InverterCommand.read_register_range(base_url, serial, start, end, formats))
+        
+        if read:
+            conn = Database.get_connection()
+            conn.executemany(
+                """INSERT OR REPLACE INTO register_values 
+                   (inverter_serial, register_number, current_value, last_updated, last_read_from_inverter) 
+                   VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)""",
+                [(serial, reg, value) for reg, value in read.items()]
+            )
+            conn.commit()
+            conn.close()
+        
+        RegisterEvents.publish(serial, read)
+        values.update({reg: value for reg, value in read.items() if reg in stale})
+        return values
+    
+    @staticmethod
+    def read_register_range(base_url: str, serial: str, start: int, end: int,
+                            formats: Dict[int, RegisterFormat] = None) -> Dict[int, float]:
+        """Read registers start..end in one request, falling back to single reads; values are decoded"""
+        if formats is None or any(reg not in formats for reg in range(start, end + 1)):
+            formats = RegisterCatalog.formats(range(start, end + 1))
+        if not CircuitBreakers.allow(serial):
+            logger.warning(f"Grott circuit open for {serial}, registers {start}-{end} not read")
+            return {}
+        
+        if start != end and serial not in multiregister_unsupported:
+            try:
+                url = f"{base_url}?command=multiregister&inverter={serial}&startregister={start}&endregister={end}"
+                with span('grott_read', GROTT):
+                    response = requests.get(url, timeout=30)
+                # Older grottserver versions reject the command with a 400: an answer, not a failure
+                answered = response.status_code in (200, 400)
+                CircuitBreakers.record(serial, answered, f"HTTP {response.status_code}")
+                values = {}
+                if response.status_code == 200:
+                    try:
+                        values = parse_multiregister_response(response.json(), start, end, formats)
+                    except (TypeError, ValueError) as e:
+                        logger.warning(f"Unusable multiregister response for {start}-{end}: {str(e)}")
+                if values:
+                    return values
+                if answered:
+                    logger.info(f"Grott multiregister reads unavailable for {serial}, using single register reads")
+                    multiregister_unsupported.add(serial)
+                else:
+                    logger.warning(f"Multiregister read {start}-{end} failed: HTTP {response.status_code}")
+            except Exception as e:
+                logger.warning(f"Multiregister read {start}-{end} failed: {str(e)}")
+                CircuitBreakers.record(serial, False, str(e))
+        
+        values = {}
+        for reg in range(start, end + 1):
+            if not CircuitBreakers.is_closed(serial):
+                break
+            try:
+                url = f"{base_url}?command=register&inverter={serial}&register={reg}"
+                with span('grott_read', GROTT):
+                    response = requests.get(url, timeout=30)
+                CircuitBreakers.record(serial, response.status_code == 200, f"HTTP {response.status_code}")
+                if response.status_code == 200:
+                    values[reg] = float(decode(response.json().get('value'), formats[reg]))
+                else:
+                    logger.warning(f"Failed to read register {reg}: {response.status_code}")
+            except Exception as e:
+                logger.warning(f"Error reading register {reg}: {str(e)}")
+                CircuitBreakers.record(serial, False, str(e))
+        return values
+    
+    @staticmethod
+    def check_condition(condition_type: str, condition_register: int, condition_operator: str, condition_value: str,
+                        condition_expression: str = None, inverter_serial: str = None) -> Tuple[bool, str]:
         """
         Check if condition is met
-        Returns: (condition_met, details)
+        Returns: (condition_met, details); condition_met is None if the condition couldn't be checked
         """
         if condition_type == 'none' or not condition_type:
             return True, "No condition"
         
         try:
-            # Read current register value
-            config = InverterCommand.get_config()
-            host = config.get('grott_host', '<grottserver>')
-            port = config.get('grott_port', '5782')
-            serial = config.get('inverter_serial', 'NTCRBLR00Y')
-            
-            url = f"http://{host}:{port}/inverter?command=register&inverter={serial}&register={condition_register}"
-            response = requests.get(url, timeout=10)
-            
-            if response.status_code != 200:
-                return False, f"Failed to read register {condition_register}"
-            
-            data = response.json()
-            current_value = int(data.get('value', 0))
-            target_value = int(condition_value)
-            
-            # Evaluate condition
-            if condition_operator == '<':
-                met = current_value < target_value
-            elif condition_operator == '>':
-                met = current_value > target_value
-            elif condition_operator == '=':
-                met = current_value == target_value
-            elif condition_operator == '<=':
-                met = current_value <= target_value
-            elif condition_operator == '>=':
-                met = current_value >= target_value
+            if condition_type == 'expression':
+                compiled = compile_condition(condition_expression)
             else:
-                return False, f"Unknown operator: {condition_operator}"
+                compiled = compile_condition(legacy_expression(condition_register, condition_operator, condition_value))
+            
+            # One batched read for every register the condition uses
+            values = InverterCommand.read_registers(compiled.registers, inverter_serial)
+            missing = [reg for reg in compiled.registers if reg not in values]
+            if missing:
+                return None, f"Failed to read register {', '.join(map(str, missing))}"
             
-            details = f"Register {condition_register}: {current_value} {condition_operator} {target_value} = {met}"
-            return met, details
+            met, terms = compiled.evaluate(values)
+            return met, format_terms(terms, met)
             
+        except ConditionError as e:
+            return None, f"Invalid condition: {str(e)}"
         except Exception as e:
-            return False, f"Condition check error: {str(e)}"
+            return None, f"Condition check error: {str(e)}"
+
+
+def stored_value(register_num: int, value):
+    """A value as the register holds it, through its format's word, so '52.30' and 52.3 are the same; raises CodecError"""
+    fmt = RegisterCatalog.formats([register_num])[register_num]
+    return decode(encode(value, fmt), fmt)
+
+
+def same_word(register_num: int, a, b) -> bool:
+    """Whether two values of a register encode to the same word"""
+    fmt = RegisterCatalog.formats([register_num])[register_num]
+    try:
+        return encode(a, fmt) == encode(b, fmt)
+    except CodecError:
+        return False
+
+
+def register_block(register_num: int) -> Optional[Tuple[int, int]]:
+    """Block (start, end) a register must be written with, if any"""
+    return RegisterCatalog.block(register_num)
+
+
+def register_ranges(registers: List[int], max_gap: int = 4) -> List[Tuple[int, int]]:
+    """Group sorted registers into (start, end) ranges, bridging small gaps"""
+    ranges = []
+    for reg in registers:
+        if ranges and reg - ranges[-1][1] <= max_gap:
+            ranges[-1] = (ranges[-1][0], reg)
+        else:
+            ranges.append((reg, reg))
+    return ranges
+
+
+def read_back_register(register_num: int) -> Optional[int]:
+    """Register a write is read back from: its read_register alias, itself, or None when write-only"""
+    info = RegisterCatalog.get(register_num)
+    if info and info.read_register:
+        return info.read_register
+    if info and info.write_only:
+        return None
+    return register_num
+
+
+def read_requests(registers: List[int], serial: str, base_url: str) -> List[Request]:
+    """Requests read_registers makes for registers not served from register_values, without sending them"""
+    planned = []
+    for start, end in register_ranges(sorted(set(int(r) for r in registers))):
+        if start == end:
+            url = f"{base_url}?command=register&inverter={serial}&register={start}"
+        else:
+            url = f"{base_url}?command=multiregister&inverter={serial}&startregister={start}&endregister={end}"
+        planned.append(Request('GET', url, 'read', (start, end)))
+    return planned
+
+
+def command_requests(command_data: Dict, serial: str, base_url: str) -> List[Request]:
+    """
+    Requests execute_command makes for a command that succeeds first time, without sending them
+    Block registers become one write of the whole block, with a payload of the real length
+    """
+    command_type = command_data.get('type')
+    if command_type == 'read':
+        register_num = int(command_data['register'])
+        url = f"{base_url}?command=register&inverter={serial}&register={register_num}"
+        return [Request('GET', url, 'read', (register_num, register_num))]
+    if command_type == 'register':
+        register_num = int(command_data['register'])
+        block = register_block(register_num)
+        if block:
+            start, end = block
+            url = f"{base_url}?command=multiregister&inverter={serial}&startregister={start}&endregister={end}&value={'0000' * (end - start + 1)}"
+            return [Request('PUT', url, 'write', block)]
+        url = f"{base_url}?command=register&inverter={serial}&register={register_num}&value={command_data['value']}"
+        return [Request('PUT', url, 'write', (register_num, register_num))]
+    if command_type == 'multiregister':
+        start, end = int(command_data['start_register']), int(command_data['end_register'])
+        url = f"{base_url}?command=multiregister&inverter={serial}&startregister={start}&endregister={end}&value={command_data['value']}"
+        return [Request('PUT', url, 'write', (start, end))]
+    if command_type == 'custom':
+        if command_data.get('script'):
+            return [Request('SCRIPT', command_data['script'], 'custom', None)]
+        return [Request(command_data.get('method', 'GET'), command_data.get('url', ''), 'custom', None)]
+    return []
+
+
+def check_register_value(register_num: int, value) -> Optional[str]:
+    """Check a value against a register's codec format and min/max from the catalog; returns an error or None"""
+    info = RegisterCatalog.get(register_num)
+    try:
+        encode(value, info.format if info else DECIMAL)
+    except CodecError as e:
+        return f"Invalid value for register {register_num}: {str(e)}"
+    if info:
+        number = float(value)
+        if info.min_value is not None and number < info.min_value:
+            return f"Register {register_num} ({info.name}): {value} is below the minimum of {info.min_value}"
+        if info.max_value is not None and number > info.max_value:
+            return f"Register {register_num} ({info.name}): {value} is above the maximum of {info.max_value}"
+    return None
+
+
+def validate_command(command_data: Dict) -> Optional[str]:
+    """Check a register, multiregister or custom command before it is sent; returns an error message or None"""
+    command_type = command_data.get('type')
+    if command_type == 'custom':
+        return CustomCommands.validate(command_data)
+    
+    if command_type == 'register':
+        try:
+            register_num = int(command_data['register'])
+        except (KeyError, TypeError, ValueError):
+            return "register must be a register number"
+        if command_data.get('value') in (None, ''):
+            return f"No value for register {register_num}"
+        return check_register_value(register_num, command_data['value'])
+    
+    if command_type == 'multiregister':
+        try:
+            start = int(command_data['start_register'])
+            end = int(command_data['end_register'])
+        except (KeyError, TypeError, ValueError):
+            return "start_register and end_register must be register numbers"
+        if end < start:
+            return f"end_register {end} is before start_register {start}"
+        formats = RegisterCatalog.formats(range(start, end + 1))
+        try:
+            # Decoding the payload checks it is hex with 4 digits per register
+            values = decode_block(str(command_data.get('value') or ''), [formats[reg] for reg in range(start, end + 1)])
+        except CodecError as e:
+            return f"Invalid value for registers {start}-{end}: {str(e)}"
+        for reg, value in zip(range(start, end + 1), values):
+            error = check_register_value(reg, value)
+            if error:
+                return error
+    return None
+
+
+def parse_multiregister_response(data, start: int, end: int,
+                                 formats: Dict[int, RegisterFormat] = None) -> Dict[int, float]:
+    """
+    Parse and decode a multiregister read response
+    Accepts {"values": {"1070": 100, ...}}, {"values": [100, ...]} or {"value": "<4 hex digits per register>"}
+    """
+    count = end - start + 1
+    formats = formats or {}
+    values = data.get('values') if isinstance(data, dict) else None
+    if isinstance(values, dict):
+        return {int(reg): float(decode(value, formats.get(int(reg), DECIMAL)))
+                for reg, value in values.items() if start <= int(reg) <= end}
+    if isinstance(values, list) and len(values) == count:
+        return {start + i: float(decode(value, formats.get(start + i, DECIMAL))) for i, value in enumerate(values)}
+    value = data.get('value') if isinstance(data, dict) else None
+    if isinstance(value, str) and len(value) == count * 4:
+        try:
+            decoded = decode_block(value, [formats.get(reg, DECIMAL) for reg in range(start, end + 1)])
+        except CodecError:
+            return {}
+        return {start + i: float(v) for i, v in enumerate(decoded)}
+    return {}
 
 
 class ScheduleExecutor:
     """Execute scheduled tasks"""
     
     @staticmethod
-    def execute_schedule(schedule_id: int):
-        """Execute a schedule"""
+    def execute_schedule(schedule_id: int, trigger_details: str = None):
+        """Execute a schedule; all log lines of the run share one correlation id"""
+        with correlation(f"run-{schedule_id}-{uuid.uuid4().hex[:8]}"), tracing():
+            return ScheduleExecutor.run_schedule(schedule_id, trigger_details)
+    
+    @staticmethod
+    def run_schedule(schedule_id: int, trigger_details: str = None):
+        """Check the condition, run the commands and log the outcome"""
         logger.info(f"Executing schedule ID: {schedule_id}")
         
         # Get schedule details
-        schedule = Database.fetch_one(
-            "SELECT * FROM schedules WHERE id = ? AND enabled = 1",
-            (schedule_id,)
-        )
+        with span('schedule_lookup', DB):
+            schedule = Database.fetch_one(
+                "SELECT * FROM schedules WHERE id = ? AND enabled = 1",
+                (schedule_id,)
+            )
         
         if not schedule:
             logger.warning(f"Schedule {schedule_id} not found or disabled")
@@ -378,60 +896,200 @@ class ScheduleExecutor:
         
         # Check condition if applicable
         condition_met = True
-        condition_details = "No condition"
+        condition_details = f"Triggered: {trigger_details}" if trigger_details else "No condition"
         
         if schedule['condition_type'] and schedule['condition_type'] != 'none':
-            condition_met, condition_details = InverterCommand.check_condition(
-                schedule['condition_type'],
-                schedule['condition_register'],
-                schedule['condition_operator'],
-                schedule['condition_value']
-            )
+            with span('condition'):
+                condition_met, condition_details = InverterCommand.check_condition(
+                    schedule['condition_type'],
+                    schedule['condition_register'],
+                    schedule['condition_operator'],
+                    schedule['condition_value'],
+                    schedule['condition_expression'],
+                    schedule['inverter_serial']
+                )
+            
+            if condition_met is None:
+                # Not a false condition: the run failed, and is re-queued if the Grott link is down
+                serial = InverterCommand.resolve_serial(schedule['inverter_serial'])
+                outcome = 'failed' if CircuitBreakers.is_closed(serial) else 'circuit_open'
+                logger.warning(f"Condition for schedule {schedule_id} not checked: {condition_details}")
+                ScheduleExecutor.write_log([(
+                    """INSERT INTO execution_logs 
+                       (schedule_id, schedule_name, command, success, attempts, error_message, condition_details, outcome, trace)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (schedule_id, schedule['name'], "Not run - condition could not be checked", False, 0,
+                     condition_details, condition_details, outcome, ScheduleExecutor.packed_trace())
+                )])
+                if outcome == 'circuit_open':
+                    CircuitBreakers.defer(serial, schedule_id)
+                elif schedule['pushover_enabled']:
+                    ScheduleExecutor.send_pushover_notification(schedule, condition_details, 0)
+                return
             
             if not condition_met:
                 logger.info(f"Condition not met for schedule {schedule_id}: {condition_details}")
                 # Log skipped execution
-                Database.execute(
+                ScheduleExecutor.write_log([(
                     """INSERT INTO execution_logs 
-                       (schedule_id, schedule_name, command, success, attempts, condition_met, condition_details)
-                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                    (schedule_id, schedule['name'], "Skipped - condition not met", True, 0, False, condition_details)
-                )
+                       (schedule_id, schedule_name, command, success, attempts, condition_met, condition_details, outcome, trace)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (schedule_id, schedule['name'], "Skipped - condition not met", True, 0, False, condition_details,
+                     'condition_not_met', ScheduleExecutor.packed_trace())
+                )])
                 return
         
         # Build command
-        command_data = ScheduleExecutor.build_command(schedule)
+        with span('build_command', CODE):
+            command_data = ScheduleExecutor.build_command(schedule)
         if not command_data:
             logger.error(f"Failed to build command for schedule {schedule_id}")
             return
         
-        # Execute command
-        success, response, attempts = InverterCommand.execute_command(
-            command_data,
+        # Execute command(s)
+        success, response, attempts, outcome = ScheduleExecutor.run_commands(
+            schedule_id,
+            command_data if isinstance(command_data, list) else [command_data],
             schedule['inverter_serial']
         )
         
-        # Log execution
-        Database.execute(
+        # Log execution and update last executed and next run (from the fire calendar) in one commit
+        statements = [(
             """INSERT INTO execution_logs 
-               (schedule_id, schedule_name, command, success, attempts, response, error_message, condition_met, condition_details)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+               (schedule_id, schedule_name, command, success, attempts, response, error_message, condition_met, condition_details, outcome, trace)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
             (schedule_id, schedule['name'], json.dumps(command_data), success, attempts,
              response if success else None, response if not success else None,
-             condition_met, condition_details)
-        )
-        
-        # Update last executed
-        Database.execute(
-            "UPDATE schedules SET last_executed_at = CURRENT_TIMESTAMP WHERE id = ?",
-            (schedule_id,)
-        )
+             condition_met, condition_details, outcome, ScheduleExecutor.packed_trace())
+        )]
+        if FireCalendar.has(schedule_id):
+            next_run = FireCalendar.next_fire(schedule_id, datetime.now(pytz.utc))
+            statements.append((
+                "UPDATE schedules SET last_executed_at = CURRENT_TIMESTAMP, next_execution_at = ? WHERE id = ?",
+                (format_fire_time(next_run), schedule_id)
+            ))
+        else:
+            statements.append((
+                "UPDATE schedules SET last_executed_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (schedule_id,)
+            ))
+        ScheduleExecutor.write_log(statements)
         
-        # Send notification if enabled and failed
-        if not success and schedule['pushover_enabled']:
+        if outcome == 'circuit_open':
+            # Re-queued when the circuit closes rather than retried against a dead link
+            CircuitBreakers.defer(InverterCommand.resolve_serial(schedule['inverter_serial']), schedule_id)
+        elif not success and schedule['pushover_enabled']:
+            # Send notification if enabled and failed
             ScheduleExecutor.send_pushover_notification(schedule, response, attempts)
         
-        logger.info(f"Schedule {schedule_id} execution completed: {'SUCCESS' if success else 'FAILED'}")
+        logger.info(f"Schedule {schedule_id} execution completed: {outcome.upper()}")
+    
+    @staticmethod
+    def packed_trace() -> Optional[str]:
+        """The current execution's trace, packed for execution_logs.trace"""
+        trace = current_trace()
+        if trace is None or InverterCommand.get_config().get('trace_executions', '1') != '1':
+            return None
+        return trace.pack()
+    
+    @staticmethod
+    def write_log(statements: List[Tuple[str, tuple]]):
+        """
+        Commit an execution's log statements (first one the execution_logs insert), then append
+        the time that commit took to the stored trace; that update rides along with the next group commit
+        """
+        trace = current_trace()
+        started = time.perf_counter()
+        log_id = CommandJournal.write(statements).result()[0]
+        if trace is None or statements[0][1][-1] is None:
+            return
+        trace.add('log_write', started, time.perf_counter() - started, DB)
+        CommandJournal.write([("UPDATE execution_logs SET trace = ? WHERE id = ?", (trace.pack(), log_id))], wait=False)
+    
+    @staticmethod
+    def run_commands(schedule_id: Optional[int], commands: List[Dict], inverter_serial: str = None) -> Tuple[bool, str, int, str]:
+        """
+        Execute a schedule's commands in order, then verify all writes with one batched read-back
+        Returns: (success, response/error, attempts, outcome)
+        """
+        responses = []
+        total_attempts = 0
+        written = []
+        suppressed_count = 0
+        serial = InverterCommand.resolve_serial(inverter_serial)
+        
+        # Check every command first so a multi-command template isn't left half applied
+        with span('validate'):
+            errors = [error for error in map(validate_command, commands) if error]
+        if errors:
+            return False, '; '.join(errors), 0, 'invalid'
+        
+        for command in commands:
+            # Skip writes that would not change anything
+            with span('suppression_check'):
+                suppressed = InverterCommand.check_unchanged(command, inverter_serial)
+            if suppressed:
+                logger.info(f"Write suppressed for {schedule_id or 'bulk command'}: {suppressed}")
+                responses.append(suppressed)
+                suppressed_count += 1
+                continue
+            
+            # Intent is committed before the send so a crash mid-command can be reconciled on restart
+            with span('journal_intent', DB):
+                journal_id = CommandJournal.intent(schedule_id, serial, command)
+            with span('command', type=command.get('type')):
+                success, response, attempts = InverterCommand.execute_command(command, inverter_serial)
+            CommandJournal.settle(journal_id, 'success' if success else 'failed', response, attempts)
+            total_attempts += attempts
+            responses.append(response)
+            if not success:
+                outcome = 'failed' if CircuitBreakers.is_closed(serial) else 'circuit_open'
+                return False, '; '.join(responses), total_attempts, outcome
+            if command.get('type') in ('register', 'multiregister'):
+                written.append(command)
+        
+        if written and InverterCommand.get_config().get('verify_writes', '0') == '1':
+            with span('verify'):
+                verified, details, attempts = InverterCommand.verify_writes(written, inverter_serial)
+            total_attempts += attempts
+            responses.append(details)
+            if not verified:
+                return False, '; '.join(responses), total_attempts, 'verify_failed'
+        
+        outcome = 'suppressed' if suppressed_count == len(commands) else 'success'
+        return True, '; '.join(responses), total_attempts, outcome
+    
+    @staticmethod
+    def dispatch(schedule_id: int, trigger_details: str = None):
+        """
+        Queue a schedule run on its inverter's worker so a slow device doesn't hold up the others
+        Schedules of custom HTTP requests and scripts only go to the custom command pool instead,
+        so they never sit in front of an inverter's register writes
+        Returns: Future for the run, or None if the queue was full
+        """
+        schedule = Database.fetch_one(
+            "SELECT name, inverter_serial, command_type, custom_command FROM schedules WHERE id = ?", (schedule_id,)
+        )
+        if not schedule:
+            logger.warning(f"Schedule {schedule_id} not found")
+            return None
+        serial = InverterCommand.resolve_serial(schedule['inverter_serial'])
+        commands = custom_commands(schedule['custom_command']) if schedule['command_type'] == 'custom' else None
+        custom = bool(commands) and all(command.get('type') == 'custom' for command in commands)
+        try:
+            if custom:
+                return CustomCommands.submit(ScheduleExecutor.execute_schedule, schedule_id, trigger_details)
+            return DeviceWorkers.submit(serial, ScheduleExecutor.execute_schedule, schedule_id, trigger_details)
+        except DeviceQueueFull as e:
+            logger.error(f"Schedule {schedule_id} not run: {str(e)}")
+            Database.execute(
+                """INSERT INTO execution_logs 
+                   (schedule_id, schedule_name, command, success, attempts, error_message, outcome)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (schedule_id, schedule['name'], f"Rejected - {'custom command' if custom else 'device'} queue full",
+                 False, 0, str(e), 'queue_full')
+            )
+            return None
     
     @staticmethod
     def build_command(schedule: sqlite3.Row) -> Optional[Dict]:
@@ -465,7 +1123,12 @@ class ScheduleExecutor:
                     (schedule['template_name'],)
                 )
                 if template:
-                    return json.loads(template['command_data'])
+                    command_data = json.loads(template['command_data'])
+                    if isinstance(command_data, list):
+                        # multi_command templates run each command in order
+                        return command_data
+                    command_data.setdefault('type', template['command_type'])
+                    return command_data
             
             elif schedule['command_type'] == 'custom':
                 return json.loads(schedule['custom_command'])
@@ -476,40 +1139,70 @@ class ScheduleExecutor:
             logger.error(f"Error building command: {str(e)}")
             return None
     
+    @staticmethod
+    def plan_run(schedule, serial: str, base_url: str, verify: bool) -> Tuple[List[Request], List[Tuple[int, int]]]:
+        """
+        Requests one run of a schedule makes, in run_schedule's order, assuming the condition passes,
+        nothing is cached or suppressed and every command succeeds first time
+        Returns: (requests, register units written: whole blocks or single registers)
+        """
+        planned = []
+        if schedule['condition_type'] and schedule['condition_type'] != 'none':
+            try:
+                if schedule['condition_type'] == 'expression':
+                    compiled = compile_condition(schedule['condition_expression'])
+                else:
+                    compiled = compile_condition(legacy_expression(
+                        schedule['condition_register'], schedule['condition_operator'], schedule['condition_value']
+                    ))
+            except ConditionError:
+                # The condition can never pass, so the run stops before reading anything
+                return [], []
+            planned.extend(read_requests(compiled.registers, serial, base_url))
+        
+        command_data = ScheduleExecutor.build_command(schedule)
+        commands = command_data if isinstance(command_data, list) else [command_data] if command_data else []
+        if not commands or any(map(validate_command, commands)):
+            return planned, []
+        
+        written = []
+        for command in commands:
+            planned.extend(command_requests(command, serial, base_url))
+            if command.get('type') in ('register', 'multiregister'):
+                written.append(command)
+        if verify and written:
+            read_back = {read_back_register(reg) for command in written for reg, _ in InverterCommand.write_targets(command)}
+            planned.extend(read_requests([reg for reg in read_back if reg is not None], serial, base_url))
+        
+        units = []
+        for planned_request in planned:
+            if planned_request.kind == 'write':
+                start, end = planned_request.registers
+                units.extend(register_block(reg) or (reg, reg) for reg in range(start, end + 1))
+        return planned, units
+    
     @staticmethod
     def send_pushover_notification(schedule: sqlite3.Row, error_message: str, attempts: int):
-        """Send Pushover notification on failure"""
-        try:
-            config = InverterCommand.get_config()
-            user_key = config.get('pushover_user_key', '')
-            api_token = config.get('pushover_api_token', '')
-            
-            if not user_key or not api_token:
-                logger.warning("Pushover credentials not configured")
-                return
-            
-            message = f"Schedule '{schedule['name']}' failed after {attempts} attempts.\nError: {error_message}"
-            
-            requests.post('https://api.pushover.net/1/messages.json', data={
-                'token': api_token,
-                'user': user_key,
-                'title': 'Grott Scheduler Alert',
-                'message': message,
-                'priority': 0
-            }, timeout=10)
-            
-            logger.info(f"Pushover notification sent for schedule {schedule['id']}")
-            
-        except Exception as e:
-            logger.error(f"Failed to send Pushover notification: {str(e)}")
+        """Queue a failure alert; delivery, de-duplication and batching happen on the notifier thread"""
+        Notifier.notify(
+            key=f"{schedule['id']}:{error_message}",
+            name=schedule['name'],
+            message=f"Schedule '{schedule['name']}' failed after {attempts} attempts.\nError: {error_message}"
+        )
 
 
 # REST API Endpoints
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'timestamp': datetime.now().isoformat()})
+    """Health check endpoint, including the Grott circuit state per inverter"""
+    circuits = CircuitBreakers.states()
+    status = 'healthy' if all(c['state'] == 'closed' for c in circuits.values()) else 'degraded'
+    startup = Startup.report()
+    # While the scheduler is still loading (or failed to), that is the status that matters
+    if startup['state'] in (WARMING, FAILED):
+        status = startup['state']
+    return jsonify({'status': status, 'timestamp': datetime.now().isoformat(), 'grott': circuits, 'startup': startup})
 
 
 @app.route('/api/restart-grott', methods=['POST'])
@@ -557,6 +1250,49 @@ def restart_grott():
         }), 500
 
 
+def parse_number(key: str, value):
+    """A numeric setting's value; raises ValueError if it isn't a number within NUMERIC_CONFIG's bounds"""
+    kind, _, minimum, maximum = NUMERIC_CONFIG[key]
+    try:
+        number = kind(str(value).strip())
+    except ValueError:
+        number = None
+    if number is None or not math.isfinite(number) or number < minimum or (maximum is not None and number > maximum):
+        bounds = f"between {minimum} and {maximum}" if maximum is not None else f"of at least {minimum}"
+        raise ValueError(f"{key} must be {'an integer' if kind is int else 'a number'} {bounds}")
+    return number
+
+
+def config_number(config: Dict[str, str], key: str):
+    """A numeric setting from config, or its default if unset, empty or invalid"""
+    value = config.get(key)
+    if value is None or str(value).strip() == '':
+        return NUMERIC_CONFIG[key][1]
+    try:
+        return parse_number(key, value)
+    except ValueError:
+        logger.warning(f"Invalid {key} {value!r} in config, using {NUMERIC_CONFIG[key][1]}")
+        return NUMERIC_CONFIG[key][1]
+
+
+def config_error(key: str, value) -> Optional[str]:
+    """Why value can't be stored for key, or None"""
+    if key == 'timezone' and not is_valid_timezone(value):
+        return f"Unknown timezone: {value}"
+    if key == 'log_level' and not is_valid_level(value):
+        return f"Unknown log level: {value}"
+    if key == 'log_levels' and invalid_levels(value):
+        return f"Invalid log_levels entries (expected logger=LEVEL): {', '.join(invalid_levels(value))}"
+    if key == 'log_format' and value not in ('text', 'json'):
+        return "log_format must be text or json"
+    if key in NUMERIC_CONFIG and str(value).strip() != '':
+        try:
+            parse_number(key, value)
+        except ValueError as e:
+            return str(e)
+    return None
+
+
 @app.route('/api/config', methods=['GET', 'PUT'])
 def manage_config():
     """Get or update configuration"""
@@ -567,20 +1303,45 @@ def manage_config():
     
     elif request.method == 'PUT':
         data = request.json
+        for item in data:
+            error = config_error(item['key'], item['value'])
+            if error:
+                return jsonify({'error': error}), 400
+        
+        previous_serial = InverterCommand.resolve_serial()
         for item in data:
             Database.execute(
                 "UPDATE config SET value = ?, updated_at = CURRENT_TIMESTAMP WHERE key = ?",
                 (item['value'], item['key'])
             )
+        
+        for item in data:
+            if item['key'] == 'inverter_serial' and item['value']:
+                ensure_device(item['value'], seed_from=previous_serial)
+        if any(item['key'] in ('device_queue_size', 'device_workers') for item in data):
+            configure_device_workers()
+        if any(item['key'].startswith('circuit_') for item in data):
+            configure_circuit_breakers()
+        if any(item['key'].startswith('journal_') for item in data):
+            configure_command_journal()
+        if any(item['key'].startswith('log_') for item in data):
+            configure_logging()
+        if any(item['key'].startswith(('pushover_', 'notify_')) for item in data):
+            configure_notifications()
+        
+        # Timezone, horizon or location changes move fire times, so reload all schedules
+        if any(item['key'] in ('timezone', 'calendar_days', 'latitude', 'longitude') for item in data):
+            initialize_scheduler()
+        elif any(item['key'] == 'event_poll_seconds' for item in data):
+            configure_event_polling()
+        
         return jsonify({'success': True, 'message': 'Configuration updated'})
 
 
 @app.route('/api/registers', methods=['GET'])
 def get_registers():
     """Get all known registers"""
-    rows = Database.fetch_all("SELECT * FROM registers ORDER BY category, register_number")
-    registers = [dict(row) for row in rows]
-    return jsonify(registers)
+    return jsonify(register_records())
 
 
 @app.route('/api/register-values', methods=['GET', 'PUT'])
@@ -588,14 +1349,15 @@ def manage_register_values():
     """Get or update register values (source of truth)"""
     if request.method == 'GET':
         # Get specific register or all registers
+        serial = InverterCommand.resolve_serial(request.args.get('inverter_serial'))
         register_num = request.args.get('register', type=int)
         if register_num:
             row = Database.fetch_one(
                 """SELECT rv.*, r.name, r.description 
                    FROM register_values rv
                    LEFT JOIN registers r ON rv.register_number = r.register_number
-                   WHERE rv.register_number = ?""",
-                (register_num,)
+                   WHERE rv.inverter_serial = ? AND rv.register_number = ?""",
+                (serial, register_num)
             )
             if not row:
                 return jsonify({'error': 'Register not found'}), 404
@@ -606,31 +1368,38 @@ def manage_register_values():
                 SELECT rv.*, r.name, r.description 
                 FROM register_values rv
                 LEFT JOIN registers r ON rv.register_number = r.register_number
+                WHERE rv.inverter_serial = ?
                 ORDER BY rv.register_number
-            """)
+            """, (serial,))
             values = [dict(row) for row in rows]
             return jsonify(values)
     
     elif request.method == 'PUT':
         # Update register value(s)
         data = request.json
+        default_serial = InverterCommand.resolve_serial(request.args.get('inverter_serial'))
+        # Stored values are resent as part of block writes, so they must be valid too
+        for item in (data if isinstance(data, list) else [data]):
+            error = check_register_value(int(item['register_number']), item['current_value'])
+            if error:
+                return jsonify({'success': False, 'error': error}), 400
         if isinstance(data, list):
             # Bulk update
             for item in data:
                 Database.execute(
                     """INSERT OR REPLACE INTO register_values 
-                       (register_number, current_value, last_updated) 
-                       VALUES (?, ?, CURRENT_TIMESTAMP)""",
-                    (item['register_number'], item['current_value'])
+                       (inverter_serial, register_number, current_value, last_updated) 
+                       VALUES (?, ?, ?, CURRENT_TIMESTAMP)""",
+                    (item.get('inverter_serial') or default_serial, item['register_number'], item['current_value'])
                 )
             return jsonify({'success': True, 'message': f'Updated {len(data)} register values'})
         else:
             # Single update
             Database.execute(
                 """INSERT OR REPLACE INTO register_values 
-                   (register_number, current_value, last_updated) 
-                   VALUES (?, ?, CURRENT_TIMESTAMP)""",
-                (data['register_number'], data['current_value'])
+                   (inverter_serial, register_number, current_value, last_updated) 
+                   VALUES (?, ?, ?, CURRENT_TIMESTAMP)""",
+                (data.get('inverter_serial') or default_serial, data['register_number'], data['current_value'])
             )
             return jsonify({'success': True, 'message': 'Register value updated'})
 
@@ -642,15 +1411,16 @@ def sync_register_values():
         config = InverterCommand.get_config()
         host = config.get('grott_host', '<grottserver>')
         port = config.get('grott_port', '5782')
-        serial = config.get('inverter_serial', 'NTCRBLR00Y')
         base_url = f"http://{host}:{port}/inverter"
         
         # Get list of registers to sync
         data = request.json or {}
+        serial = data.get('inverter_serial') or config.get('inverter_serial', 'NTCRBLR00Y')
         registers = data.get('registers', list(range(1070, 1089)))  # Default to 1070-1088
         
         synced = []
         failed = []
+        formats = RegisterCatalog.formats(registers)
         
         for reg in registers:
             try:
@@ -659,17 +1429,17 @@ def sync_register_values():
                 
                 if response.status_code == 200:
                     reg_data = response.json()
-                    value = int(reg_data.get('value', 0))
+                    value = decode(reg_data.get('value', 0), formats[int(reg)])
                     
                     # Update database
                     Database.execute(
                         """INSERT OR REPLACE INTO register_values 
-                           (register_number, current_value, last_updated, last_read_from_inverter) 
-                           VALUES (?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)""",
-                        (reg, value)
+                           (inverter_serial, register_number, current_value, last_updated, last_read_from_inverter) 
+                           VALUES (?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)""",
+                        (serial, reg, value)
                     )
                     synced.append({'register': reg, 'value': value})
-                    logger.info(f"Synced register {reg} = {value}")
+                    logger.debug(f"Synced register {reg} = {value}")
                 else:
                     failed.append({'register': reg, 'error': f"HTTP {response.status_code}"})
                     logger.warning(f"Failed to sync register {reg}: {response.status_code}")
@@ -678,8 +1448,11 @@ def sync_register_values():
                 failed.append({'register': reg, 'error': str(e)})
                 logger.error(f"Error syncing register {reg}: {e}")
         
+        RegisterEvents.publish(serial, {item['register']: item['value'] for item in synced})
+        
         return jsonify({
             'success': len(failed) == 0,
+            'inverter_serial': serial,
             'synced': synced,
             'failed': failed,
             'message': f'Synced {len(synced)} registers, {len(failed)} failed'
@@ -705,10 +1478,15 @@ def read_register(register_number):
         if response.status_code == 200:
             try:
                 data = response.json()
+                decoded = None
+                if data.get('value') is not None:
+                    decoded = decode(data['value'], RegisterCatalog.formats([register_number])[register_number])
+                    RegisterEvents.publish(serial, {register_number: decoded})
                 return jsonify({
                     'success': True,
                     'register': register_number,
                     'value': data.get('value'),
+                    'decoded': decoded,
                     'raw_response': data
                 })
             except:
@@ -731,51 +1509,25 @@ def read_register(register_number):
 
 @app.route('/api/read-registers', methods=['POST'])
 def read_registers():
-    """Read multiple registers from the inverter via Grott"""
+    """Read multiple registers from the inverter via Grott, decoded like every other read"""
     try:
         data = request.json or {}
         registers = data.get('registers', [])
         
         if not registers:
             return jsonify({'success': False, 'error': 'No registers specified'}), 400
+        try:
+            registers = [int(reg) for reg in registers]
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'registers must be register numbers'}), 400
         
         config = InverterCommand.get_config()
-        host = config.get('grott_host', '<grottserver>')
-        port = config.get('grott_port', '5782')
         serial = data.get('inverter_serial') or config.get('inverter_serial', 'NTCRBLR00Y')
         
-        results = []
-        failed = []
-        
-        for reg in registers:
-            try:
-                url = f"http://{host}:{port}/inverter?command=register&inverter={serial}&register={reg}"
-                response = requests.get(url, timeout=30)
-                
-                if response.status_code == 200:
-                    try:
-                        reg_data = response.json()
-                        value = reg_data.get('value')
-                    except:
-                        value = response.text
-                    
-                    results.append({
-                        'register': reg,
-                        'value': value,
-                        'success': True
-                    })
-                else:
-                    failed.append({
-                        'register': reg,
-                        'error': f"HTTP {response.status_code}",
-                        'success': False
-                    })
-            except Exception as e:
-                failed.append({
-                    'register': reg,
-                    'error': str(e),
-                    'success': False
-                })
+        # Always from the inverter: batched, decoded, stored in register_values and published to event schedules
+        values = InverterCommand.read_registers(registers, serial, max_age=0)
+        results = [{'register': reg, 'value': values[reg], 'success': True} for reg in registers if reg in values]
+        failed = [{'register': reg, 'error': 'Could not be read', 'success': False} for reg in registers if reg not in values]
         
         return jsonify({
             'success': len(failed) == 0,
@@ -798,37 +1550,86 @@ def get_templates():
     return jsonify(templates)
 
 
+@app.route('/api/tariffs', methods=['GET', 'PUT'])
+def manage_tariffs():
+    """Get or replace the tariff table used by tariff schedules"""
+    if request.method == 'GET':
+        rows = Database.fetch_all("SELECT * FROM tariff_periods ORDER BY start_time")
+        periods = [dict(row) for row in rows]
+        for period in periods:
+            if period.get('days_of_week'):
+                period['days_of_week'] = json.loads(period['days_of_week'])
+        return jsonify(periods)
+    
+    elif request.method == 'PUT':
+        data = request.json or []
+        try:
+            periods = [(
+                item.get('name'),
+                '%02d:%02d' % tuple(map(int, item['start_time'].split(':')[:2])),
+                '%02d:%02d' % tuple(map(int, item['end_time'].split(':')[:2])),
+                float(item['rate']),
+                json.dumps(item['days_of_week']) if item.get('days_of_week') else None
+            ) for item in data]
+        except (KeyError, ValueError, TypeError) as e:
+            return jsonify({'success': False, 'error': f'Invalid tariff period: {str(e)}'}), 400
+        
+        conn = Database.get_connection()
+        try:
+            conn.execute("DELETE FROM tariff_periods")
+            conn.executemany(
+                "INSERT INTO tariff_periods (name, start_time, end_time, rate, days_of_week) VALUES (?, ?, ?, ?, ?)",
+                periods
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        
+        # Recompute cheapest windows and reschedule tariff schedules
+        refresh_dynamic_times(types=('tariff',))
+        
+        return jsonify({'success': True, 'message': f'Saved {len(periods)} tariff periods'})
+
+
 # Register Groups API
 @app.route('/api/register-groups', methods=['GET'])
 def get_register_groups():
     """Get all register groups"""
     try:
-        rows = Database.fetch_all("SELECT * FROM register_groups ORDER BY id")
-        groups = [dict(row) for row in rows]
-        return jsonify(groups)
+        return jsonify(RegisterCatalog.groups())
     except Exception as e:
         logger.error(f"Error fetching register groups: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+def register_value_rows(serial: str, register_number: int = None) -> Dict[int, sqlite3.Row]:
+    """An inverter's stored register values (or one of them), by register number"""
+    query = "SELECT register_number, current_value, last_updated, last_read_from_inverter FROM register_values WHERE inverter_serial = ?"
+    params = (serial,)
+    if register_number is not None:
+        query += " AND register_number = ?"
+        params += (register_number,)
+    return {row['register_number']: row for row in Database.fetch_all(query, params)}
+
+
+def full_register(info: RegisterInfo, values: Optional[sqlite3.Row]) -> Dict:
+    """A catalog register with its group name and an inverter's current value"""
+    register = info.as_dict()
+    register['group_name'] = info.group_name
+    register['current_value'] = values['current_value'] if values else None
+    register['last_updated'] = values['last_updated'] if values else None
+    register['last_read_from_inverter'] = values['last_read_from_inverter'] if values else None
+    return register
+
+
 # Registers API
 @app.route('/api/registers-full', methods=['GET'])
 def get_registers_full():
     """Get all registers with their groups and current values"""
     try:
-        rows = Database.fetch_all("""
-            SELECT r.*, 
-                   rg.name as group_name,
-                   rv.current_value,
-                   rv.last_updated,
-                   rv.last_read_from_inverter
-            FROM registers r
-            LEFT JOIN register_groups rg ON r.group_id = rg.id
-            LEFT JOIN register_values rv ON r.register_number = rv.register_number
-            ORDER BY r.group_id, r.register_number
-        """)
-        registers = [dict(row) for row in rows]
-        return jsonify(registers)
+        serial = InverterCommand.resolve_serial(request.args.get('inverter_serial'))
+        values = register_value_rows(serial)
+        return stream_records(RegisterCatalog.all(), request, lambda info: full_register(info, values.get(info.register_number)))
     except Exception as e:
         logger.error(f"Error fetching registers: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -838,21 +1639,12 @@ def get_registers_full():
 def manage_register(register_number):
     """Get, update, or delete a specific register"""
     try:
+        serial = InverterCommand.resolve_serial(request.args.get('inverter_serial'))
         if request.method == 'GET':
-            row = Database.fetch_one("""
-                SELECT r.*, 
-                       rg.name as group_name,
-                       rv.current_value,
-                       rv.last_updated,
-                       rv.last_read_from_inverter
-                FROM registers r
-                LEFT JOIN register_groups rg ON r.group_id = rg.id
-                LEFT JOIN register_values rv ON r.register_number = rv.register_number
-                WHERE r.register_number = ?
-            """, (register_number,))
-            
-            if row:
-                return jsonify(dict(row))
+            info = RegisterCatalog.get(register_number)
+            if info:
+                values = register_value_rows(serial, register_number)
+                return jsonify(full_register(info, values.get(register_number)))
             return jsonify({'error': 'Register not found'}), 404
         
         elif request.method == 'PUT':
@@ -885,14 +1677,15 @@ def manage_register(register_number):
                 data.get('group_id'),
                 register_number
             ))
+            RegisterCatalog.invalidate()
             
             # Update current value if provided
             if 'current_value' in data:
                 Database.execute("""
                     INSERT OR REPLACE INTO register_values 
-                    (register_number, current_value, last_updated)
-                    VALUES (?, ?, CURRENT_TIMESTAMP)
-                """, (register_number, data['current_value']))
+                    (inverter_serial, register_number, current_value, last_updated)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                """, (serial, register_number, data['current_value']))
             
             return jsonify({'success': True, 'message': 'Register updated'})
         
@@ -901,6 +1694,7 @@ def manage_register(register_number):
             Database.execute("DELETE FROM register_values WHERE register_number = ?", (register_number,))
             # Delete register
             Database.execute("DELETE FROM registers WHERE register_number = ?", (register_number,))
+            RegisterCatalog.invalidate()
             return jsonify({'success': True, 'message': 'Register deleted'})
     
     except Exception as e:
@@ -919,8 +1713,7 @@ def create_register():
             return jsonify({'error': 'register_number is required'}), 400
         
         # Check if register already exists
-        existing = Database.fetch_one("SELECT register_number FROM registers WHERE register_number = ?", (register_number,))
-        if existing:
+        if RegisterCatalog.get(register_number):
             return jsonify({'error': 'Register already exists'}), 400
         
         # Create register
@@ -941,11 +1734,12 @@ def create_register():
             data.get('category', 'other'),
             data.get('group_id', 1)  # Default to Ungrouped
         ))
+        RegisterCatalog.invalidate()
         
-        # Create register value
+        # Create register value on every device
         Database.execute("""
-            INSERT INTO register_values (register_number, current_value)
-            VALUES (?, ?)
+            INSERT OR IGNORE INTO register_values (inverter_serial, register_number, current_value)
+            SELECT serial, ?, ? FROM devices
         """, (register_number, data.get('current_value', 0)))
         
         return jsonify({'success': True, 'message': 'Register created', 'register_number': register_number}), 201
@@ -955,57 +1749,216 @@ def create_register():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+# Columns written from an API/import payload, in schedule_row() order
+SCHEDULE_FIELDS = (
+    'name', 'description', 'schedule_type', 'time', 'days_of_week', 'specific_date',
+    'command_type', 'register_number', 'register_name', 'register_value',
+    'multiregister_start', 'multiregister_end', 'multiregister_value',
+    'template_name', 'custom_command',
+    'condition_type', 'condition_register', 'condition_operator', 'condition_value',
+    'enabled', 'pushover_enabled', 'inverter_serial', 'timezone', 'offset_minutes', 'window_minutes',
+    'condition_expression', 'trigger_expression', 'trigger_hysteresis', 'trigger_debounce_seconds'
+)
+
+# Fields added after the original API; an update that omits them keeps the stored value
+LATER_SCHEDULE_FIELDS = (
+    'timezone', 'offset_minutes', 'window_minutes', 'condition_expression',
+    'trigger_expression', 'trigger_hysteresis', 'trigger_debounce_seconds'
+)
+
+INSERT_SCHEDULE_SQL = f"""
+    INSERT INTO schedules ({', '.join(SCHEDULE_FIELDS)})
+    VALUES ({', '.join('?' * len(SCHEDULE_FIELDS))})
+"""
+
+UPDATE_SCHEDULE_SQL = f"""
+    UPDATE schedules SET {', '.join(f'{field} = ?' for field in SCHEDULE_FIELDS)}, updated_at = CURRENT_TIMESTAMP
+    WHERE id = ?
+"""
+
+
+def schedule_time(data: Dict) -> str:
+    """Time of day for a schedule; dynamic and event types don't use it, so it is optional"""
+    if data.get('schedule_type') in DYNAMIC_TYPES + (EVENT_SCHEDULE_TYPE,):
+        return data.get('time') or '00:00'
+    return data['time']
+
+
+def validate_condition(condition_type: str, condition_expression: str) -> Optional[str]:
+    """Compile an expression condition up front so syntax errors are rejected at save time"""
+    if condition_type != 'expression':
+        return None
+    try:
+        compile_condition(condition_expression)
+    except ConditionError as e:
+        return f"Invalid condition expression: {str(e)}"
+    return None
+
+
+def validate_trigger(schedule_type: str, trigger_expression: str) -> Optional[str]:
+    """Event schedules need a trigger expression that compiles"""
+    if schedule_type != EVENT_SCHEDULE_TYPE:
+        return None
+    try:
+        compile_condition(trigger_expression)
+    except ConditionError as e:
+        return f"Invalid trigger expression: {str(e)}"
+    return None
+
+
+def custom_commands(custom_command) -> Optional[List[Dict]]:
+    """A schedule's custom_command JSON as a list of commands, or None if it isn't valid"""
+    try:
+        commands = json.loads(custom_command)
+    except (TypeError, ValueError):
+        return None
+    commands = commands if isinstance(commands, list) else [commands]
+    return commands if commands and all(isinstance(command, dict) for command in commands) else None
+
+
+def validate_schedule(data: Dict) -> Optional[str]:
+    """Check a schedule payload before it is written; returns an error message or None"""
+    for field in ('name', 'schedule_type', 'command_type'):
+        if not data.get(field):
+            return f"{field} is required"
+    if data['schedule_type'] not in DYNAMIC_TYPES + (EVENT_SCHEDULE_TYPE,) and not data.get('time'):
+        return "time is required"
+    if data.get('timezone') and not is_valid_timezone(data['timezone']):
+        return f"Unknown timezone: {data['timezone']}"
+    if data['command_type'] == 'register':
+        error = validate_command({'type': 'register', 'register': data.get('register_number'),
+                                  'value': data.get('register_value')})
+        if error:
+            return error
+    if data['command_type'] == 'multiregister':
+        error = validate_command({'type': 'multiregister', 'start_register': data.get('multiregister_start'),
+                                  'end_register': data.get('multiregister_end'), 'value': data.get('multiregister_value')})
+        if error:
+            return error
+    if data['command_type'] == 'custom':
+        commands = custom_commands(data.get('custom_command'))
+        if commands is None:
+            return "custom_command must be a JSON command or list of commands"
+        for command in commands:
+            error = validate_command(command)
+            if error:
+                return error
+    return (validate_condition(data.get('condition_type'), data.get('condition_expression'))
+            or validate_trigger(data.get('schedule_type'), data.get('trigger_expression')))
+
+
+def schedule_row(data: Dict) -> tuple:
+    """Values for SCHEDULE_FIELDS from an API/import payload, with the API defaults applied"""
+    return (
+        data['name'], data.get('description'), data['schedule_type'], schedule_time(data),
+        json.dumps(data.get('days_of_week')) if data.get('days_of_week') else None, data.get('specific_date'),
+        data['command_type'], data.get('register_number'), data.get('register_name'), data.get('register_value'),
+        data.get('multiregister_start'), data.get('multiregister_end'), data.get('multiregister_value'),
+        data.get('template_name'), data.get('custom_command'),
+        data.get('condition_type', 'none'), data.get('condition_register'), data.get('condition_operator'), data.get('condition_value'),
+        data.get('enabled', True), data.get('pushover_enabled', True), data.get('inverter_serial'),
+        data.get('timezone') or None, data.get('offset_minutes', 0), data.get('window_minutes', 60),
+        data.get('condition_expression'), data.get('trigger_expression'),
+        data.get('trigger_hysteresis', 0), data.get('trigger_debounce_seconds', 0)
+    )
+
+
+def merge_schedule(existing: sqlite3.Row, changes: Dict) -> Dict:
+    """Apply a partial update to a stored schedule, giving a full payload for schedule_row()"""
+    merged = {field: existing[field] for field in SCHEDULE_FIELDS}
+    if merged.get('days_of_week'):
+        merged['days_of_week'] = json.loads(merged['days_of_week'])
+    merged.update({key: value for key, value in changes.items() if key != 'id'})
+    return merged
+
+
+def rows_by_key(query: str, column: str, keys: Optional[Sequence] = None, order: str = '') -> List[Dict]:
+    """Rows of a SELECT as dicts, all of them or only those whose column is in keys"""
+    if keys is None:
+        return [dict(row) for row in Database.fetch_all(f"{query} {order}")]
+    keys = list(keys)
+    rows = []
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        rows.extend(Database.fetch_all(f"{query} WHERE {column} IN ({','.join('?' * len(chunk))}) {order}", tuple(chunk)))
+    return [dict(row) for row in rows]
+
+
+SCHEDULE_LIST_SQL = """
+    SELECT s.*, 
+           (SELECT COUNT(*) FROM execution_logs WHERE schedule_id = s.id) as execution_count,
+           (SELECT COUNT(*) FROM execution_logs WHERE schedule_id = s.id AND success = 1) as success_count
+    FROM schedules s"""
+
+
+def schedule_record(schedule) -> Dict:
+    """A schedule list row as the API returns it, with JSON fields parsed"""
+    schedule = dict(schedule)
+    if schedule.get('days_of_week'):
+        schedule['days_of_week'] = json.loads(schedule['days_of_week'])
+    return schedule
+
+
+def schedule_records(schedule_ids: Optional[Sequence[int]] = None) -> List[Dict]:
+    """Schedules with execution counts, as the API returns them (all, or the given ids)"""
+    return [schedule_record(row) for row in rows_by_key(SCHEDULE_LIST_SQL, 's.id', schedule_ids, 'ORDER BY s.created_at DESC')]
+
+
+def register_records(register_numbers: Optional[Sequence[int]] = None) -> List[Dict]:
+    """Catalog registers in /api/registers order (all, or the given numbers)"""
+    registers = RegisterCatalog.all()
+    if register_numbers is not None:
+        wanted = set(register_numbers)
+        registers = [info for info in registers if info.register_number in wanted]
+    registers.sort(key=lambda info: (info.category is not None, info.category or '', info.register_number))
+    return [info.as_dict() for info in registers]
+
+
+# Record types served by /api/sync; each name is the table its sync_changes triggers record
+DeltaSync.attach(Database.get_connection)
+DeltaSync.source('schedules', int, schedule_records)
+DeltaSync.source('registers', int, register_records)
+DeltaSync.source('register_groups', int, lambda ids: [g for g in RegisterCatalog.groups() if ids is None or g['id'] in ids])
+DeltaSync.source('templates', int, lambda ids: rows_by_key("SELECT * FROM templates", 'id', ids, 'ORDER BY name'))
+DeltaSync.source('config', str, lambda keys: rows_by_key("SELECT * FROM config", 'key', keys))
+DeltaSync.source('devices', str, lambda serials: rows_by_key("SELECT * FROM devices", 'serial', serials, 'ORDER BY serial'))
+
+
+@app.route('/api/sync', methods=['GET'])
+def get_sync_changes():
+    """
+    Records changed since ?since=<version> (omitted: everything), optionally only ?types=schedules,registers
+    Keep the returned version and send it back as since on the next call
+    """
+    types = [t for t in request.args.get('types', '').split(',') if t] or None
+    return jsonify(DeltaSync.changes(request.args.get('since', type=int), types))
+
+
 @app.route('/api/schedules', methods=['GET', 'POST'])
 def manage_schedules():
     """Get all schedules or create new schedule"""
     if request.method == 'GET':
-        rows = Database.fetch_all("""
-            SELECT s.*, 
-                   (SELECT COUNT(*) FROM execution_logs WHERE schedule_id = s.id) as execution_count,
-                   (SELECT COUNT(*) FROM execution_logs WHERE schedule_id = s.id AND success = 1) as success_count
-            FROM schedules s
-            ORDER BY s.created_at DESC
-        """)
-        schedules = [dict(row) for row in rows]
-        
-        # Parse JSON fields
-        for schedule in schedules:
-            if schedule.get('days_of_week'):
-                schedule['days_of_week'] = json.loads(schedule['days_of_week'])
-        
-        return jsonify(schedules)
+        return stream_records(Database.iterate(f"{SCHEDULE_LIST_SQL} ORDER BY s.created_at DESC"), request, schedule_record)
     
     elif request.method == 'POST':
         data = request.json
         
-        # Convert days_of_week to JSON if present
-        days_of_week = json.dumps(data.get('days_of_week')) if data.get('days_of_week') else None
-        
-        cursor = Database.execute("""
-            INSERT INTO schedules (
-                name, description, schedule_type, time, days_of_week, specific_date,
-                command_type, register_number, register_name, register_value,
-                multiregister_start, multiregister_end, multiregister_value,
-                template_name, custom_command,
-                condition_type, condition_register, condition_operator, condition_value,
-                enabled, pushover_enabled, inverter_serial
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            data['name'], data.get('description'), data['schedule_type'], data['time'],
-            days_of_week, data.get('specific_date'),
-            data['command_type'], data.get('register_number'), data.get('register_name'), data.get('register_value'),
-            data.get('multiregister_start'), data.get('multiregister_end'), data.get('multiregister_value'),
-            data.get('template_name'), data.get('custom_command'),
-            data.get('condition_type', 'none'), data.get('condition_register'), data.get('condition_operator'), data.get('condition_value'),
-            data.get('enabled', True), data.get('pushover_enabled', True), data.get('inverter_serial')
-        ))
+        error = validate_schedule(data)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        cursor = Database.execute(INSERT_SCHEDULE_SQL, schedule_row(data))
         
         schedule_id = cursor.lastrowid
         
+        if data.get('inverter_serial'):
+            ensure_device(data['inverter_serial'])
+        
         # Add to scheduler
         add_schedule_to_apscheduler(schedule_id)
         
-        return jsonify({'success': True, 'id': schedule_id, 'message': 'Schedule created'}), 201
+        return jsonify({'success': True, 'id': schedule_id, 'message': 'Schedule created',
+                        'conflicts': schedule_conflicts([schedule_id])}), 201
 
 
 @app.route('/api/schedules/<int:schedule_id>', methods=['GET', 'PUT', 'DELETE'])
@@ -1024,41 +1977,34 @@ def manage_schedule(schedule_id):
     
     elif request.method == 'PUT':
         data = request.json
-        days_of_week = json.dumps(data.get('days_of_week')) if data.get('days_of_week') else None
+        existing = Database.fetch_one("SELECT * FROM schedules WHERE id = ?", (schedule_id,))
+        if not existing:
+            return jsonify({'error': 'Schedule not found'}), 404
         
-        Database.execute("""
-            UPDATE schedules SET
-                name = ?, description = ?, schedule_type = ?, time = ?, days_of_week = ?, specific_date = ?,
-                command_type = ?, register_number = ?, register_name = ?, register_value = ?,
-                multiregister_start = ?, multiregister_end = ?, multiregister_value = ?,
-                template_name = ?, custom_command = ?,
-                condition_type = ?, condition_register = ?, condition_operator = ?, condition_value = ?,
-                enabled = ?, pushover_enabled = ?, inverter_serial = ?,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """, (
-            data['name'], data.get('description'), data['schedule_type'], data['time'],
-            days_of_week, data.get('specific_date'),
-            data['command_type'], data.get('register_number'), data.get('register_name'), data.get('register_value'),
-            data.get('multiregister_start'), data.get('multiregister_end'), data.get('multiregister_value'),
-            data.get('template_name'), data.get('custom_command'),
-            data.get('condition_type', 'none'), data.get('condition_register'), data.get('condition_operator'), data.get('condition_value'),
-            data.get('enabled', True), data.get('pushover_enabled', True), data.get('inverter_serial'),
-            schedule_id
-        ))
+        # Fields added after the original API keep their stored value when omitted
+        data = dict(data)
+        for field in LATER_SCHEDULE_FIELDS:
+            data.setdefault(field, existing[field])
         
-        # Remove and re-add to scheduler
-        scheduler.remove_job(f"schedule_{schedule_id}", jobstore='default')
-        add_schedule_to_apscheduler(schedule_id)
+        error = validate_schedule(data)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        Database.execute(UPDATE_SCHEDULE_SQL, schedule_row(data) + (schedule_id,))
+        
+        if data.get('inverter_serial'):
+            ensure_device(data['inverter_serial'])
+        
+        # Only reschedule when a timing field changed
+        rescheduled = sync_schedules([schedule_id])
         
-        return jsonify({'success': True, 'message': 'Schedule updated'})
+        return jsonify({'success': True, 'message': 'Schedule updated', 'rescheduled': bool(rescheduled),
+                        'conflicts': schedule_conflicts([schedule_id])})
     
     elif request.method == 'DELETE':
         # Remove from scheduler
-        try:
-            scheduler.remove_job(f"schedule_{schedule_id}", jobstore='default')
-        except:
-            pass
+        with registration_lock:
+            register_schedule(schedule_id, None)
         
         # Delete from database
         Database.execute("DELETE FROM schedules WHERE id = ?", (schedule_id,))
@@ -1070,13 +2016,261 @@ def manage_schedule(schedule_id):
 def execute_schedule_now(schedule_id):
     """Manually execute a schedule immediately"""
     try:
-        ScheduleExecutor.execute_schedule(schedule_id)
+        future = ScheduleExecutor.dispatch(schedule_id)
+        if future is None:
+            # No run: either there is no such schedule or its queue was full (logged as queue_full)
+            if not Database.fetch_one("SELECT id FROM schedules WHERE id = ?", (schedule_id,)):
+                return jsonify({'success': False, 'error': 'Schedule not found'}), 404
+            return jsonify({'success': False, 'error': 'Command queue full, try again later'}), 503
+        future.result()
         return jsonify({'success': True, 'message': 'Schedule executed'})
     except Exception as e:
         logger.error(f"Error executing schedule {schedule_id}: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@app.route('/api/schedules/batch', methods=['POST'])
+def batch_schedules():
+    """
+    Create, update, enable/disable and delete many schedules in one transaction
+    Body: {"create": [...], "update": [{"id": 1, ...changed fields}], "enable": [ids], "disable": [ids], "delete": [ids]}
+    Nothing is written if any item is invalid; scheduler registration is done in bulk after the commit
+    """
+    data = request.json or {}
+    creates = data.get('create') or []
+    updates = data.get('update') or []
+    enable = [int(schedule_id) for schedule_id in data.get('enable') or []]
+    disable = [int(schedule_id) for schedule_id in data.get('disable') or []]
+    delete = [int(schedule_id) for schedule_id in data.get('delete') or []]
+    
+    existing = fetch_schedules([item.get('id') for item in updates if item.get('id')] + enable + disable + delete)
+    errors = []
+    
+    for index, item in enumerate(creates):
+        error = validate_schedule(item)
+        if error:
+            errors.append({'operation': 'create', 'index': index, 'error': error})
+    
+    merged_updates = []
+    for index, item in enumerate(updates):
+        if item.get('id') not in existing:
+            errors.append({'operation': 'update', 'index': index, 'error': 'Schedule not found'})
+            continue
+        merged = merge_schedule(existing[item['id']], item)
+        error = validate_schedule(merged)
+        if error:
+            errors.append({'operation': 'update', 'index': index, 'error': error})
+        merged_updates.append((item['id'], merged))
+    
+    for operation, schedule_ids in (('enable', enable), ('disable', disable), ('delete', delete)):
+        for index, schedule_id in enumerate(schedule_ids):
+            if schedule_id not in existing:
+                errors.append({'operation': operation, 'index': index, 'error': 'Schedule not found'})
+    
+    if errors:
+        return jsonify({'success': False, 'errors': errors}), 400
+    
+    created = []
+    conn = Database.get_connection()
+    try:
+        for item in creates:
+            created.append(conn.execute(INSERT_SCHEDULE_SQL, schedule_row(item)).lastrowid)
+        conn.executemany(UPDATE_SCHEDULE_SQL, [schedule_row(merged) + (schedule_id,) for schedule_id, merged in merged_updates])
+        conn.executemany(
+            "UPDATE schedules SET enabled = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            [(1, schedule_id) for schedule_id in enable] + [(0, schedule_id) for schedule_id in disable]
+        )
+        conn.executemany("DELETE FROM schedules WHERE id = ?", [(schedule_id,) for schedule_id in delete])
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error applying schedule batch: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        conn.close()
+    
+    serials = {item.get('inverter_serial') for item in creates} | {merged.get('inverter_serial') for _, merged in merged_updates}
+    for serial in serials - {None, ''}:
+        ensure_device(serial)
+    
+    rescheduled = sync_schedules(created + [schedule_id for schedule_id, _ in merged_updates] + enable + disable + delete)
+    
+    return jsonify({
+        'success': True,
+        'created': created,
+        'rescheduled': len(rescheduled),
+        'updated': len(merged_updates),
+        'enabled': len(enable),
+        'disabled': len(disable),
+        'deleted': len(delete),
+        'conflicts': schedule_conflicts(created + [schedule_id for schedule_id, _ in merged_updates] + enable)
+    })
+
+
+EXPORT_VERSION = 1
+
+# Export order doubles as import order: schedules may name templates and registers
+EXPORT_QUERIES = {
+    'registers': ('register', "SELECT * FROM registers ORDER BY register_number"),
+    'templates': ('template', "SELECT name, description, command_type, command_data FROM templates ORDER BY name"),
+    'schedules': ('schedule', f"SELECT id, {', '.join(SCHEDULE_FIELDS)} FROM schedules ORDER BY id")
+}
+
+
+def export_record(record_type: str, row: sqlite3.Row) -> Dict:
+    """Row to export payload, decoding JSON columns so the file is plain JSON lines"""
+    data = dict(row)
+    if record_type == 'template':
+        data['command_data'] = json.loads(data['command_data'])
+    elif record_type == 'schedule' and data.get('days_of_week'):
+        data['days_of_week'] = json.loads(data['days_of_week'])
+    return data
+
+
+@app.route('/api/export', methods=['GET'])
+def export_data():
+    """
+    Stream schedules, templates and registers as JSON lines for backup or moving to another host
+    Query: types=registers,templates,schedules (default all)
+    """
+    types = [t for t in request.args.get('types', ','.join(EXPORT_QUERIES)).split(',') if t]
+    unknown = [t for t in types if t not in EXPORT_QUERIES]
+    if unknown:
+        return jsonify({'error': f"Unknown export types: {', '.join(unknown)}"}), 400
+    
+    def generate():
+        yield {
+            'type': 'header',
+            'version': EXPORT_VERSION,
+            'exported_at': datetime.now(pytz.utc).isoformat(),
+            'types': types
+        }
+        for export_type, (record_type, query) in EXPORT_QUERIES.items():
+            if export_type in types:
+                for row in Database.iterate(query):
+                    yield {'type': record_type, 'data': export_record(record_type, row)}
+    
+    return stream_records(generate(), request, ndjson=True, headers={
+        'Content-Disposition': 'attachment; filename=grott-scheduler-export.jsonl'
+    })
+
+
+def import_record(conn: sqlite3.Connection, record_type: str, data: Dict, keep_ids: bool) -> Optional[int]:
+    """Write one export record; returns the schedule id for schedule records"""
+    if record_type == 'register':
+        conn.execute("""
+            INSERT OR REPLACE INTO registers
+            (register_number, name, description, write_only, read_register, value_type, type, min_value, max_value, category, group_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, (
+            data['register_number'], data.get('name', f"Register {data['register_number']}"), data.get('description', ''),
+            data.get('write_only', 0), data.get('read_register'), data.get('value_type', 'decimal'), data.get('type', 0),
+            data.get('min_value'), data.get('max_value'), data.get('category', 'other'), data.get('group_id', 1)
+        ))
+        conn.execute("""
+            INSERT OR IGNORE INTO register_values (inverter_serial, register_number, current_value)
+            SELECT serial, ?, 0 FROM devices
+        """, (data['register_number'],))
+        return None
+    
+    if record_type == 'template':
+        command_data = data['command_data']
+        conn.execute("""
+            INSERT INTO templates (name, description, command_type, command_data) VALUES (?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                description = excluded.description, command_type = excluded.command_type, command_data = excluded.command_data
+        """, (
+            data['name'], data.get('description'), data['command_type'],
+            command_data if isinstance(command_data, str) else json.dumps(command_data)
+        ))
+        return None
+    
+    error = validate_schedule(data)
+    if error:
+        raise ValueError(error)
+    if keep_ids and data.get('id'):
+        conn.execute(
+            f"INSERT INTO schedules (id, {', '.join(SCHEDULE_FIELDS)}) VALUES (?, {', '.join('?' * len(SCHEDULE_FIELDS))})",
+            (data['id'],) + schedule_row(data)
+        )
+        return data['id']
+    return conn.execute(INSERT_SCHEDULE_SQL, schedule_row(data)).lastrowid
+
+
+@app.route('/api/import', methods=['POST'])
+def import_data():
+    """
+    Import a JSON-lines export in one transaction, read line by line from the request body
+    Registers and templates are upserted by register number and name; schedules are added as new schedules,
+    or replace all existing schedules (keeping the exported ids) with ?replace_schedules=1
+    """
+    replace_schedules = request.args.get('replace_schedules') == '1'
+    counts = {'register': 0, 'template': 0, 'schedule': 0}
+    schedule_ids = []
+    serials = set()
+    line_number = 0
+    
+    conn = Database.get_connection()
+    try:
+        if replace_schedules:
+            schedule_ids = [row['id'] for row in conn.execute("SELECT id FROM schedules").fetchall()]
+            conn.execute("DELETE FROM schedules")
+        
+        for line_number, line in enumerate(request.stream, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            record_type = record.get('type')
+            if record_type == 'header':
+                if record.get('version', EXPORT_VERSION) > EXPORT_VERSION:
+                    raise ValueError(f"Unsupported export version {record['version']}")
+                continue
+            if record_type not in counts:
+                raise ValueError(f"Unknown record type: {record_type}")
+            
+            schedule_id = import_record(conn, record_type, record.get('data') or {}, replace_schedules)
+            if schedule_id:
+                schedule_ids.append(schedule_id)
+                serials.add(record['data'].get('inverter_serial'))
+            counts[record_type] += 1
+        
+        conn.commit()
+    except (ValueError, KeyError, TypeError, sqlite3.IntegrityError) as e:
+        conn.rollback()
+        error = f"missing field {e}" if isinstance(e, KeyError) else str(e)
+        return jsonify({'success': False, 'error': f"Line {line_number}: {error}", 'line': line_number}), 400
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error importing data: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        conn.close()
+    
+    if counts['register']:
+        RegisterCatalog.invalidate()
+    if counts['template']:
+        # Schedules using a replaced template now write different values
+        WriteIndex.invalidate()
+    for serial in serials - {None, ''}:
+        ensure_device(serial)
+    add_schedules_to_apscheduler(schedule_ids)
+    
+    logger.info(f"Imported {counts['register']} registers, {counts['template']} templates, {counts['schedule']} schedules")
+    return jsonify({'success': True, 'imported': counts})
+
+
+@app.route('/api/scheduler/reconcile', methods=['POST'])
+def reconcile_schedules():
+    """Sync scheduler jobs, fire calendars and event subscriptions with the database (?dry_run=1 to only report)"""
+    try:
+        result = reconcile_scheduler(dry_run=request.args.get('dry_run') == '1')
+        return jsonify({'success': True, **result})
+    except Exception as e:
+        logger.error(f"Error reconciling scheduler: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @app.route('/api/logs', methods=['GET'])
 def get_execution_logs():
     """Get execution logs"""
@@ -1093,10 +2287,288 @@ def get_execution_logs():
     query += " ORDER BY executed_at DESC LIMIT ?"
     params = params + (limit,)
     
-    rows = Database.fetch_all(query, params)
-    logs = [dict(row) for row in rows]
+    return stream_records(Database.iterate(query, params), request, dict)
+
+
+@app.route('/api/logs/<int:log_id>/trace', methods=['GET'])
+def get_execution_trace(log_id):
+    """Per-phase timings of one execution"""
+    row = Database.fetch_one(
+        "SELECT id, schedule_id, schedule_name, executed_at, outcome, trace FROM execution_logs WHERE id = ?",
+        (log_id,)
+    )
+    if not row:
+        return jsonify({'error': 'Log entry not found'}), 404
+    if not row['trace']:
+        return jsonify({'error': 'No trace recorded for this execution'}), 404
+    return jsonify(dict(dict(row), trace=unpack(row['trace'])))
+
+
+@app.route('/api/logs/phases', methods=['GET'])
+def get_slowest_phases():
+    """Slowest execution phases over the most recent traced executions (?limit=500&schedule_id=)"""
+    limit = min(int(request.args.get('limit', 500)), 10000)
+    schedule_id = request.args.get('schedule_id', type=int)
+    query = "SELECT trace FROM execution_logs WHERE trace IS NOT NULL"
+    params = ()
+    if schedule_id:
+        query += " AND schedule_id = ?"
+        params = (schedule_id,)
+    rows = Database.fetch_all(query + " ORDER BY id DESC LIMIT ?", params + (limit,))
+    return jsonify(summarize([row['trace'] for row in rows], limit=int(request.args.get('top', 10))))
+
+
+def schedules_by_id(schedule_ids: List[int]) -> Dict[int, Dict]:
+    """Fetch summary rows for a set of schedules in one query"""
+    if not schedule_ids:
+        return {}
+    placeholders = ','.join('?' * len(schedule_ids))
+    rows = Database.fetch_all(
+        f"SELECT id, name, schedule_type, time, timezone FROM schedules WHERE id IN ({placeholders})",
+        tuple(schedule_ids)
+    )
+    return {row['id']: dict(row) for row in rows}
+
+
+def schedule_writes(schedules: List[sqlite3.Row]) -> List[Tuple[str, Dict[int, int]]]:
+    """Inverter each schedule writes to and the value it leaves each register at (later commands win)"""
+    default_serial = InverterCommand.resolve_serial()
+    writes = []
+    for schedule in schedules:
+        command_data = ScheduleExecutor.build_command(schedule)
+        targets = {}
+        for command in command_data if isinstance(command_data, list) else [command_data] if command_data else []:
+            targets.update(InverterCommand.write_targets(command))
+        writes.append((schedule['inverter_serial'] or default_serial, targets))
+    return writes
+
+
+# Register -> writing schedules index for conflict checks; see write_index.py
+WriteIndex.attach(Database.get_connection, schedule_writes, register_block)
+
+
+def schedule_conflicts(schedule_ids: List[int] = None, days: int = None, **filters) -> List[Dict]:
+    """Conflicting writes over the fire calendar horizon (or days), with schedule names filled in"""
+    window = config_number(InverterCommand.get_config(), 'conflict_window_minutes')
+    conflicts = WriteIndex.conflicts(window, days or FireCalendar.days, schedule_ids, **filters)
+    names = schedules_by_id(sorted({sid for conflict in conflicts for sid in conflict['schedule_ids']}))
+    for conflict in conflicts:
+        conflict['schedules'] = [{'id': sid, 'name': names.get(sid, {}).get('name')} for sid in conflict['schedule_ids']]
+    return conflicts
+
+
+@app.route('/api/schedules/conflicts', methods=['GET'])
+def get_schedule_conflicts():
+    """
+    Schedules writing different values to the same register (or block) at overlapping times
+    Filters: ?days=, ?schedule_id=, ?inverter_serial=, ?register= or ?block=<any register in the block>
+    """
+    days = request.args.get('days', FireCalendar.days, type=int)
+    if days < 1 or days > 366:
+        return jsonify({'error': 'days must be between 1 and 366'}), 400
+    schedule_id = request.args.get('schedule_id', type=int)
+    registers = None
+    if request.args.get('register', type=int) is not None:
+        registers = [request.args.get('register', type=int)]
+    elif request.args.get('block', type=int) is not None:
+        block = register_block(request.args.get('block', type=int))
+        if not block:
+            return jsonify({'error': f"Register {request.args.get('block')} is not in a block"}), 400
+        registers = range(block[0], block[1] + 1)
+    
+    conflicts = schedule_conflicts([schedule_id] if schedule_id else None, days,
+                                   serial=request.args.get('inverter_serial'), registers=registers)
+    return jsonify({
+        'days': days,
+        'window_minutes': config_number(InverterCommand.get_config(), 'conflict_window_minutes'),
+        'count': len(conflicts),
+        'conflicts': conflicts,
+        'index': WriteIndex.stats()
+    })
+
+
+@app.route('/api/schedules/calendar', methods=['GET'])
+def get_schedule_calendar():
+    """Get upcoming fire times from the precomputed calendar"""
+    days = request.args.get('days', FireCalendar.days, type=int)
+    schedule_id = request.args.get('schedule_id', type=int)
+    
+    if days < 1 or days > 366:
+        return jsonify({'error': 'days must be between 1 and 366'}), 400
+    
+    start = datetime.now(pytz.utc)
+    fires = FireCalendar.window(start, start + timedelta(days=days), [schedule_id] if schedule_id else None)
+    schedules = schedules_by_id(sorted({sid for _, sid in fires}))
+    
+    calendar = [{
+        'schedule_id': sid,
+        'name': schedules[sid]['name'],
+        'fire_time': format_fire_time(fire_time),
+        'local_time': fire_time.isoformat(),
+        'timezone': getattr(fire_time.tzinfo, 'zone', 'UTC')
+    } for fire_time, sid in fires if sid in schedules]
+    
+    return jsonify(calendar)
+
+
+@app.route('/api/schedules/simulate', methods=['GET', 'POST'])
+def simulate_schedules():
+    """
+    Replay the enabled schedules over a period without sending anything and report the Grott load:
+    per-minute requests and bytes, overlapping writes to the same registers and the busiest minutes.
+    Options (query string, or JSON body for POST): days, start, top, capacity, detail, and
+    schedules: proposed schedule payloads to include as if they were saved
+    """
+    data = dict(request.args)
+    if request.method == 'POST':
+        data.update(request.json or {})
+    try:
+        days = int(data.get('days', 7))
+        top = int(data.get('top', 10))
+        capacity = int(data['capacity']) if data.get('capacity') else None
+        start = datetime.fromisoformat(data['start']) if data.get('start') else datetime.now(pytz.utc)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f"Invalid option: {str(e)}"}), 400
+    if days < 1 or days > MAX_DAYS:
+        return jsonify({'error': f'days must be between 1 and {MAX_DAYS}'}), 400
+    if start.tzinfo is None:
+        start = pytz.utc.localize(start)
+    detail = str(data.get('detail', '')).lower() in ('1', 'true')
+    
+    schedules = [dict(row) for row in Database.iterate("SELECT * FROM schedules WHERE enabled = 1 ORDER BY id")]
+    # Proposed schedules get negative ids so they can't be mistaken for saved ones
+    for index, proposed in enumerate(data.get('schedules') or []):
+        error = validate_schedule(proposed)
+        if error:
+            return jsonify({'error': f"Schedule {index + 1}: {error}"}), 400
+        schedules.append(dict(zip(SCHEDULE_FIELDS, schedule_row(proposed)), id=-(index + 1), enabled=1))
+    
+    config = InverterCommand.get_config()
+    base_url = f"http://{config.get('grott_host', '<grottserver>')}:{config.get('grott_port', '5782')}/inverter"
+    default_serial = config.get('inverter_serial', 'NTCRBLR00Y')
+    verify = config.get('verify_writes', '0') == '1'
+    
+    started = time.perf_counter()
+    plans = []
+    event_schedules = []
+    for schedule in schedules:
+        if schedule['schedule_type'] == EVENT_SCHEDULE_TYPE:
+            # Fired by register changes, so there is no timeline to replay
+            event_schedules.append(schedule['id'])
+            continue
+        serial = schedule['inverter_serial'] or default_serial
+        planned, units = ScheduleExecutor.plan_run(schedule, serial, base_url, verify)
+        plans.append(RunPlan(schedule['id'], schedule['name'], schedule, serial, planned, units))
+    
+    result = ScheduleSimulator(start, start + timedelta(days=days)).run(plans, top=top, capacity=capacity, detail=detail)
+    result['days'] = days
+    result['schedules'] = {'simulated': len(plans), 'proposed': len(data.get('schedules') or []),
+                           'event_not_simulated': event_schedules}
+    result['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 1)
+    return jsonify(result)
+
+
+@app.route('/api/devices', methods=['GET', 'POST'])
+def manage_devices():
+    """List devices with their queue statistics, or add a device"""
+    if request.method == 'GET':
+        default_serial = InverterCommand.resolve_serial()
+        queues = DeviceWorkers.stats()
+        devices = []
+        for row in Database.fetch_all("SELECT * FROM devices ORDER BY serial"):
+            device = dict(row)
+            device['default'] = device['serial'] == default_serial
+            device['queue'] = queues.get(device['serial'])
+            devices.append(device)
+        return jsonify(devices)
+    
+    elif request.method == 'POST':
+        data = request.json or {}
+        serial = (data.get('serial') or '').strip()
+        if not serial:
+            return jsonify({'error': 'serial is required'}), 400
+        if not ensure_device(serial, data.get('name'), data.get('queue_size')):
+            return jsonify({'error': 'Device already exists'}), 400
+        configure_device_workers()
+        return jsonify({'success': True, 'serial': serial, 'message': 'Device added'}), 201
+
+
+@app.route('/api/devices/<serial>', methods=['PUT', 'DELETE'])
+def manage_device(serial):
+    """Update or remove a device"""
+    existing = Database.fetch_one("SELECT * FROM devices WHERE serial = ?", (serial,))
+    if not existing:
+        return jsonify({'error': 'Device not found'}), 404
+    
+    if request.method == 'PUT':
+        data = request.json or {}
+        Database.execute(
+            "UPDATE devices SET name = ?, enabled = ?, queue_size = ? WHERE serial = ?",
+            (data.get('name', existing['name']), data.get('enabled', existing['enabled']),
+             data.get('queue_size', existing['queue_size']), serial)
+        )
+        configure_device_workers()
+        return jsonify({'success': True, 'message': 'Device updated'})
+    
+    elif request.method == 'DELETE':
+        if serial == InverterCommand.resolve_serial():
+            return jsonify({'error': 'Cannot remove the default inverter'}), 400
+        in_use = Database.fetch_one("SELECT COUNT(*) as count FROM schedules WHERE inverter_serial = ?", (serial,))
+        if in_use['count']:
+            return jsonify({'error': f"Device is used by {in_use['count']} schedules"}), 400
+        Database.execute("DELETE FROM register_values WHERE inverter_serial = ?", (serial,))
+        Database.execute("DELETE FROM devices WHERE serial = ?", (serial,))
+        return jsonify({'success': True, 'message': 'Device removed'})
+
+
+@app.route('/api/devices/bulk', methods=['POST'])
+def bulk_device_command():
+    """
+    Run a command on several devices in parallel, e.g. set priority on every inverter
+    Body: {"command": {...} or [...], "serials": [...] (default: all enabled devices), "timeout": seconds}
+    """
+    data = request.json or {}
+    command_data = data.get('command')
+    if not command_data:
+        return jsonify({'error': 'command is required'}), 400
+    commands = command_data if isinstance(command_data, list) else [command_data]
+    errors = [error for error in map(validate_command, commands) if error]
+    if errors:
+        return jsonify({'error': '; '.join(errors)}), 400
+    
+    serials = data.get('serials') or [
+        row['serial'] for row in Database.fetch_all("SELECT serial FROM devices WHERE enabled = 1")
+    ]
+    timeout = float(data.get('timeout', 120))
+    
+    futures = DeviceWorkers.fan_out(
+        serials,
+        lambda serial: ScheduleExecutor.run_commands(None, commands, serial)
+    )
+    
+    deadline = time.monotonic() + timeout
+    results = []
+    for serial, future in futures.items():
+        try:
+            success, response, attempts, outcome = future.result(timeout=max(0, deadline - time.monotonic()))
+            results.append({'serial': serial, 'success': success, 'outcome': outcome,
+                            'response': response, 'attempts': attempts})
+        except Exception as e:
+            # Timed-out commands keep running on the device worker
+            error = 'Timed out waiting for device' if not future.done() else str(e)
+            results.append({'serial': serial, 'success': False, 'outcome': 'failed', 'error': error})
     
-    return jsonify(logs)
+    logger.info(f"Bulk command on {len(serials)} devices: {sum(1 for r in results if r['success'])} succeeded")
+    return jsonify({
+        'success': all(r['success'] for r in results),
+        'results': results
+    })
+
+
+@app.route('/api/schema', methods=['GET'])
+def get_schema_status():
+    """Applied and pending schema migrations"""
+    return jsonify(schema_migrator.status())
 
 
 @app.route('/api/stats', methods=['GET'])
@@ -1120,6 +2592,20 @@ def get_stats():
     row = Database.fetch_one("SELECT COUNT(*) as count FROM execution_logs WHERE success = 1")
     stats['successful_executions'] = row['count']
     
+    stats['command_journal'] = CommandJournal.stats()
+    stats['schema'] = {key: value for key, value in schema_migrator.status().items() if key != 'applied'}
+    stats['notifications'] = Notifier.stats()
+    stats['custom_commands'] = CustomCommands.stats()
+    stats['register_catalog'] = RegisterCatalog.memory()
+    
+    # Writes skipped because the register already held the value
+    row = Database.fetch_one("SELECT COUNT(*) as count FROM execution_logs WHERE outcome = 'suppressed'")
+    stats['suppressed_writes'] = row['count']
+    with suppression_lock:
+        metrics = dict(suppression_metrics)
+    metrics['round_trips_saved'] = metrics['writes_suppressed'] - metrics['verify_reads']
+    stats['write_suppression'] = metrics
+    
     # Recent logs (changed from recent failures to show all logs)
     rows = Database.fetch_all("""
         SELECT schedule_name, executed_at, error_message, success
@@ -1129,112 +2615,597 @@ def get_stats():
     """)
     stats['recent_failures'] = [dict(row) for row in rows]
     
-    # Next executions
-    rows = Database.fetch_all("""
-        SELECT id, name, schedule_type, time, next_execution_at
-        FROM schedules 
-        WHERE enabled = 1 AND next_execution_at IS NOT NULL
-        ORDER BY next_execution_at ASC 
-        LIMIT 10
-    """)
-    stats['upcoming_schedules'] = [dict(row) for row in rows]
+    # Next executions, served from the precomputed fire calendar
+    upcoming = FireCalendar.upcoming(limit=10)
+    schedules = schedules_by_id([schedule_id for _, schedule_id in upcoming])
+    stats['upcoming_schedules'] = [
+        dict(schedules[schedule_id], next_execution_at=format_fire_time(fire_time))
+        for fire_time, schedule_id in upcoming if schedule_id in schedules
+    ]
     
     return jsonify(stats)
 
 
-def add_schedule_to_apscheduler(schedule_id: int):
-    """Add schedule to APScheduler"""
-    schedule = Database.fetch_one("SELECT * FROM schedules WHERE id = ? AND enabled = 1", (schedule_id,))
+def format_fire_time(fire_time: Optional[datetime]) -> Optional[str]:
+    """Format a fire time for storage as UTC ISO-8601"""
+    return fire_time.astimezone(pytz.utc).isoformat() if fire_time else None
+
+
+def schedule_timing(schedule: sqlite3.Row) -> tuple:
+    """Timing fingerprint of a stored schedule; registration is only redone when it changes"""
+    return tuple(schedule[field] for field in TIMING_FIELDS)
+
+
+def remove_schedule_job(job_id: str):
+    """Remove a scheduler job if it exists"""
+    if scheduler.get_job(job_id):
+        scheduler.remove_job(job_id)
+
+
+def register_schedule(schedule_id: int, schedule: Optional[sqlite3.Row]) -> Tuple[bool, Optional[str]]:
+    """
+    Register a schedule with APScheduler, the fire calendar and the event stream,
+    or unregister it when it is missing or disabled
+    Returns: (store, next_execution_at) where store says whether next_execution_at should be written
+    """
+    job_id = f"schedule_{schedule_id}"
+    registered_timing.pop(schedule_id, None)
     
     if not schedule:
-        return
-    
-    job_id = f"schedule_{schedule_id}"
+        remove_schedule_job(job_id)
+        FireCalendar.invalidate(schedule_id)
+        RegisterEvents.unsubscribe(schedule_id)
+        WriteIndex.update({schedule_id: None})
+        return False, None
     
     try:
-        # Remove existing job if present
-        try:
-            scheduler.remove_job(job_id)
-        except:
-            pass
-        
-        # Parse time
-        hour, minute = map(int, schedule['time'].split(':'))
-        
-        if schedule['schedule_type'] == 'daily':
-            # Daily schedule
-            trigger = CronTrigger(hour=hour, minute=minute)
-            scheduler.add_job(
-                func=ScheduleExecutor.execute_schedule,
-                trigger=trigger,
-                args=[schedule_id],
-                id=job_id,
-                replace_existing=True
+        if schedule['schedule_type'] == EVENT_SCHEDULE_TYPE:
+            # Fired by the register event stream, not by time
+            remove_schedule_job(job_id)
+            FireCalendar.invalidate(schedule_id)
+            RegisterEvents.subscribe(
+                schedule_id,
+                InverterCommand.resolve_serial(schedule['inverter_serial']),
+                schedule['trigger_expression'],
+                schedule['trigger_hysteresis'],
+                schedule['trigger_debounce_seconds']
             )
-            logger.info(f"Added daily schedule {schedule_id} at {schedule['time']}")
-        
-        elif schedule['schedule_type'] == 'weekly':
-            # Weekly schedule
-            days_of_week = json.loads(schedule['days_of_week']) if schedule['days_of_week'] else []
-            if days_of_week:
-                # APScheduler uses 0=Monday, 6=Sunday (same as Python)
-                trigger = CronTrigger(day_of_week=','.join(map(str, days_of_week)), hour=hour, minute=minute)
-                scheduler.add_job(
-                    func=ScheduleExecutor.execute_schedule,
-                    trigger=trigger,
-                    args=[schedule_id],
-                    id=job_id,
-                    replace_existing=True
-                )
-                logger.info(f"Added weekly schedule {schedule_id} for days {days_of_week} at {schedule['time']}")
-        
-        elif schedule['schedule_type'] == 'once':
-            # One-time schedule
-            if schedule['specific_date']:
-                run_date = datetime.strptime(f"{schedule['specific_date']} {schedule['time']}", "%Y-%m-%d %H:%M")
-                if run_date > datetime.now():
-                    trigger = DateTrigger(run_date=run_date)
-                    scheduler.add_job(
-                        func=ScheduleExecutor.execute_schedule,
-                        trigger=trigger,
-                        args=[schedule_id],
-                        id=job_id,
-                        replace_existing=True
-                    )
-                    logger.info(f"Added one-time schedule {schedule_id} for {run_date}")
-                else:
-                    logger.warning(f"One-time schedule {schedule_id} date is in the past")
+            registered_timing[schedule_id] = schedule_timing(schedule)
+            logger.info(f"Added event schedule {schedule_id} on '{schedule['trigger_expression']}'")
+            return True, None
         
-        # Update next execution time
-        next_run = scheduler.get_job(job_id).next_run_time if scheduler.get_job(job_id) else None
-        if next_run:
-            Database.execute(
-                "UPDATE schedules SET next_execution_at = ? WHERE id = ?",
-                (next_run.isoformat(), schedule_id)
-            )
+        RegisterEvents.unsubscribe(schedule_id)
+        
+        # Precompute the fire calendar in the schedule's timezone; the job trigger reads from it
+        fires = FireCalendar.build(schedule_id, dict(schedule))
+        
+        if not fires:
+            if schedule['schedule_type'] == 'once':
+                logger.warning(f"One-time schedule {schedule_id} date is in the past")
+            else:
+                logger.warning(f"Schedule {schedule_id} has no upcoming fire times")
+            remove_schedule_job(job_id)
+            registered_timing[schedule_id] = schedule_timing(schedule)
+            return True, None
+        
+        # replace_existing swaps the job in place, so it is never missing from the scheduler
+        scheduler.add_job(
+            func=ScheduleExecutor.dispatch,
+            trigger=CalendarTrigger(schedule_id),
+            args=[schedule_id],
+            id=job_id,
+            replace_existing=True
+        )
+        registered_timing[schedule_id] = schedule_timing(schedule)
+        logger.debug(f"Added {schedule['schedule_type']} schedule {schedule_id}, next run {fires[0].isoformat()}")
+        return True, format_fire_time(fires[0])
         
     except Exception as e:
         logger.error(f"Error adding schedule {schedule_id} to APScheduler: {str(e)}")
+        return False, None
+
+
+def add_schedule_to_apscheduler(schedule_id: int):
+    """Add schedule to APScheduler"""
+    schedule = Database.fetch_one("SELECT * FROM schedules WHERE id = ? AND enabled = 1", (schedule_id,))
+    with registration_lock:
+        store, next_execution_at = register_schedule(schedule_id, schedule)
+        WriteIndex.update({schedule_id: schedule})
+    if store:
+        Database.execute("UPDATE schedules SET next_execution_at = ? WHERE id = ?", (next_execution_at, schedule_id))
+
+
+def fetch_schedules(schedule_ids: List[int], enabled_only: bool = False) -> Dict[int, sqlite3.Row]:
+    """Fetch full schedule rows by id, in chunks that stay under SQLite's bound-parameter limit"""
+    schedule_ids = list(dict.fromkeys(schedule_ids))
+    schedules = {}
+    for i in range(0, len(schedule_ids), 500):
+        chunk = schedule_ids[i:i + 500]
+        rows = Database.fetch_all(
+            f"SELECT * FROM schedules WHERE id IN ({','.join('?' * len(chunk))})" + (" AND enabled = 1" if enabled_only else ""),
+            tuple(chunk)
+        )
+        schedules.update({row['id']: row for row in rows})
+    return schedules
+
+
+def add_schedules_to_apscheduler(schedule_ids: List[int]):
+    """Register many schedules with one read per chunk of ids and one batched next_execution_at write"""
+    schedule_ids = list(dict.fromkeys(schedule_ids))
+    schedules = fetch_schedules(schedule_ids, enabled_only=True)
+    updates = []
+    with registration_lock:
+        WriteIndex.update({schedule_id: schedules.get(schedule_id) for schedule_id in schedule_ids})
+        for schedule_id in schedule_ids:
+            store, next_execution_at = register_schedule(schedule_id, schedules.get(schedule_id))
+            if store:
+                updates.append((next_execution_at, schedule_id))
+    store_next_executions(updates)
+
+
+def store_next_executions(updates: List[Tuple[Optional[str], int]]):
+    """Write (next_execution_at, schedule_id) pairs in one transaction"""
+    if not updates:
+        return
+    conn = Database.get_connection()
+    try:
+        conn.executemany("UPDATE schedules SET next_execution_at = ? WHERE id = ?", updates)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def sync_schedules(schedule_ids: List[int]) -> List[int]:
+    """
+    Bring the scheduler in line with the stored schedules, re-registering only those whose
+    timing fields differ from what they were registered with (or that were added, disabled or deleted)
+    Returns: ids that were re-registered
+    """
+    schedule_ids = list(dict.fromkeys(schedule_ids))
+    schedules = fetch_schedules(schedule_ids)
+    rescheduled = []
+    updates = []
+    with registration_lock:
+        # Command changes don't re-register a schedule, but they do change what it writes
+        WriteIndex.update({schedule_id: schedules.get(schedule_id) for schedule_id in schedule_ids})
+        for schedule_id in schedule_ids:
+            schedule = schedules.get(schedule_id)
+            if schedule is not None and not schedule['enabled']:
+                schedule = None
+            timing = schedule_timing(schedule) if schedule is not None else None
+            if timing == registered_timing.get(schedule_id):
+                continue
+            store, next_execution_at = register_schedule(schedule_id, schedule)
+            rescheduled.append(schedule_id)
+            if store:
+                updates.append((next_execution_at, schedule_id))
+    store_next_executions(updates)
+    if rescheduled:
+        logger.info(f"Rescheduled {len(rescheduled)} of {len(schedule_ids)} changed schedules")
+    return rescheduled
+
+
+def reconcile_scheduler(dry_run: bool = False) -> Dict:
+    """
+    One pass over the database and the scheduler's in-memory state:
+    - enabled schedules whose timing changed, or whose job, calendar or event subscription is missing, are re-registered
+    - jobs, calendars and subscriptions for deleted or disabled schedules are removed
+    - stored next_execution_at values that disagree with the calendar are corrected
+    """
+    schedules = {row['id']: row for row in Database.fetch_all("SELECT * FROM schedules WHERE enabled = 1")}
+    job_ids = {int(job.id[len('schedule_'):]) for job in scheduler.get_jobs() if job.id.startswith('schedule_')}
+    now = datetime.now(pytz.utc)
+    
+    with registration_lock:
+        stale = set(job_ids) | FireCalendar.schedule_ids() | RegisterEvents.schedule_ids() | set(registered_timing)
+        remove = sorted(stale - set(schedules))
+        register = []
+        next_updates = []
+        for schedule_id, schedule in schedules.items():
+            if registered_timing.get(schedule_id) != schedule_timing(schedule):
+                register.append(schedule_id)
+            elif schedule['schedule_type'] == EVENT_SCHEDULE_TYPE:
+                if schedule_id not in RegisterEvents.schedule_ids():
+                    register.append(schedule_id)
+            elif not FireCalendar.has(schedule_id):
+                register.append(schedule_id)
+            else:
+                next_fire = format_fire_time(FireCalendar.next_fire(schedule_id, now, inclusive=True))
+                if next_fire and schedule_id not in job_ids:
+                    register.append(schedule_id)
+                elif next_fire != schedule['next_execution_at']:
+                    next_updates.append((next_fire, schedule_id))
+        
+        if not dry_run:
+            for schedule_id in remove:
+                register_schedule(schedule_id, None)
+            for schedule_id in register:
+                store, next_execution_at = register_schedule(schedule_id, schedules[schedule_id])
+                if store:
+                    next_updates.append((next_execution_at, schedule_id))
+    
+    if not dry_run:
+        store_next_executions(next_updates)
+        WriteIndex.invalidate()
+        logger.info(f"Reconciled scheduler: {len(register)} registered, {len(remove)} removed, "
+                    f"{len(next_updates)} next run times corrected")
+    
+    return {
+        'checked': len(schedules),
+        'registered': sorted(register),
+        'removed': remove,
+        'next_execution_updated': len(next_updates),
+        'dry_run': dry_run
+    }
+
+
+def configure_fire_calendar():
+    """Apply install-wide timezone, calendar horizon, location and tariffs from config"""
+    config = InverterCommand.get_config()
+    DynamicTimes.configure(latitude=config.get('latitude'), longitude=config.get('longitude'))
+    DynamicTimes.set_tariffs([dict(row) for row in Database.fetch_all("SELECT * FROM tariff_periods")])
+    FireCalendar.configure(
+        default_timezone=config.get('timezone', 'UTC'),
+        days=config_number(config, 'calendar_days')
+    )
+    
+    # Solar and tariff times are computed once per day, just after local midnight
+    scheduler.add_job(
+        func=refresh_dynamic_times,
+        trigger=CronTrigger(hour=0, minute=0, second=5, timezone=FireCalendar.default_timezone),
+        id='dynamic_times_refresh',
+        replace_existing=True
+    )
+
+
+def refresh_dynamic_times(types: Tuple[str, ...] = DYNAMIC_TYPES):
+    """Recompute cached solar/tariff times and reschedule the schedules that use them"""
+    if 'tariff' in types:
+        DynamicTimes.set_tariffs([dict(row) for row in Database.fetch_all("SELECT * FROM tariff_periods")])
+    DynamicTimes.prune(datetime.now(FireCalendar.schedule_timezone({})).date())
+    
+    placeholders = ','.join('?' * len(types))
+    schedules = Database.fetch_all(
+        f"SELECT id FROM schedules WHERE enabled = 1 AND schedule_type IN ({placeholders})",
+        tuple(types)
+    )
+    add_schedules_to_apscheduler([schedule['id'] for schedule in schedules])
+    
+    logger.info(f"Refreshed dynamic fire times for {len(schedules)} schedules")
+
+
+def run_event_schedule(schedule_id: int, details: str):
+    """Run an event-triggered schedule on its device worker, off the publishing path"""
+    scheduler.add_job(
+        func=ScheduleExecutor.dispatch,
+        args=[schedule_id, details],
+        id=f"event_{schedule_id}",
+        replace_existing=True
+    )
+
+
+def defer_event_check(schedule_id: int, seconds: float):
+    """Re-check a debounced event trigger once the debounce period has passed"""
+    scheduler.add_job(
+        func=RegisterEvents.check_pending,
+        trigger='date',
+        run_date=datetime.now(pytz.utc) + timedelta(seconds=seconds),
+        args=[schedule_id],
+        id=f"event_debounce_{schedule_id}",
+        replace_existing=True
+    )
+
+
+RegisterEvents.attach(fire=run_event_schedule, defer=defer_event_check)
+
+
+def poll_event_registers():
+    """Read every register event schedules depend on; changes are published by read_registers"""
+    for serial, registers in RegisterEvents.subscribed_registers().items():
+        try:
+            InverterCommand.read_registers(registers, serial, max_age=0)
+        except Exception as e:
+            logger.error(f"Error polling registers for {serial}: {str(e)}")
+
+
+def configure_event_polling():
+    """Start, change or stop the register poller that feeds event schedules"""
+    interval = config_number(InverterCommand.get_config(), 'event_poll_seconds')
+    if interval > 0:
+        scheduler.add_job(
+            func=poll_event_registers,
+            trigger='interval',
+            seconds=interval,
+            id='event_register_poll',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+    elif scheduler.get_job('event_register_poll'):
+        scheduler.remove_job('event_register_poll')
+
+
+def ensure_device(serial: str, name: str = None, queue_size: int = None, seed_from: str = None) -> bool:
+    """
+    Add a device if it is not known yet, seeding its register values from the default inverter
+    (or seed_from) until they are synced from the device itself
+    Returns: True if the device was added
+    """
+    if Database.fetch_one("SELECT serial FROM devices WHERE serial = ?", (serial,)):
+        return False
+    default_serial = seed_from or InverterCommand.resolve_serial()
+    conn = Database.get_connection()
+    try:
+        conn.execute(
+            "INSERT INTO devices (serial, name, queue_size) VALUES (?, ?, ?)",
+            (serial, name or serial, queue_size)
+        )
+        conn.execute(
+            """INSERT OR IGNORE INTO register_values (inverter_serial, register_number, current_value)
+               SELECT ?, register_number, current_value FROM register_values WHERE inverter_serial = ?""",
+            (serial, default_serial)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    logger.info(f"Added device {serial}")
+    return True
+
+
+def configure_device_workers():
+    """Apply per-device queue size and worker count from config and the devices table"""
+    config = InverterCommand.get_config()
+    DeviceWorkers.configure(
+        queue_size=config_number(config, 'device_queue_size'),
+        workers=config_number(config, 'device_workers'),
+        overrides={row['serial']: row['queue_size'] for row in Database.fetch_all("SELECT serial, queue_size FROM devices")}
+    )
+
+
+def probe_grott(serial: str) -> bool:
+    """Half-open circuit probe: one single-register read with a short timeout"""
+    config = InverterCommand.get_config()
+    register = config_number(config, 'circuit_probe_register')
+    url = f"http://{config.get('grott_host', '<grottserver>')}:{config.get('grott_port', '5782')}/inverter?command=register&inverter={serial}&register={register}"
+    response = requests.get(url, timeout=5)
+    return response.status_code == 200
+
+
+def requeue_deferred_schedules(serial: str, schedule_ids: List[int]):
+    """Re-queue runs that failed while the Grott circuit was open"""
+    if not schedule_ids:
+        return
+    logger.info(f"Grott circuit for {serial} closed, re-queuing {len(schedule_ids)} schedules")
+    for schedule_id in schedule_ids:
+        ScheduleExecutor.dispatch(schedule_id, f"Re-queued after Grott circuit for {serial} closed")
+
+
+def grott_circuit_closed(serial: str, schedule_ids: List[int]):
+    """A recovered inverter gets another multiregister attempt and its deferred runs back"""
+    multiregister_unsupported.discard(serial)
+    requeue_deferred_schedules(serial, schedule_ids)
+
+
+CircuitBreakers.attach(probe=probe_grott, on_close=grott_circuit_closed)
+
+
+def configure_circuit_breakers():
+    """Apply circuit breaker settings and start the probe that closes recovered circuits"""
+    config = InverterCommand.get_config()
+    CircuitBreakers.configure(
+        window=config_number(config, 'circuit_window'),
+        min_calls=config_number(config, 'circuit_min_calls'),
+        failure_threshold=config_number(config, 'circuit_failure_threshold'),
+        open_seconds=config_number(config, 'circuit_open_seconds'),
+        max_open_seconds=config_number(config, 'circuit_max_open_seconds'),
+        requeue_max_age=config_number(config, 'circuit_requeue_max_age')
+    )
+    scheduler.add_job(
+        func=CircuitBreakers.probe_due,
+        trigger='interval',
+        seconds=max(5, int(CircuitBreakers.open_seconds) // 2),
+        id='grott_circuit_probe',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+
+
+CommandJournal.attach(connect=Database.get_connection)
+
+
+def configure_command_journal():
+    """Apply journal settings and schedule the daily prune of settled entries"""
+    config = InverterCommand.get_config()
+    CommandJournal.configure(
+        enabled=config.get('journal_enabled', '1') == '1',
+        commit_window_ms=config_number(config, 'journal_commit_window_ms')
+    )
+    scheduler.add_job(
+        func=CommandJournal.prune,
+        trigger=CronTrigger(hour=3, minute=30),
+        args=[config_number(config, 'journal_retention_days')],
+        id='command_journal_prune',
+        replace_existing=True
+    )
+
+
+def recover_command_journal():
+    """
+    Settle commands left pending by a crash or restart, on each inverter's worker
+    Only entries written by earlier processes: the scheduler and API are already running, and
+    commands this process is sending are settled by their own runs
+    """
+    entries = Database.fetch_all("""
+        SELECT *, (julianday('now') - julianday(created_at)) * 86400 AS age_seconds
+        FROM command_journal WHERE state = 'pending' AND (process_id IS NULL OR process_id != ?)
+        ORDER BY created_at
+    """, (CommandJournal.process_id,))
+    if not entries:
+        return
+    logger.warning(f"Recovering {len(entries)} commands interrupted by a restart")
+    by_serial: Dict[str, List[sqlite3.Row]] = {}
+    for entry in entries:
+        by_serial.setdefault(entry['inverter_serial'], []).append(entry)
+    for serial, serial_entries in by_serial.items():
+        DeviceWorkers.submit(serial, recover_pending_commands, serial, serial_entries)
+
+
+def recover_pending_commands(serial: str, entries: List[sqlite3.Row]):
+    """
+    Writes that read back correctly are marked confirmed; recent writes that did not land are
+    replayed (register writes are idempotent) and older ones abandoned
+    Reads are abandoned and custom commands marked unknown, since they can't be checked or safely repeated
+    """
+    max_age = config_number(InverterCommand.get_config(), 'journal_replay_max_age')
+    for entry in entries:
+        # The list was read before this job reached the worker; skip anything settled since
+        current = Database.fetch_one("SELECT state FROM command_journal WHERE id = ?", (entry['id'],))
+        if not current or current['state'] != 'pending':
+            continue
+        command = json.loads(entry['command'])
+        if command.get('type') not in ('register', 'multiregister'):
+            state = 'abandoned' if command.get('type') == 'read' else 'unknown'
+            CommandJournal.settle(entry['id'], state, 'Interrupted by restart')
+            continue
+        
+        mismatches = InverterCommand.confirm_writes([command], serial)
+        if not mismatches:
+            state, success, response, attempts = 'confirmed', True, 'Write confirmed by read-back after restart', 0
+        else:
+            details = mismatches[0][1]
+            schedule = (Database.fetch_one("SELECT enabled FROM schedules WHERE id = ?", (entry['schedule_id'],))
+                        if entry['schedule_id'] else None)
+            if entry['age_seconds'] > max_age or (entry['schedule_id'] and not (schedule and schedule['enabled'])):
+                state, success, response, attempts = 'abandoned', False, f"Not replayed: {details}", 0
+            else:
+                success, response, attempts = InverterCommand.execute_command(command, serial)
+                state = 'replayed' if success else 'failed'
+                response = f"Replayed after restart ({details}): {response}"
+        
+        logger.info(f"Journal entry {entry['id']} for {serial}: {state}")
+        CommandJournal.settle(entry['id'], state, response, attempts)
+        if entry['schedule_id']:
+            CommandJournal.write([(
+                """INSERT INTO execution_logs 
+                   (schedule_id, schedule_name, command, success, attempts, response, error_message, outcome)
+                   SELECT ?, name, ?, ?, ?, ?, ?, 'recovered' FROM schedules WHERE id = ?""",
+                (entry['schedule_id'], entry['command'], success, attempts,
+                 response if success else None, response if not success else None, entry['schedule_id'])
+            )], wait=False)
+
+
+def configure_logging():
+    """Apply log format, rotation, levels and sampling from config"""
+    config = InverterCommand.get_config()
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    LogSetup.setup(
+        LOG_FILE,
+        json_format=config.get('log_format', 'text') == 'json',
+        max_bytes=config_number(config, 'log_max_bytes'),
+        backup_count=config_number(config, 'log_backup_count'),
+        level=config.get('log_level') if is_valid_level(config.get('log_level')) else 'INFO',
+        levels=parse_levels(config.get('log_levels', '')),
+        sample_burst=config_number(config, 'log_sample_burst'),
+        sample_seconds=config_number(config, 'log_sample_seconds')
+    )
+
+
+def configure_notifications():
+    """Apply Pushover credentials and alert batching settings"""
+    config = InverterCommand.get_config()
+    user_key = config.get('pushover_user_key', '')
+    api_token = config.get('pushover_api_token', '')
+    Notifier.configure(
+        transport=PushoverTransport(user_key, api_token, config.get('pushover_api_url')) if user_key and api_token else None,
+        batch_seconds=config_number(config, 'notify_batch_seconds'),
+        dedup_seconds=config_number(config, 'notify_dedup_seconds'),
+        max_per_hour=config_number(config, 'notify_max_per_hour')
+    )
+
+
+def configure_custom_commands():
+    """Apply the custom command pool's size and limits; a relative script directory is under the install directory"""
+    config = InverterCommand.get_config()
+    script_dir = config.get('custom_script_dir', '')
+    CustomCommands.configure(
+        workers=config_number(config, 'custom_workers'),
+        queue_size=config_number(config, 'custom_queue_size'),
+        timeout=config_number(config, 'custom_timeout'),
+        max_output=config_number(config, 'custom_max_output_kb') * 1024,
+        memory_mb=config_number(config, 'custom_memory_mb'),
+        script_dir=os.path.join(BASE_DIR, '..', script_dir) if script_dir else ''
+    )
+
+
+def configure_services():
+    """Apply config to logging, calendars, event polling, workers, breakers, journal and notifications"""
+    configure_logging()
+    configure_fire_calendar()
+    configure_event_polling()
+    configure_device_workers()
+    configure_custom_commands()
+    configure_circuit_breakers()
+    configure_command_journal()
+    configure_notifications()
+
+
+def start_scheduler():
+    if not scheduler.running:
+        scheduler.start()
+
+
+def hydrate_scheduler(chunk_size: int = 250):
+    """
+    Register every enabled schedule, soonest stored next run first, a chunk at a time so the
+    jobs due first are live early and API edits can take the registration lock in between
+    Each chunk is read under the lock, so a schedule edited or deleted meanwhile isn't registered stale
+    """
+    schedule_ids = [row['id'] for row in Database.fetch_all(
+        "SELECT id FROM schedules WHERE enabled = 1 ORDER BY next_execution_at IS NULL, next_execution_at"
+    )]
+    for i in range(0, len(schedule_ids), chunk_size):
+        with registration_lock:
+            add_schedules_to_apscheduler(schedule_ids[i:i + chunk_size])
+        Startup.progress('schedules', min(i + chunk_size, len(schedule_ids)), len(schedule_ids))
+    logger.info(f"Loaded {len(schedule_ids)} active schedules")
 
 
 def initialize_scheduler():
     """Load all active schedules into APScheduler"""
     logger.info("Initializing scheduler...")
+    configure_services()
+    start_scheduler()
+    hydrate_scheduler()
+
+
+def main(host: str = '0.0.0.0', port: int = 5783):
+    """
+    Serve the API as soon as the schema is current; configuration, scheduler hydration and
+    journal recovery continue in the background while /api/health reports "warming"
+    """
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+    LogSetup.setup(LOG_FILE)
     
-    schedules = Database.fetch_all("SELECT id FROM schedules WHERE enabled = 1")
-    for schedule in schedules:
-        add_schedule_to_apscheduler(schedule['id'])
+    with Startup.phase('database'):
+        Database.init_database()
+    # Started before the API so schedule edits made during warm-up go straight to live jobs
+    with Startup.phase('scheduler'):
+        start_scheduler()
+    
+    Startup.warm([
+        ('configure', configure_services),
+        ('hydrate', hydrate_scheduler),
+        # Settle commands interrupted by the previous shutdown
+        ('journal_recovery', recover_command_journal),
+        ('register_catalog', RegisterCatalog.all),
+        # Load requests now rather than in the first execution
+        ('preload', lambda: requests.Session)
+    ])
     
-    logger.info(f"Loaded {len(schedules)} active schedules")
+    logger.info(f"Starting Grott Scheduler API on port {port}...")
+    app.run(host=host, port=port, debug=False)
 
 
 if __name__ == '__main__':
-    # Initialize database
-    Database.init_database()
-    
-    # Initialize scheduler
-    initialize_scheduler()
-    
-    # Start Flask app
-    logger.info("Starting Grott Scheduler API on port 5783...")
-    app.run(host='0.0.0.0', port=5783, debug=False)
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Circuit Breaker
+Tracks recent Grott failures per inverter and fails fast while the link is down
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger('grott-scheduler.circuit')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class Breaker:
+    """Breaker state for one inverter serial"""
+
+    __slots__ = ('serial', 'state', 'outcomes', 'opened_at', 'open_seconds', 'last_error',
+                 'last_change', 'deferred', 'trips')
+
+    def __init__(self, serial: str, window: int, open_seconds: float):
+        self.serial = serial
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window)
+        self.opened_at: Optional[float] = None
+        self.open_seconds = open_seconds
+        self.last_error: Optional[str] = None
+        self.last_change = time.time()
+        # schedule_id -> monotonic time the run was deferred
+        self.deferred: Dict[int, float] = {}
+        self.trips = 0
+
+
+class CircuitBreakers:
+    """
+    Per-inverter circuit breakers around the Grott client
+    closed: calls go through and outcomes are recorded over a sliding window
+    open: calls fail immediately until open_seconds have passed
+    half_open: one lightweight probe read decides whether to close or re-open (with doubled backoff)
+    """
+
+    _lock = threading.RLock()
+    _breakers: Dict[str, Breaker] = {}
+    window = 10
+    min_calls = 4
+    failure_threshold = 0.5
+    open_seconds = 30.0
+    max_open_seconds = 600.0
+    requeue_max_age = 3600.0
+    _probe: Optional[Callable[[str], bool]] = None
+    _on_close: Optional[Callable[[str, List[int]], None]] = None
+
+    @classmethod
+    def attach(cls, probe: Callable[[str], bool], on_close: Callable[[str, List[int]], None]):
+        """
+        Set callbacks: probe(serial) performs one lightweight read and returns success,
+        on_close(serial, schedule_ids) runs each time the circuit closes, with the runs deferred while it was open
+        """
+        cls._probe = probe
+        cls._on_close = on_close
+
+    @classmethod
+    def configure(cls, window: int = None, min_calls: int = None, failure_threshold: float = None,
+                  open_seconds: float = None, max_open_seconds: float = None, requeue_max_age: float = None):
+        with cls._lock:
+            if window:
+                cls.window = max(1, int(window))
+                for breaker in cls._breakers.values():
+                    breaker.outcomes = deque(breaker.outcomes, maxlen=cls.window)
+            if min_calls:
+                cls.min_calls = max(1, int(min_calls))
+            if failure_threshold:
+                cls.failure_threshold = min(1.0, max(0.01, float(failure_threshold)))
+            if open_seconds:
+                cls.open_seconds = max(1.0, float(open_seconds))
+            if max_open_seconds:
+                cls.max_open_seconds = max(cls.open_seconds, float(max_open_seconds))
+            if requeue_max_age is not None:
+                cls.requeue_max_age = float(requeue_max_age)
+
+    @classmethod
+    def _breaker(cls, serial: str) -> Breaker:
+        breaker = cls._breakers.get(serial)
+        if not breaker:
+            breaker = Breaker(serial, cls.window, cls.open_seconds)
+            cls._breakers[serial] = breaker
+        return breaker
+
+    @classmethod
+    def _set_state(cls, breaker: Breaker, state: str):
+        if breaker.state != state:
+            logger.warning(f"Grott circuit for {breaker.serial}: {breaker.state} -> {state}")
+            breaker.state = state
+            breaker.last_change = time.time()
+
+    @classmethod
+    def allow(cls, serial: str) -> bool:
+        """
+        Whether a Grott call for serial may go ahead
+        An open circuit whose backoff has elapsed is probed first (by this caller only)
+        """
+        with cls._lock:
+            breaker = cls._breaker(serial)
+            if breaker.state == CLOSED:
+                return True
+            if breaker.state == HALF_OPEN:
+                # Another thread is probing
+                return False
+            if time.monotonic() - breaker.opened_at < breaker.open_seconds:
+                return False
+            cls._set_state(breaker, HALF_OPEN)
+        return cls.probe(serial)
+
+    @classmethod
+    def probe(cls, serial: str) -> bool:
+        """Run the half-open probe read and close or re-open the circuit"""
+        try:
+            healthy = bool(cls._probe(serial)) if cls._probe else True
+            error = None if healthy else 'probe read failed'
+        except Exception as e:
+            healthy, error = False, str(e)
+
+        with cls._lock:
+            breaker = cls._breaker(serial)
+            if healthy:
+                breaker.outcomes.clear()
+                breaker.opened_at = None
+                breaker.open_seconds = cls.open_seconds
+                cls._set_state(breaker, CLOSED)
+                deferred = cls._take_deferred(breaker)
+            else:
+                breaker.last_error = error
+                breaker.opened_at = time.monotonic()
+                breaker.open_seconds = min(breaker.open_seconds * 2, cls.max_open_seconds)
+                cls._set_state(breaker, OPEN)
+                return False
+
+        if cls._on_close:
+            cls._on_close(serial, deferred)
+        return True
+
+    @classmethod
+    def probe_due(cls):
+        """Probe every open circuit whose backoff has elapsed, so circuits close without traffic"""
+        with cls._lock:
+            serials = [serial for serial, breaker in cls._breakers.items()
+                       if breaker.state == OPEN and time.monotonic() - breaker.opened_at >= breaker.open_seconds]
+        for serial in serials:
+            cls.allow(serial)
+
+    @classmethod
+    def record(cls, serial: str, success: bool, error: str = None):
+        """Record the outcome of a Grott call; trips the circuit when the failure rate is too high"""
+        with cls._lock:
+            breaker = cls._breaker(serial)
+            breaker.outcomes.append(success)
+            if success:
+                return
+            breaker.last_error = error
+            failures = breaker.outcomes.count(False)
+            if (breaker.state == CLOSED and len(breaker.outcomes) >= cls.min_calls
+                    and failures / len(breaker.outcomes) >= cls.failure_threshold):
+                breaker.opened_at = time.monotonic()
+                breaker.open_seconds = cls.open_seconds
+                breaker.trips += 1
+                cls._set_state(breaker, OPEN)
+
+    @classmethod
+    def is_closed(cls, serial: str) -> bool:
+        with cls._lock:
+            return cls._breaker(serial).state == CLOSED
+
+    @classmethod
+    def defer(cls, serial: str, schedule_id: int):
+        """Remember a run that failed on an open circuit, to re-queue when it closes"""
+        with cls._lock:
+            cls._breaker(serial).deferred.setdefault(schedule_id, time.monotonic())
+
+    @classmethod
+    def _take_deferred(cls, breaker: Breaker) -> List[int]:
+        now = time.monotonic()
+        fresh = [schedule_id for schedule_id, since in sorted(breaker.deferred.items(), key=lambda item: item[1])
+                 if cls.requeue_max_age <= 0 or now - since <= cls.requeue_max_age]
+        dropped = len(breaker.deferred) - len(fresh)
+        if dropped:
+            logger.warning(f"Dropped {dropped} deferred runs for {breaker.serial} older than {cls.requeue_max_age:.0f}s")
+        breaker.deferred = {}
+        return fresh
+
+    @classmethod
+    def states(cls) -> Dict[str, Dict]:
+        """Breaker state per serial for /api/health"""
+        with cls._lock:
+            now = time.monotonic()
+            return {
+                serial: {
+                    'state': breaker.state,
+                    'failures': breaker.outcomes.count(False),
+                    'calls': len(breaker.outcomes),
+                    'retry_in_seconds': (round(max(0.0, breaker.open_seconds - (now - breaker.opened_at)), 1)
+                                         if breaker.state == OPEN else None),
+                    'last_error': breaker.last_error,
+                    'since': datetime.fromtimestamp(breaker.last_change).isoformat(),
+                    'trips': breaker.trips,
+                    'deferred_schedules': sorted(breaker.deferred)
+                }
+                for serial, breaker in cls._breakers.items()
+            }
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Command Journal
+Write-ahead journal of inverter commands plus a single writer thread that group-commits
+journal entries and execution log writes, so one fsync covers everything queued at the time
+"""
+
+import json
+import uuid
+import time
+import queue
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('grott-scheduler.journal')
+
+# Journal entry states
+PENDING = 'pending'          # intent is durable, outcome not yet known
+SETTLED_STATES = ('success', 'failed', 'confirmed', 'replayed', 'abandoned', 'unknown')
+
+Statement = Tuple[str, tuple]
+
+
+class CommandJournal:
+    """
+    Append-only command journal and group-commit writer
+    intent() is written and committed before a command is sent; settle() records the outcome
+    afterwards. Anything passed to write() shares the same transactions, in submission order.
+    """
+
+    _lock = threading.Lock()
+    _queue: 'queue.Queue[Tuple[List[Statement], Future]]' = queue.Queue()
+    _thread: Optional[threading.Thread] = None
+    _connect: Optional[Callable[[], sqlite3.Connection]] = None
+    # Written with each entry, so recovery can tell this process's in-flight commands from earlier ones
+    process_id = uuid.uuid4().hex
+    enabled = True
+    commit_window = 0.005
+    max_batch = 500
+    _stats = {'commits': 0, 'statements': 0, 'groups': 0, 'largest_batch': 0, 'errors': 0}
+
+    @classmethod
+    def attach(cls, connect: Callable[[], sqlite3.Connection]):
+        """Set the connection factory used by the writer thread"""
+        cls._connect = connect
+
+    @classmethod
+    def configure(cls, enabled: bool = None, commit_window_ms: float = None):
+        if enabled is not None:
+            cls.enabled = bool(enabled)
+        if commit_window_ms is not None:
+            cls.commit_window = max(0.0, float(commit_window_ms)) / 1000
+
+    @classmethod
+    def _ensure_writer(cls):
+        with cls._lock:
+            if cls._thread is None or not cls._thread.is_alive():
+                cls._thread = threading.Thread(target=cls._work, name='command-journal', daemon=True)
+                cls._thread.start()
+
+    @classmethod
+    def write(cls, statements: List[Statement], wait: bool = True) -> Future:
+        """
+        Queue statements to run in one transaction with whatever else is queued
+        wait=True blocks until they are committed (and re-raises a failed commit)
+        The future's result is the lastrowid of each statement
+        """
+        cls._ensure_writer()
+        future = Future()
+        cls._queue.put((statements, future))
+        if wait:
+            future.result()
+        return future
+
+    @classmethod
+    def intent(cls, schedule_id: Optional[int], serial: str, command: Dict) -> Optional[str]:
+        """Durably record that a command is about to be sent; returns the journal id"""
+        if not cls.enabled:
+            return None
+        journal_id = uuid.uuid4().hex
+        cls.write([(
+            """INSERT INTO command_journal (id, schedule_id, inverter_serial, command, state, process_id)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (journal_id, schedule_id, serial, json.dumps(command), PENDING, cls.process_id)
+        )])
+        return journal_id
+
+    @classmethod
+    def settle(cls, journal_id: Optional[str], state: str, response: str = None, attempts: int = 0,
+               wait: bool = False):
+        """Record a command's outcome; committed with the next group unless wait is set"""
+        if not journal_id:
+            return
+        cls.write([(
+            """UPDATE command_journal SET state = ?, response = ?, attempts = ?, completed_at = CURRENT_TIMESTAMP
+               WHERE id = ?""",
+            (state, response, attempts, journal_id)
+        )], wait=wait)
+
+    @classmethod
+    def prune(cls, retention_days: int):
+        """Drop settled entries older than retention_days"""
+        placeholders = ','.join('?' * len(SETTLED_STATES))
+        cls.write([(
+            f"""DELETE FROM command_journal
+                WHERE state IN ({placeholders}) AND completed_at < datetime('now', ?)""",
+            SETTLED_STATES + (f'-{int(retention_days)} days',)
+        )])
+
+    @classmethod
+    def _take_batch(cls) -> List[Tuple[List[Statement], Future]]:
+        batch = [cls._queue.get()]
+        deadline = time.monotonic() + cls.commit_window
+        while len(batch) < cls.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(cls._queue.get(timeout=remaining) if remaining > 0 else cls._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    @classmethod
+    def _work(cls):
+        conn = cls._connect()
+        while True:
+            batch = cls._take_batch()
+            try:
+                results = [[conn.execute(sql, params).lastrowid for sql, params in statements]
+                           for statements, _ in batch]
+                conn.commit()
+                failed = {}
+            except sqlite3.Error as e:
+                conn.rollback()
+                logger.error(f"Command journal group commit failed, committing groups one by one: {str(e)}")
+                results, failed = cls._commit_singly(conn, batch)
+
+            statement_count = sum(len(statements) for statements, _ in batch)
+            with cls._lock:
+                cls._stats['commits'] += 1
+                cls._stats['groups'] += len(batch)
+                cls._stats['statements'] += statement_count
+                cls._stats['largest_batch'] = max(cls._stats['largest_batch'], len(batch))
+                cls._stats['errors'] += len(failed)
+            for index, (_, future) in enumerate(batch):
+                if index in failed:
+                    future.set_exception(failed[index])
+                else:
+                    future.set_result(results[index])
+
+    @staticmethod
+    def _commit_singly(conn: sqlite3.Connection, batch) -> Tuple[List[List[int]], Dict[int, Exception]]:
+        """Fallback after a failed group commit, so one bad group doesn't lose the others"""
+        results = []
+        failed = {}
+        for index, (statements, _) in enumerate(batch):
+            try:
+                results.append([conn.execute(sql, params).lastrowid for sql, params in statements])
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                results.append([])
+                failed[index] = e
+        return results, failed
+
+    @classmethod
+    def stats(cls) -> Dict:
+        with cls._lock:
+            stats = dict(cls._stats)
+        stats['queued'] = cls._queue.qsize()
+        stats['groups_per_commit'] = round(stats['groups'] / stats['commits'], 2) if stats['commits'] else 0
+        return stats
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Condition Expressions
+Compiles conditions such as "soc(1014) < 30 and priority(1044) != 2" into evaluators
+"""
+
+import re
+import operator
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+OPERATORS = {
+    '<': operator.lt,
+    '>': operator.gt,
+    '<=': operator.le,
+    '>=': operator.ge,
+    '=': operator.eq,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+TOKEN_PATTERN = re.compile(r"""
+    \s*(?:
+        (?P<number>-?\d+(?:\.\d+)?)
+      | (?P<name>[A-Za-z_][A-Za-z0-9_]*)
+      | (?P<op><=|>=|==|!=|<|>|=)
+      | (?P<punct>[()])
+    )""", re.VERBOSE)
+
+KEYWORDS = ('and', 'or', 'not')
+
+# Compiled conditions are shared by every schedule using the same expression text
+_cache: Dict[str, 'CompiledCondition'] = {}
+_cache_lock = threading.Lock()
+CACHE_LIMIT = 1024
+
+
+class ConditionError(ValueError):
+    """Raised for conditions that cannot be parsed"""
+
+
+class CompiledCondition:
+    """A parsed condition with the registers it needs and a closure-based evaluator"""
+
+    __slots__ = ('expression', 'registers', '_evaluate')
+
+    def __init__(self, expression: str, registers: Tuple[int, ...], evaluate: Callable):
+        self.expression = expression
+        self.registers = registers
+        self._evaluate = evaluate
+
+    def evaluate(self, values: Dict[int, float], margin: float = 0.0) -> Tuple[bool, List[Dict]]:
+        """
+        Evaluate against register values
+        A positive margin widens every threshold in the direction that keeps it met,
+        which is how event triggers apply hysteresis before re-arming
+        Returns: (condition_met, per-term details in evaluation order)
+        """
+        terms = []
+        met = self._evaluate(values, terms, margin)
+        return met, terms
+
+
+def _tokenize(expression: str) -> List[Tuple[str, str]]:
+    tokens = []
+    position = 0
+    expression = expression.rstrip()
+    while position < len(expression):
+        match = TOKEN_PATTERN.match(expression, position)
+        if not match:
+            raise ConditionError(f"Unexpected character at position {position}: '{expression[position:position + 10]}'")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == 'name' and value.lower() in KEYWORDS:
+            kind, value = 'keyword', value.lower()
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser producing evaluator closures"""
+
+    def __init__(self, expression: str):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+        self.registers = []
+
+    def peek(self) -> Tuple[Optional[str], Optional[str]]:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None, None
+
+    def take(self, kind: str, value: str = None) -> str:
+        token_kind, token_value = self.peek()
+        if token_kind != kind or (value is not None and token_value != value):
+            expected = value or kind
+            found = token_value if token_value is not None else 'end of expression'
+            raise ConditionError(f"Expected {expected}, found {found}")
+        self.position += 1
+        return token_value
+
+    def parse(self) -> Callable:
+        evaluate = self.parse_or()
+        if self.position != len(self.tokens):
+            raise ConditionError(f"Unexpected '{self.peek()[1]}'")
+        return evaluate
+
+    def parse_or(self) -> Callable:
+        parts = [self.parse_and()]
+        while self.peek() == ('keyword', 'or'):
+            self.position += 1
+            parts.append(self.parse_and())
+        if len(parts) == 1:
+            return parts[0]
+        return lambda values, terms, margin: any(part(values, terms, margin) for part in parts)
+
+    def parse_and(self) -> Callable:
+        parts = [self.parse_not()]
+        while self.peek() == ('keyword', 'and'):
+            self.position += 1
+            parts.append(self.parse_not())
+        if len(parts) == 1:
+            return parts[0]
+        return lambda values, terms, margin: all(part(values, terms, margin) for part in parts)
+
+    def parse_not(self) -> Callable:
+        if self.peek() == ('keyword', 'not'):
+            self.position += 1
+            inner = self.parse_not()
+            # Negation flips which direction keeps the inner condition met
+            return lambda values, terms, margin: not inner(values, terms, -margin)
+        if self.peek() == ('punct', '('):
+            self.position += 1
+            inner = self.parse_or()
+            self.take('punct', ')')
+            return inner
+        return self.parse_comparison()
+
+    def parse_operand(self) -> Tuple[str, object]:
+        kind, value = self.peek()
+        if kind == 'number':
+            self.position += 1
+            return 'number', float(value)
+        if kind == 'name':
+            self.position += 1
+            self.take('punct', '(')
+            register = self.take('number')
+            self.take('punct', ')')
+            if not register.isdigit():
+                raise ConditionError(f"Invalid register number: {register}")
+            self.registers.append(int(register))
+            return 'register', (value, int(register))
+        raise ConditionError(f"Expected register or number, found {value if value is not None else 'end of expression'}")
+
+    def parse_comparison(self) -> Callable:
+        left = self.parse_operand()
+        op = self.take('op')
+        right = self.parse_operand()
+        if left[0] == 'number' and right[0] == 'number':
+            raise ConditionError("A comparison needs at least one register")
+        compare = OPERATORS[op]
+
+        def operand_value(operand, values):
+            kind, data = operand
+            return data if kind == 'number' else values[data[1]]
+
+        def label(operand):
+            kind, data = operand
+            return _format_number(data) if kind == 'number' else f"{data[0]}({data[1]})"
+
+        text = f"{label(left)} {op} {label(right)}"
+        # Sign of the shift applied to the right-hand side to widen the threshold
+        widen = {'<': 1, '<=': 1, '>': -1, '>=': -1}.get(op, 0)
+
+        def evaluate(values, terms, margin):
+            left_value = operand_value(left, values)
+            right_value = operand_value(right, values)
+            met = compare(left_value, right_value + widen * margin)
+            terms.append({
+                'term': text,
+                'left': left_value,
+                'operator': op,
+                'right': right_value,
+                'met': met
+            })
+            return met
+
+        return evaluate
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def compile_condition(expression: str) -> CompiledCondition:
+    """Compile a condition expression, reusing the cached result for identical text"""
+    expression = (expression or '').strip()
+    if not expression:
+        raise ConditionError("Empty condition")
+    with _cache_lock:
+        compiled = _cache.get(expression)
+    if compiled:
+        return compiled
+
+    parser = _Parser(expression)
+    evaluate = parser.parse()
+    compiled = CompiledCondition(expression, tuple(sorted(set(parser.registers))), evaluate)
+
+    with _cache_lock:
+        if len(_cache) >= CACHE_LIMIT:
+            _cache.clear()
+        _cache[expression] = compiled
+    return compiled
+
+
+def legacy_expression(condition_register, condition_operator: str, condition_value) -> str:
+    """Express a single-register condition (register/operator/value columns) in the condition language"""
+    if condition_operator not in OPERATORS:
+        raise ConditionError(f"Unknown operator: {condition_operator}")
+    try:
+        register = int(condition_register)
+        value = float(condition_value)
+    except (TypeError, ValueError):
+        raise ConditionError(f"Invalid condition register/value: {condition_register}, {condition_value}")
+    return f"register({register}) {condition_operator} {_format_number(value)}"
+
+
+def format_terms(terms: List[Dict], met: bool) -> str:
+    """Render per-term results for execution_logs.condition_details"""
+    parts = [
+        f"{term['term']}: {_format_number(term['left'])} {term['operator']} {_format_number(term['right'])} = {term['met']}"
+        for term in terms
+    ]
+    details = '; '.join(parts)
+    if len(parts) > 1:
+        details += f" => {met}"
+    return details
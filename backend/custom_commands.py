@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Custom Commands
+Custom HTTP requests and scripts run on their own bounded worker pool with a timeout, an output
+cap and (for scripts) a memory cap, so a slow endpoint or script never holds an inverter's worker
+and register writes are never queued behind one
+"""
+
+import os
+import sys
+import signal
+import logging
+import tempfile
+import threading
+import subprocess
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Optional, Tuple
+
+from startup import lazy_import
+from device_workers import DevicePool, DeviceQueueFull
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Loaded on the first custom HTTP request rather than at service start
+requests = lazy_import('requests')
+
+logger = logging.getLogger('grott-scheduler.custom')
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 20
+DEFAULT_TIMEOUT = 10
+DEFAULT_MAX_OUTPUT = 64 * 1024
+DEFAULT_MEMORY_MB = 256
+# Longest timeout a command may ask for
+MAX_TIMEOUT = 300
+READ_CHUNK = 8192
+# How often a running script's output size is checked
+OUTPUT_POLL_SECONDS = 0.1
+
+# Runs in the child before the script: caps its address space, then replaces itself with the script,
+# so the cap is in place before any of the script's code runs and no shell is involved
+LAUNCHER = (
+    "import os, resource, sys\n"
+    "limit = int(sys.argv[1])\n"
+    "soft, hard = resource.getrlimit(resource.RLIMIT_AS)\n"
+    "if hard != resource.RLIM_INFINITY:\n"
+    "    limit = min(limit, hard)\n"
+    "resource.setrlimit(resource.RLIMIT_AS, (limit, hard))\n"
+    "os.execv(sys.argv[2], sys.argv[2:])\n"
+)
+
+
+class CustomCommandError(RuntimeError):
+    """Raised when a custom command fails, times out or can't be run"""
+
+
+class CustomCommands:
+    """Process-wide pool and limits for custom HTTP requests and script steps"""
+
+    _lock = threading.Lock()
+    _pool: Optional[DevicePool] = None
+    _local = threading.local()
+    workers = DEFAULT_WORKERS
+    queue_size = DEFAULT_QUEUE_SIZE
+    timeout = DEFAULT_TIMEOUT
+    max_output = DEFAULT_MAX_OUTPUT
+    memory_mb = DEFAULT_MEMORY_MB
+    # Scripts must live here; empty disables script steps
+    script_dir = ''
+    counts = {'http': 0, 'scripts': 0, 'failed': 0, 'timeouts': 0, 'truncated': 0, 'rejected': 0}
+
+    @classmethod
+    def configure(cls, workers: int = None, queue_size: int = None, timeout: float = None,
+                  max_output: int = None, memory_mb: int = None, script_dir: str = None):
+        """Set the pool size, queue size, default timeout, output cap, script memory cap and script directory"""
+        with cls._lock:
+            if workers:
+                cls.workers = max(1, int(workers))
+            if queue_size:
+                cls.queue_size = max(1, int(queue_size))
+            if timeout:
+                cls.timeout = min(MAX_TIMEOUT, max(1, float(timeout)))
+            if max_output:
+                cls.max_output = max(1024, int(max_output))
+            if memory_mb:
+                cls.memory_mb = max(16, int(memory_mb))
+            if script_dir is not None:
+                cls.script_dir = os.path.realpath(script_dir) if script_dir else ''
+            if cls._pool:
+                cls._pool.queue.maxsize = cls.queue_size
+                cls._pool.resize(cls.workers)
+
+    @classmethod
+    def pool(cls) -> DevicePool:
+        with cls._lock:
+            if not cls._pool:
+                cls._pool = DevicePool('custom', cls.queue_size, cls.workers)
+            return cls._pool
+
+    @classmethod
+    def on_pool(cls) -> bool:
+        """Whether the calling thread is one of the pool's workers"""
+        return getattr(cls._local, 'active', False)
+
+    @classmethod
+    def _count(cls, key: str):
+        with cls._lock:
+            cls.counts[key] += 1
+
+    @classmethod
+    def submit(cls, func: Callable, *args, **kwargs) -> Future:
+        """Queue func(*args, **kwargs) on the custom command pool; raises DeviceQueueFull"""
+        def call():
+            cls._local.active = True
+            try:
+                return func(*args, **kwargs)
+            finally:
+                cls._local.active = False
+        try:
+            return cls.pool().submit(call, (), {})
+        except DeviceQueueFull:
+            cls._count('rejected')
+            raise
+
+    @classmethod
+    def command_timeout(cls, command_data: Dict) -> float:
+        try:
+            return min(MAX_TIMEOUT, max(1, float(command_data.get('timeout') or cls.timeout)))
+        except (TypeError, ValueError):
+            return cls.timeout
+
+    @classmethod
+    def run(cls, command_data: Dict) -> Tuple[bool, str]:
+        """
+        Run one custom command on the pool and wait for it, at most twice its timeout
+        Called from a pool worker (a schedule of custom commands only), it runs in place
+        Returns: (success, response or error)
+        """
+        if cls.on_pool():
+            return cls.execute(command_data)
+        try:
+            future = cls.submit(cls.execute, command_data)
+        except DeviceQueueFull as e:
+            return False, str(e)
+        wait = cls.command_timeout(command_data) * 2
+        try:
+            return future.result(timeout=wait)
+        except FutureTimeout:
+            # Still queued: drop it; already running: it stops at its own timeout
+            future.cancel()
+            cls._count('timeouts')
+            return False, f"Custom command did not finish within {wait:g}s"
+
+    @classmethod
+    def validate(cls, command_data: Dict) -> Optional[str]:
+        """Check a custom command's shape; returns an error message or None"""
+        if bool(command_data.get('url')) == bool(command_data.get('script')):
+            return "A custom command needs either url or script"
+        if command_data.get('script') is not None and not isinstance(command_data['script'], str):
+            return "script must be a file name"
+        args = command_data.get('args', [])
+        if not isinstance(args, list) or not all(isinstance(arg, (str, int, float)) for arg in args):
+            return "args must be a list of strings or numbers"
+        timeout = command_data.get('timeout')
+        if timeout is not None:
+            try:
+                if not 0 < float(timeout) <= MAX_TIMEOUT:
+                    raise ValueError
+            except (TypeError, ValueError):
+                return f"timeout must be between 0 and {MAX_TIMEOUT} seconds"
+        return None
+
+    @classmethod
+    def execute(cls, command_data: Dict) -> Tuple[bool, str]:
+        """Run a custom command in the calling thread, within its limits"""
+        error = cls.validate(command_data)
+        if error:
+            cls._count('failed')
+            return False, error
+        try:
+            if command_data.get('script'):
+                success, result = cls._script(command_data)
+            else:
+                success, result = cls._http(command_data)
+        except CustomCommandError as e:
+            success, result = False, str(e)
+        except Exception as e:
+            logger.error(f"Custom command error: {str(e)}")
+            success, result = False, str(e)
+        if not success:
+            cls._count('failed')
+        return success, result
+
+    @classmethod
+    def _http(cls, command_data: Dict) -> Tuple[bool, str]:
+        """The request, read up to max_output bytes; succeeds on HTTP 200 with body OK, as before"""
+        cls._count('http')
+        timeout = cls.command_timeout(command_data)
+        deadline = time.monotonic() + timeout
+        body = bytearray()
+        try:
+            # The requests timeout is per socket read, so a slow trickle is cut off by the deadline instead
+            with requests.request(method=command_data.get('method', 'GET'), url=command_data['url'],
+                                  timeout=timeout, stream=True) as response:
+                for chunk in response.iter_content(READ_CHUNK):
+                    if time.monotonic() > deadline:
+                        cls._count('timeouts')
+                        raise CustomCommandError(f"No complete response from {command_data['url']} within {timeout:g}s")
+                    body += chunk[:cls.max_output - len(body)]
+                    if len(body) >= cls.max_output:
+                        cls._count('truncated')
+                        break
+                status = response.status_code
+                encoding = response.encoding or 'utf-8'
+        except requests.Timeout:
+            cls._count('timeouts')
+            raise CustomCommandError(f"No response from {command_data['url']} within {timeout:g}s")
+        text = body.decode(encoding, errors='replace')
+        if status == 200 and text.strip() == 'OK':
+            return True, text
+        return False, f"{status} - {text[:200]}"
+
+    @classmethod
+    def script_path(cls, name: str) -> str:
+        """Absolute path of a script in script_dir; raises CustomCommandError for anything outside it"""
+        if not cls.script_dir:
+            raise CustomCommandError("Script steps are disabled (custom_script_dir is not set)")
+        path = os.path.realpath(os.path.join(cls.script_dir, name))
+        if os.path.commonpath([path, cls.script_dir]) != cls.script_dir or not os.path.isfile(path):
+            raise CustomCommandError(f"No script {name} in {cls.script_dir}")
+        return path
+
+    @classmethod
+    def _script(cls, command_data: Dict) -> Tuple[bool, str]:
+        """
+        Run a script from script_dir with its arguments as argv (never through a shell), in its own
+        session with a minimal environment, under the memory cap and timeout; succeeds on exit status 0
+        """
+        cls._count('scripts')
+        name = command_data['script']
+        path = cls.script_path(name)
+        timeout = cls.command_timeout(command_data)
+        argv = ([sys.executable, path] if path.endswith('.py') else [path]) + [str(arg) for arg in command_data.get('args', [])]
+        if resource:
+            argv = [sys.executable, '-c', LAUNCHER, str(cls.memory_mb * 1024 * 1024)] + argv
+
+        # Output goes to a file, not a pipe, so a chatty script can't fill memory; the script is stopped
+        # once the file passes max_output, so it can't fill the disk either
+        with tempfile.TemporaryFile() as output:
+            process = subprocess.Popen(
+                argv, stdin=subprocess.DEVNULL, stdout=output, stderr=subprocess.STDOUT,
+                cwd=cls.script_dir, env={'PATH': os.environ.get('PATH', os.defpath), 'LANG': 'C.UTF-8'},
+                start_new_session=True, close_fds=True
+            )
+            deadline = time.monotonic() + timeout
+            code = None
+            while code is None:
+                try:
+                    code = process.wait(timeout=min(OUTPUT_POLL_SECONDS, max(0.0, deadline - time.monotonic())))
+                except subprocess.TimeoutExpired:
+                    if os.fstat(output.fileno()).st_size > cls.max_output:
+                        cls._stop(process)
+                        break
+                    if time.monotonic() >= deadline:
+                        cls._stop(process)
+                        cls._count('timeouts')
+                        raise CustomCommandError(f"Script {name} did not finish within {timeout:g}s")
+            output.seek(0)
+            data = output.read(cls.max_output + 1)
+        if len(data) > cls.max_output:
+            cls._count('truncated')
+            data = data[:cls.max_output]
+        text = data.decode('utf-8', errors='replace')
+        if code is None:
+            return False, f"Script {name} stopped after more than {cls.max_output} bytes of output: {text[-200:]}"
+        if code == 0:
+            logger.info(f"Script {name} finished")
+            return True, text or f"Script {name} finished"
+        return False, f"Script {name} exited with status {code}: {text[-200:]}"
+
+    @staticmethod
+    def _stop(process: subprocess.Popen):
+        """Kill a script's whole session, so anything it started goes too"""
+        if hasattr(os, 'killpg'):
+            os.killpg(process.pid, signal.SIGKILL)
+        else:
+            process.kill()
+        process.wait()
+
+    @classmethod
+    def stats(cls) -> Dict:
+        pool = cls._pool.stats() if cls._pool else {'queued': 0, 'queue_size': cls.queue_size,
+                                                     'workers': 0, 'running': 0}
+        with cls._lock:
+            counts = dict(cls.counts)
+        return dict(pool, **counts, timeout=cls.timeout, max_output=cls.max_output, memory_mb=cls.memory_mb,
+                    scripts_enabled=bool(cls.script_dir))
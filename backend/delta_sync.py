@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Delta Sync
+Serves the records changed since a client's last sync, from the sync_changes table that
+triggers on the synced tables keep current (see schema.sql). Clients keep a local copy,
+send back the version they were given and apply the diff.
+"""
+
+import sqlite3
+import logging
+from typing import Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger('grott-scheduler.sync')
+
+# Record loader: given primary keys (or None for every record), the records as the API returns them
+Loader = Callable[[Optional[Sequence]], List[Dict]]
+
+
+class DeltaSync:
+    """Change feed over the synced tables"""
+
+    _connect: Optional[Callable[[], sqlite3.Connection]] = None
+    # record type -> (key type, loader)
+    _sources: Dict[str, tuple] = {}
+
+    @classmethod
+    def attach(cls, connect: Callable[[], sqlite3.Connection]):
+        cls._connect = connect
+
+    @classmethod
+    def source(cls, record_type: str, key_type: type, loader: Loader):
+        """Register a synced table; record_type must match the table name its triggers record"""
+        cls._sources[record_type] = (key_type, loader)
+
+    @classmethod
+    def version(cls) -> int:
+        conn = cls._connect()
+        try:
+            return conn.execute("SELECT COALESCE(MAX(version), 0) FROM sync_changes").fetchone()[0]
+        finally:
+            conn.close()
+
+    @classmethod
+    def changes(cls, since: Optional[int] = None, types: Sequence[str] = None) -> Dict:
+        """
+        Records changed after version `since`, per record type: {"changed": [...], "deleted": [keys]}
+        since=None, or a version newer than the server's (e.g. a restored database), returns everything with full=True
+        """
+        types = [t for t in (types or cls._sources) if t in cls._sources]
+        conn = cls._connect()
+        try:
+            version = conn.execute("SELECT COALESCE(MAX(version), 0) FROM sync_changes").fetchone()[0]
+            full = since is None or since < 0 or since > version
+            rows = [] if full or not types else conn.execute(
+                f"""SELECT record_type, record_key, deleted FROM sync_changes
+                    WHERE version > ? AND version <= ? AND record_type IN ({','.join('?' * len(types))})""",
+                (since, version) + tuple(types)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        result = {'version': version, 'since': since, 'full': full, 'changes': {}}
+        for record_type in types:
+            key_type, loader = cls._sources[record_type]
+            if full:
+                result['changes'][record_type] = {'changed': loader(None), 'deleted': []}
+                continue
+            changed = [key_type(row['record_key']) for row in rows if row['record_type'] == record_type and not row['deleted']]
+            deleted = [key_type(row['record_key']) for row in rows if row['record_type'] == record_type and row['deleted']]
+            if changed or deleted:
+                result['changes'][record_type] = {'changed': loader(changed) if changed else [], 'deleted': deleted}
+        return result
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Device Workers
+Bounded command queue and worker threads per inverter, so a slow device only delays its own commands
+"""
+
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+logger = logging.getLogger('grott-scheduler.devices')
+
+DEFAULT_QUEUE_SIZE = 20
+DEFAULT_WORKERS = 1
+
+
+class DeviceQueueFull(RuntimeError):
+    """Raised when a device already has its maximum number of pending commands"""
+
+
+class DevicePool:
+    """Queue and worker threads for one inverter serial"""
+
+    def __init__(self, serial: str, queue_size: int, workers: int):
+        self.serial = serial
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.workers = []
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        # Seconds commands waited in the queue and spent running, for the averages in stats()
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.run_total = 0.0
+        self.run_max = 0.0
+        self._lock = threading.Lock()
+        self.resize(workers)
+
+    def resize(self, workers: int):
+        """Start more worker threads if needed; extra threads are never stopped"""
+        while len(self.workers) < max(1, workers):
+            thread = threading.Thread(
+                target=self._work,
+                name=f"device-{self.serial}-{len(self.workers) + 1}",
+                daemon=True
+            )
+            thread.start()
+            self.workers.append(thread)
+
+    def submit(self, func: Callable, args: tuple, kwargs: dict) -> Future:
+        future = Future()
+        try:
+            self.queue.put_nowait((future, func, args, kwargs, time.monotonic()))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            raise DeviceQueueFull(f"Command queue for {self.serial} is full ({self.queue.maxsize} pending)")
+        return future
+
+    def _work(self):
+        while True:
+            future, func, args, kwargs, queued_at = self.queue.get()
+            if not future.set_running_or_notify_cancel():
+                self.queue.task_done()
+                continue
+            started = time.monotonic()
+            with self._lock:
+                self.running += 1
+                self.wait_total += started - queued_at
+                self.wait_max = max(self.wait_max, started - queued_at)
+            try:
+                future.set_result(func(*args, **kwargs))
+                with self._lock:
+                    self.completed += 1
+            except Exception as e:
+                logger.error(f"Error running command for {self.serial}: {str(e)}")
+                future.set_exception(e)
+                with self._lock:
+                    self.failed += 1
+            finally:
+                elapsed = time.monotonic() - started
+                with self._lock:
+                    self.running -= 1
+                    self.run_total += elapsed
+                    self.run_max = max(self.run_max, elapsed)
+                self.queue.task_done()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            finished = self.completed + self.failed
+            return {
+                'queued': self.queue.qsize(),
+                'queue_size': self.queue.maxsize,
+                'workers': len(self.workers),
+                'running': self.running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'avg_wait_ms': round(self.wait_total / finished * 1000, 1) if finished else 0,
+                'max_wait_ms': round(self.wait_max * 1000, 1),
+                'avg_run_ms': round(self.run_total / finished * 1000, 1) if finished else 0,
+                'max_run_ms': round(self.run_max * 1000, 1)
+            }
+
+
+class DeviceWorkers:
+    """Process-wide registry of per-device pools, created on first use"""
+
+    _lock = threading.Lock()
+    _pools: Dict[str, DevicePool] = {}
+    queue_size = DEFAULT_QUEUE_SIZE
+    workers = DEFAULT_WORKERS
+    overrides: Dict[str, int] = {}
+
+    @classmethod
+    def configure(cls, queue_size: int = None, workers: int = None, overrides: Dict[str, int] = None):
+        """Set default queue size and workers per device, plus per-serial queue sizes"""
+        with cls._lock:
+            if queue_size:
+                cls.queue_size = max(1, int(queue_size))
+            if workers:
+                cls.workers = max(1, int(workers))
+            if overrides is not None:
+                cls.overrides = {serial: int(size) for serial, size in overrides.items() if size}
+            for serial, pool in cls._pools.items():
+                # Queue.put checks maxsize on every call, so resizing in place is safe
+                pool.queue.maxsize = cls.overrides.get(serial, cls.queue_size)
+                pool.resize(cls.workers)
+
+    @classmethod
+    def pool(cls, serial: str) -> DevicePool:
+        with cls._lock:
+            pool = cls._pools.get(serial)
+            if not pool:
+                pool = DevicePool(serial, cls.overrides.get(serial, cls.queue_size), cls.workers)
+                cls._pools[serial] = pool
+            return pool
+
+    @classmethod
+    def submit(cls, serial: str, func: Callable, *args, **kwargs) -> Future:
+        """Queue func(*args, **kwargs) on the device's workers; raises DeviceQueueFull"""
+        return cls.pool(serial).submit(func, args, kwargs)
+
+    @classmethod
+    def fan_out(cls, serials: List[str], func: Callable, *args, **kwargs) -> Dict[str, Future]:
+        """
+        Queue func(serial, *args, **kwargs) on every device at once
+        Devices whose queue is full get a future holding DeviceQueueFull
+        """
+        futures = {}
+        for serial in serials:
+            try:
+                futures[serial] = cls.submit(serial, func, serial, *args, **kwargs)
+            except DeviceQueueFull as e:
+                future = Future()
+                future.set_exception(e)
+                futures[serial] = future
+        return futures
+
+    @classmethod
+    def stats(cls) -> Dict[str, Dict]:
+        with cls._lock:
+            pools = dict(cls._pools)
+        return {serial: pool.stats() for serial, pool in pools.items()}
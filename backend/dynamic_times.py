@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Dynamic Fire Times
+Sunrise/sunset computed locally from latitude/longitude and cheapest tariff windows,
+cached per day and refreshed at midnight
+"""
+
+import json
+import math
+import logging
+import threading
+from datetime import datetime, timedelta, date
+from typing import Dict, List, Optional, Tuple
+
+import pytz
+
+logger = logging.getLogger('grott-scheduler.dynamic')
+
+SOLAR_TYPES = ('sunrise', 'sunset')
+TARIFF_TYPES = ('tariff',)
+DYNAMIC_TYPES = SOLAR_TYPES + TARIFF_TYPES
+
+# Official sunrise/sunset zenith including refraction and the solar disc radius
+SUN_ZENITH = 90.833
+
+
+def sun_event_utc(day: date, latitude: float, longitude: float, event: str) -> Optional[datetime]:
+    """
+    Compute sunrise or sunset for a date as a UTC datetime (Almanac for Computers algorithm)
+    Returns None when the sun does not rise or set that day (polar day/night)
+    """
+    rising = event == 'sunrise'
+    day_of_year = day.timetuple().tm_yday
+    lng_hour = longitude / 15
+    t = day_of_year + (((6 if rising else 18) - lng_hour) / 24)
+
+    mean_anomaly = (0.9856 * t) - 3.289
+    true_longitude = (mean_anomaly + (1.916 * math.sin(math.radians(mean_anomaly)))
+                      + (0.020 * math.sin(math.radians(2 * mean_anomaly))) + 282.634) % 360
+
+    right_ascension = math.degrees(math.atan(0.91764 * math.tan(math.radians(true_longitude)))) % 360
+    # Right ascension must be in the same quadrant as the true longitude
+    right_ascension += (math.floor(true_longitude / 90) * 90) - (math.floor(right_ascension / 90) * 90)
+    right_ascension /= 15
+
+    sin_dec = 0.39782 * math.sin(math.radians(true_longitude))
+    cos_dec = math.cos(math.asin(sin_dec))
+    cos_hour = ((math.cos(math.radians(SUN_ZENITH)) - (sin_dec * math.sin(math.radians(latitude))))
+                / (cos_dec * math.cos(math.radians(latitude))))
+    if cos_hour > 1 or cos_hour < -1:
+        return None
+
+    hour_angle = math.degrees(math.acos(cos_hour))
+    if rising:
+        hour_angle = 360 - hour_angle
+    hour_angle /= 15
+
+    local_mean_time = hour_angle + right_ascension - (0.06571 * t) - 6.622
+    utc_hours = (local_mean_time - lng_hour) % 24
+    event = datetime.combine(day, datetime.min.time()) + timedelta(minutes=round(utc_hours * 60))
+    return pytz.utc.localize(event)
+
+
+def tariff_minute_rates(periods: List[Dict], day: date) -> List[Optional[float]]:
+    """Expand tariff periods into per-minute rates for one day (None where no rate applies)"""
+    rates = [None] * 1440
+    for period in periods:
+        days_of_week = period.get('days_of_week')
+        if isinstance(days_of_week, str):
+            days_of_week = json.loads(days_of_week)
+        if days_of_week and day.weekday() not in [int(d) for d in days_of_week]:
+            continue
+        start_h, start_m = map(int, period['start_time'].split(':')[:2])
+        end_h, end_m = map(int, period['end_time'].split(':')[:2])
+        start = start_h * 60 + start_m
+        end = end_h * 60 + end_m
+        # A period ending at or before its start wraps past midnight
+        minutes = range(start, end) if end > start else list(range(start, 1440)) + list(range(0, end))
+        for minute in minutes:
+            rates[minute] = float(period['rate'])
+    return rates
+
+
+def cheapest_window(rates: List[Optional[float]], window_minutes: int) -> Optional[int]:
+    """Start minute of the cheapest fully-priced window of the given length, earliest on ties"""
+    window_minutes = max(1, min(int(window_minutes), 1440))
+    best_start = None
+    best_cost = None
+    cost = 0.0
+    missing = 0
+    for minute in range(1440):
+        if rates[minute] is None:
+            missing += 1
+        else:
+            cost += rates[minute]
+        if minute >= window_minutes:
+            dropped = rates[minute - window_minutes]
+            if dropped is None:
+                missing -= 1
+            else:
+                cost -= dropped
+        if minute >= window_minutes - 1 and missing == 0:
+            if best_cost is None or cost < best_cost - 1e-9:
+                best_cost = cost
+                best_start = minute - window_minutes + 1
+    return best_start
+
+
+class DynamicTimes:
+    """Per-day cache of computed solar and tariff fire times"""
+
+    _lock = threading.RLock()
+    _cache: Dict[Tuple, Optional[datetime]] = {}
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    tariffs: List[Dict] = []
+
+    @classmethod
+    def configure(cls, latitude=None, longitude=None):
+        """Set the install location; cached solar times for an old location are dropped"""
+        with cls._lock:
+            try:
+                location = (float(latitude), float(longitude))
+            except (TypeError, ValueError):
+                location = (None, None)
+            if location != (cls.latitude, cls.longitude):
+                cls.latitude, cls.longitude = location
+                cls._cache = {k: v for k, v in cls._cache.items() if k[0] not in SOLAR_TYPES}
+
+    @classmethod
+    def set_tariffs(cls, tariffs: List[Dict]):
+        """Replace the tariff table; cached cheapest windows are dropped"""
+        with cls._lock:
+            cls.tariffs = [dict(t) for t in tariffs]
+            cls._cache = {k: v for k, v in cls._cache.items() if k[0] not in TARIFF_TYPES}
+
+    @classmethod
+    def prune(cls, today: date):
+        """Drop cached days before today; called by the midnight refresh"""
+        with cls._lock:
+            cls._cache = {k: v for k, v in cls._cache.items() if k[1] >= today}
+
+    @classmethod
+    def _solar_event(cls, event: str, day: date) -> Optional[datetime]:
+        key = (event, day)
+        with cls._lock:
+            if key not in cls._cache:
+                if cls.latitude is None or cls.longitude is None:
+                    return None
+                cls._cache[key] = sun_event_utc(day, cls.latitude, cls.longitude, event)
+            return cls._cache[key]
+
+    @classmethod
+    def _tariff_start(cls, day: date, window_minutes: int) -> Optional[int]:
+        key = ('tariff', day, window_minutes)
+        with cls._lock:
+            if key not in cls._cache:
+                cls._cache[key] = cheapest_window(tariff_minute_rates(cls.tariffs, day), window_minutes)
+            return cls._cache[key]
+
+    @classmethod
+    def day_fires(cls, spec: Dict, day: date, tz, localize) -> List[datetime]:
+        """Fire times for a dynamic schedule on a local day, as aware datetimes"""
+        schedule_type = spec.get('schedule_type')
+        offset = timedelta(minutes=int(spec.get('offset_minutes') or 0))
+
+        if schedule_type in SOLAR_TYPES:
+            # Find the event whose local date is this day; UTC dates can differ by one
+            for utc_day in (day, day - timedelta(days=1), day + timedelta(days=1)):
+                event = cls._solar_event(schedule_type, utc_day)
+                if event and event.astimezone(tz).date() == day:
+                    return [(event + offset).astimezone(tz)]
+            return []
+
+        elif schedule_type in TARIFF_TYPES:
+            start = cls._tariff_start(day, int(spec.get('window_minutes') or 60))
+            if start is None:
+                return []
+            return [tz.normalize(localize(tz, day, start // 60, start % 60) + offset)]
+
+        return []
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Fire Calendar
+Precomputes timezone-aware fire times for schedules, handling DST gaps and overlaps
+"""
+
+import json
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta, date, time as dt_time
+from typing import Dict, List, Optional, Set, Tuple
+
+import pytz
+from apscheduler.triggers.base import BaseTrigger
+
+from dynamic_times import DynamicTimes, DYNAMIC_TYPES
+
+logger = logging.getLogger('grott-scheduler.calendar')
+
+DEFAULT_TIMEZONE = 'UTC'
+DEFAULT_CALENDAR_DAYS = 7
+# Weekly schedules need at least eight days of lookahead to always have a next fire
+MIN_HORIZON = timedelta(days=8)
+
+
+def resolve_timezone(name: Optional[str], fallback: str = DEFAULT_TIMEZONE):
+    """Return a pytz timezone for name, falling back when empty or unknown"""
+    for candidate in (name, fallback, DEFAULT_TIMEZONE):
+        if not candidate:
+            continue
+        try:
+            return pytz.timezone(candidate)
+        except pytz.UnknownTimeZoneError:
+            logger.warning(f"Unknown timezone '{candidate}', falling back")
+    return pytz.utc
+
+
+def is_valid_timezone(name: str) -> bool:
+    """Check whether name is a known timezone"""
+    try:
+        pytz.timezone(name)
+        return True
+    except pytz.UnknownTimeZoneError:
+        return False
+
+
+def localize_wall_time(tz, day: date, hour: int, minute: int) -> datetime:
+    """
+    Convert a local wall-clock time on a given day to an aware datetime
+    DST gap: the time does not exist, fire at the same offset after the jump
+    DST overlap: the time occurs twice, fire once on the first occurrence
+    """
+    naive = datetime.combine(day, dt_time(hour, minute))
+    try:
+        return tz.localize(naive, is_dst=None)
+    except pytz.NonExistentTimeError:
+        return tz.normalize(tz.localize(naive, is_dst=False))
+    except pytz.AmbiguousTimeError:
+        return tz.localize(naive, is_dst=True)
+
+
+def parse_time(value: str) -> Tuple[int, int]:
+    """Parse HH:MM into (hour, minute)"""
+    hour, minute = map(int, value.split(':')[:2])
+    return hour, minute
+
+
+class FireCalendar:
+    """Process-wide cache of each schedule's upcoming fire times"""
+
+    _lock = threading.RLock()
+    # schedule_id -> {'spec': dict, 'fires': [aware datetimes], 'start': datetime, 'horizon': datetime}
+    _entries: Dict[int, Dict] = {}
+    days = DEFAULT_CALENDAR_DAYS
+    default_timezone = DEFAULT_TIMEZONE
+
+    @classmethod
+    def configure(cls, default_timezone: str = None, days: int = None):
+        """Set install-wide timezone and calendar horizon, rebuilding cached entries"""
+        with cls._lock:
+            changed = False
+            if default_timezone and default_timezone != cls.default_timezone:
+                cls.default_timezone = default_timezone
+                changed = True
+            if days and int(days) != cls.days:
+                cls.days = max(1, int(days))
+                changed = True
+            if changed:
+                for schedule_id, entry in list(cls._entries.items()):
+                    cls._build(schedule_id, entry['spec'])
+
+    @staticmethod
+    def schedule_timezone(spec: Dict):
+        """Timezone a schedule fires in: its own setting or the install default"""
+        return resolve_timezone(spec.get('timezone'), FireCalendar.default_timezone)
+
+    @staticmethod
+    def day_times(spec: Dict, day: date, tz) -> List[Tuple[int, int]]:
+        """Local (hour, minute) fire times for a schedule on a given day"""
+        schedule_type = spec.get('schedule_type')
+
+        if schedule_type == 'daily':
+            return [parse_time(spec['time'])]
+
+        elif schedule_type == 'weekly':
+            days_of_week = spec.get('days_of_week') or []
+            if isinstance(days_of_week, str):
+                days_of_week = json.loads(days_of_week)
+            if day.weekday() in [int(d) for d in days_of_week]:
+                return [parse_time(spec['time'])]
+
+        elif schedule_type == 'once':
+            if spec.get('specific_date') == day.isoformat():
+                return [parse_time(spec['time'])]
+
+        return []
+
+    @staticmethod
+    def day_fires(spec: Dict, day: date, tz) -> List[datetime]:
+        """Aware fire times for a schedule on a given local day"""
+        if spec.get('schedule_type') in DYNAMIC_TYPES:
+            # Dynamic schedules run daily unless restricted to certain weekdays
+            days_of_week = spec.get('days_of_week')
+            if isinstance(days_of_week, str):
+                days_of_week = json.loads(days_of_week)
+            if days_of_week and day.weekday() not in [int(d) for d in days_of_week]:
+                return []
+            return DynamicTimes.day_fires(spec, day, tz, localize_wall_time)
+
+        return [localize_wall_time(tz, day, hour, minute) for hour, minute in FireCalendar.day_times(spec, day, tz)]
+
+    @staticmethod
+    def expand(spec: Dict, start: datetime, end: datetime) -> List[datetime]:
+        """Compute all fire times for a schedule in [start, end)"""
+        tz = FireCalendar.schedule_timezone(spec)
+        # One day of slack on each side: a wall time can shift across midnight in UTC
+        day = start.astimezone(tz).date() - timedelta(days=1)
+        last_day = end.astimezone(tz).date() + timedelta(days=1)
+
+        if spec.get('schedule_type') == 'once' and spec.get('specific_date'):
+            try:
+                once_day = datetime.strptime(spec['specific_date'], '%Y-%m-%d').date()
+            except ValueError:
+                return []
+            if once_day < day or once_day > last_day:
+                return []
+            day = last_day = once_day
+
+        fires = []
+        while day <= last_day:
+            for fire in FireCalendar.day_fires(spec, day, tz):
+                if start <= fire < end:
+                    fires.append(fire)
+            day += timedelta(days=1)
+
+        fires.sort()
+        return fires
+
+    @classmethod
+    def _build(cls, schedule_id: int, spec: Dict, now: datetime = None) -> Dict:
+        now = now or datetime.now(pytz.utc)
+        horizon = now + max(timedelta(days=cls.days), MIN_HORIZON)
+        try:
+            fires = cls.expand(spec, now, horizon)
+        except Exception as e:
+            logger.error(f"Error computing fire calendar for schedule {schedule_id}: {str(e)}")
+            fires = []
+        entry = {'spec': spec, 'fires': fires, 'start': now, 'horizon': horizon}
+        cls._entries[schedule_id] = entry
+        return entry
+
+    @classmethod
+    def build(cls, schedule_id: int, spec: Dict, now: datetime = None) -> List[datetime]:
+        """Precompute and cache the fire calendar for a schedule"""
+        with cls._lock:
+            return list(cls._build(schedule_id, dict(spec), now)['fires'])
+
+    @classmethod
+    def invalidate(cls, schedule_id: int):
+        """Drop a schedule from the calendar"""
+        with cls._lock:
+            cls._entries.pop(schedule_id, None)
+
+    @classmethod
+    def refresh(cls, now: datetime = None):
+        """Roll every cached calendar forward to a fresh horizon"""
+        with cls._lock:
+            for schedule_id, entry in list(cls._entries.items()):
+                cls._build(schedule_id, entry['spec'], now)
+
+    @classmethod
+    def has(cls, schedule_id: int) -> bool:
+        with cls._lock:
+            return schedule_id in cls._entries
+
+    @classmethod
+    def schedule_ids(cls) -> Set[int]:
+        with cls._lock:
+            return set(cls._entries)
+
+    @classmethod
+    def next_fire(cls, schedule_id: int, after: datetime, inclusive: bool = False) -> Optional[datetime]:
+        """First cached fire time after (or at, if inclusive) the given moment"""
+        with cls._lock:
+            entry = cls._entries.get(schedule_id)
+            if not entry:
+                return None
+            if after < entry['start'] or after >= entry['horizon'] - MIN_HORIZON / 2:
+                # Close to the end of the precomputed window, roll the calendar forward
+                entry = cls._build(schedule_id, entry['spec'], after)
+            for fire in entry['fires']:
+                if fire > after or (inclusive and fire == after):
+                    return fire
+            return None
+
+    @classmethod
+    def upcoming(cls, limit: int = 10, now: datetime = None) -> List[Tuple[datetime, int]]:
+        """Next fire time of each schedule, soonest first"""
+        now = now or datetime.now(pytz.utc)
+        with cls._lock:
+            candidates = []
+            for schedule_id in list(cls._entries):
+                fire = cls.next_fire(schedule_id, now, inclusive=True)
+                if fire:
+                    candidates.append((fire, schedule_id))
+        return heapq.nsmallest(limit, candidates)
+
+    @classmethod
+    def window(cls, start: datetime, end: datetime, schedule_ids: List[int] = None) -> List[Tuple[datetime, int]]:
+        """All cached fire times in [start, end), merged in time order"""
+        with cls._lock:
+            ids = schedule_ids if schedule_ids is not None else list(cls._entries)
+            streams = []
+            for schedule_id in ids:
+                entry = cls._entries.get(schedule_id)
+                if not entry:
+                    continue
+                if start < entry['start'] or end > entry['horizon']:
+                    fires = cls.expand(entry['spec'], start, end)
+                else:
+                    fires = [f for f in entry['fires'] if start <= f < end]
+                streams.append([(fire, schedule_id) for fire in fires])
+        return list(heapq.merge(*streams))
+
+
+class CalendarTrigger(BaseTrigger):
+    """APScheduler trigger that fires on a schedule's precomputed calendar"""
+
+    def __init__(self, schedule_id: int):
+        self.schedule_id = schedule_id
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        if previous_fire_time is None:
+            return FireCalendar.next_fire(self.schedule_id, now, inclusive=True)
+        return FireCalendar.next_fire(self.schedule_id, max(previous_fire_time, now))
+
+    def __str__(self):
+        return f"calendar[schedule_{self.schedule_id}]"
+
+    def __repr__(self):
+        return f"<CalendarTrigger (schedule_id={self.schedule_id})>"
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Logging
+Non-blocking logging: records are queued by the calling thread and written by one listener
+thread to a size-rotated file and stdout, as text or JSON lines
+"""
+
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, List, Optional
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Ties together the log lines of one schedule execution (condition check, attempts, outcome)
+correlation_id: contextvars.ContextVar = contextvars.ContextVar('correlation_id', default=None)
+
+
+@contextmanager
+def correlation(value: str):
+    """Tag every record logged by this thread inside the block with a correlation id"""
+    token = correlation_id.set(value)
+    try:
+        yield value
+    finally:
+        correlation_id.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the caller's correlation id onto the record before it crosses to the listener thread"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = correlation_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Rate-limit chatty call sites: at most `burst` INFO/DEBUG records per `seconds` from one
+    logger and line; the next record let through notes how many were dropped
+    Warnings and errors are never sampled
+    """
+
+    def __init__(self, burst: int = 20, seconds: float = 10.0):
+        super().__init__()
+        self.burst = burst
+        self.seconds = seconds
+        self._lock = threading.Lock()
+        # (logger, line) -> [window start, emitted in window, dropped since last emitted]
+        self._sites: Dict[tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or self.burst <= 0:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.seconds:
+                dropped = site[2] if site else 0
+                self._sites[key] = [now, 1, 0]
+            elif site[1] < self.burst:
+                site[1] += 1
+                dropped = site[2]
+                site[2] = 0
+            else:
+                site[2] += 1
+                return False
+        if dropped:
+            record.msg = f"{record.getMessage()} [{dropped} similar messages suppressed]"
+            record.args = None
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName
+        }
+        if getattr(record, 'correlation_id', None):
+            entry['correlation_id'] = record.correlation_id
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class TextFormatter(logging.Formatter):
+    """The classic text format, with the correlation id appended when there is one"""
+
+    def __init__(self):
+        super().__init__(TEXT_FORMAT)
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        cid = getattr(record, 'correlation_id', None)
+        return f"{text} [{cid}]" if cid else text
+
+
+class LogSetup:
+    """Owns the root queue handler and the listener thread; reconfigurable at runtime"""
+
+    _lock = threading.Lock()
+    _queue: 'queue.Queue' = queue.Queue(-1)
+    _listener: Optional[QueueListener] = None
+    _queue_handler: Optional[QueueHandler] = None
+    _sampling = SamplingFilter()
+    _levels: Dict[str, int] = {}
+
+    @classmethod
+    def setup(cls, log_file: str, json_format: bool = False, max_bytes: int = 10 * 1024 * 1024,
+              backup_count: int = 5, level: str = 'INFO', levels: Dict[str, str] = None,
+              sample_burst: int = 20, sample_seconds: float = 10.0):
+        """(Re)build the file and stdout handlers behind the queue and apply levels"""
+        with cls._lock:
+            formatter = JsonFormatter() if json_format else TextFormatter()
+            file_handler = RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count)
+            stream_handler = logging.StreamHandler(sys.stdout)
+            for handler in (file_handler, stream_handler):
+                handler.setFormatter(formatter)
+
+            if cls._listener:
+                cls._listener.stop()
+                for handler in cls._listener.handlers:
+                    handler.close()
+            cls._listener = QueueListener(cls._queue, file_handler, stream_handler, respect_handler_level=False)
+            cls._listener.start()
+
+            root = logging.getLogger()
+            if cls._queue_handler is None:
+                cls._queue_handler = QueueHandler(cls._queue)
+                cls._queue_handler.addFilter(ContextFilter())
+                cls._queue_handler.addFilter(cls._sampling)
+                for handler in list(root.handlers):
+                    root.removeHandler(handler)
+                root.addHandler(cls._queue_handler)
+                atexit.register(cls.stop)
+            cls._sampling.burst = int(sample_burst)
+            cls._sampling.seconds = float(sample_seconds)
+
+            root.setLevel(logging.getLevelName(level.upper()) if isinstance(level, str) else level)
+            # Loggers no longer listed go back to inheriting the root level
+            for name in cls._levels:
+                logging.getLogger(name).setLevel(logging.NOTSET)
+            cls._levels = {}
+            for name, name_level in (levels or {}).items():
+                logging.getLogger(name).setLevel(name_level.upper())
+                cls._levels[name] = name_level.upper()
+
+    @classmethod
+    def stop(cls):
+        """Flush queued records; called at exit"""
+        with cls._lock:
+            if cls._listener:
+                cls._listener.stop()
+                cls._listener = None
+
+
+def is_valid_level(level: str) -> bool:
+    """Check whether level is a logging level name such as INFO or warning"""
+    return isinstance(level, str) and isinstance(logging.getLevelName(level.strip().upper()), int)
+
+
+def parse_levels(spec: str) -> Dict[str, str]:
+    """Parse 'grott-scheduler.events=DEBUG,apscheduler=WARNING' into a dict, ignoring bad entries"""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and is_valid_level(level):
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def invalid_levels(spec: str) -> List[str]:
+    """Entries of a log_levels spec that parse_levels would ignore"""
+    return [item.strip() for item in (spec or '').split(',')
+            if item.strip() and not (item.partition('=')[0].strip() and is_valid_level(item.partition('=')[2]))]
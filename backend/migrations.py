@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Schema Migrations
+Ordered, transactional migration steps recorded in a schema_version table, so startup only
+does work that hasn't been applied yet. Backfills over large tables run online, in small
+committed batches on a background thread, instead of one long write lock at startup.
+"""
+
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('grott-scheduler.migrations')
+
+# Columns added since their table was first created; the schema step adds any that are missing
+# before it creates indexes or seeds rows that use them
+SCHEMA_COLUMNS = [
+    ('schedules', 'parent_schedule_id', 'INTEGER DEFAULT NULL'),
+    ('schedules', 'execution_order', 'INTEGER DEFAULT 0'),
+    ('schedules', 'continue_on_parent_failure', 'BOOLEAN DEFAULT 0'),
+    ('schedules', 'timezone', 'TEXT DEFAULT NULL'),
+    ('schedules', 'offset_minutes', 'INTEGER DEFAULT 0'),
+    ('schedules', 'window_minutes', 'INTEGER DEFAULT 60'),
+    ('schedules', 'condition_expression', 'TEXT DEFAULT NULL'),
+    ('schedules', 'trigger_expression', 'TEXT DEFAULT NULL'),
+    ('schedules', 'trigger_hysteresis', 'REAL DEFAULT 0'),
+    ('schedules', 'trigger_debounce_seconds', 'INTEGER DEFAULT 0'),
+    ('registers', 'type', 'INTEGER DEFAULT 0'),
+    ('registers', 'group_id', 'INTEGER'),
+    ('register_values', 'last_written_at', 'TIMESTAMP DEFAULT NULL'),
+    ('execution_logs', 'parent_execution_id', 'INTEGER DEFAULT NULL'),
+    ('execution_logs', 'execution_order', 'INTEGER DEFAULT 0'),
+    ('execution_logs', 'outcome', 'TEXT DEFAULT NULL'),
+    ('execution_logs', 'trace', 'TEXT DEFAULT NULL'),
+    ('command_journal', 'process_id', 'TEXT DEFAULT NULL'),
+]
+
+SCHEMA_VERSION_TABLE = """CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    checksum TEXT, -- repeatable steps are re-applied when this changes
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    duration_ms REAL
+)"""
+
+ONLINE_BATCH_SIZE = 2000
+# Pause between online batches so scheduled executions get the write lock in between
+ONLINE_BATCH_PAUSE = 0.05
+
+
+class Migration:
+    """
+    One schema step
+    - apply(conn, schema) runs inside a single transaction with the schema_version update
+    - repeatable steps carry a checksum and run again whenever it changes
+    - online steps give a table and an UPDATE over a rowid range (two ? placeholders) that the
+      runner applies batch by batch after startup; the step must leave finished rows unmatched
+    """
+
+    __slots__ = ('version', 'name', 'apply', 'repeatable', 'online')
+
+    def __init__(self, version: int, name: str, apply: Callable = None, repeatable: bool = False,
+                 online: Tuple[str, str] = None):
+        self.version = version
+        self.name = name
+        self.apply = apply
+        self.repeatable = repeatable
+        self.online = online
+
+
+def strip_comments(statement: str) -> str:
+    """Drop whole-line -- comments"""
+    return '\n'.join(line for line in statement.splitlines() if not line.strip().startswith('--')).strip()
+
+
+def split_statements(script: str) -> List[str]:
+    """Split an SQL script into statements (comments and quoted semicolons are handled by sqlite3)"""
+    statements = []
+    current = ''
+    for line in script.splitlines(True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ''
+    if strip_comments(current):
+        statements.append(current.strip())
+    return statements
+
+
+def table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [col[1] for col in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+
+
+def is_create_table(statement: str) -> bool:
+    return strip_comments(statement).upper().startswith('CREATE TABLE')
+
+
+def create_table_statement(schema: str, table: str) -> str:
+    """The schema's CREATE TABLE statement for one table"""
+    for statement in split_statements(schema):
+        if is_create_table(statement) and f'EXISTS {table} (' in statement:
+            return statement
+    raise KeyError(f"No CREATE TABLE for {table} in schema")
+
+
+def key_register_values_by_inverter(conn: sqlite3.Connection, schema: str):
+    """register_values used to be keyed by register only; rebuild it per inverter for the default one"""
+    old_columns = table_columns(conn, 'register_values')
+    if not old_columns or 'inverter_serial' in old_columns:
+        return
+    conn.execute("ALTER TABLE register_values RENAME TO register_values_unkeyed")
+    conn.execute("DROP INDEX IF EXISTS idx_register_values_updated")
+    conn.execute(create_table_statement(schema, 'register_values'))
+    new_columns = table_columns(conn, 'register_values')
+    columns = ', '.join(c for c in old_columns if c in new_columns)
+    conn.execute(
+        f"""INSERT OR REPLACE INTO register_values (inverter_serial, {columns})
+            SELECT (SELECT value FROM config WHERE key = 'inverter_serial'), {columns}
+            FROM register_values_unkeyed"""
+    )
+    conn.execute("DROP TABLE register_values_unkeyed")
+    logger.info("Keyed register_values by inverter serial")
+
+
+def apply_schema(conn: sqlite3.Connection, schema: str):
+    """
+    Create missing tables, add missing columns, then run the rest of schema.sql (indexes and
+    INSERT OR IGNORE seeds), so new config keys and registers reach existing databases
+    """
+    statements = split_statements(schema)
+    for statement in statements:
+        if is_create_table(statement):
+            conn.execute(statement)
+    for table, column, definition in SCHEMA_COLUMNS:
+        if column not in table_columns(conn, table):
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            logger.info(f"Added column {table}.{column}")
+    for statement in statements:
+        if not is_create_table(statement):
+            conn.execute(statement)
+
+
+def assign_register_groups(conn: sqlite3.Connection, schema: str):
+    """Group and type registers created before register groups existed"""
+    for first, last, group_id, hex_registers in ((1070, 1088, 2, (1080, 1081, 1083, 1084, 1086, 1087)),
+                                                 (1090, 1108, 4, (1100, 1101, 1103, 1104, 1106, 1107)),
+                                                 (1109, 1118, 6, (1110, 1111, 1113, 1114, 1116, 1117))):
+        placeholders = ','.join('?' * len(hex_registers))
+        conn.execute(
+            f"""UPDATE registers SET group_id = ?,
+                    type = CASE WHEN register_number IN ({placeholders}) THEN 0 ELSE 1 END
+                WHERE group_id IS NULL AND register_number BETWEEN ? AND ?""",
+            (group_id,) + hex_registers + (first, last)
+        )
+    conn.execute("UPDATE registers SET group_id = 8, type = 1 WHERE group_id IS NULL AND register_number IN (122, 123)")
+    conn.execute("UPDATE registers SET group_id = 1 WHERE group_id IS NULL")
+
+
+MIGRATIONS = [
+    Migration(1, 'Key register_values by inverter serial', key_register_values_by_inverter),
+    Migration(2, 'Apply schema.sql (tables, columns, indexes, seeds)', apply_schema, repeatable=True),
+    Migration(3, 'Assign register groups to pre-group registers', assign_register_groups),
+    Migration(4, 'Backfill execution_logs.outcome', online=(
+        'execution_logs',
+        """UPDATE execution_logs
+           SET outcome = CASE WHEN condition_met = 0 THEN 'condition_not_met'
+                              WHEN success THEN 'success' ELSE 'failed' END
+           WHERE outcome IS NULL AND id BETWEEN ? AND ?"""
+    )),
+]
+
+
+class Migrator:
+    """Applies pending MIGRATIONS to the database behind a connection factory"""
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], schema_file: str,
+                 migrations: List[Migration] = None):
+        self.connect = connect
+        self.schema_file = schema_file
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda m: m.version)
+        self._thread: Optional[threading.Thread] = None
+        self._progress: Dict[int, Dict] = {}
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = self.connect()
+        # Transactions are managed explicitly so DDL and the version row commit together
+        conn.isolation_level = None
+        return conn
+
+    def _checksum(self, schema: str) -> str:
+        columns = repr(SCHEMA_COLUMNS).encode()
+        return hashlib.sha1(schema.encode() + columns).hexdigest()[:16]
+
+    @staticmethod
+    def _applied(conn: sqlite3.Connection) -> Dict[int, Optional[str]]:
+        conn.execute(SCHEMA_VERSION_TABLE)
+        return {row[0]: row[1] for row in conn.execute("SELECT version, checksum FROM schema_version")}
+
+    def pending(self, conn: sqlite3.Connection, schema: str, online: bool = False) -> List[Migration]:
+        applied = self._applied(conn)
+        checksum = self._checksum(schema)
+        return [
+            m for m in self.migrations
+            if bool(m.online) == online
+            and (m.version not in applied or (m.repeatable and applied[m.version] != checksum))
+        ]
+
+    def _record(self, conn: sqlite3.Connection, migration: Migration, checksum: Optional[str], started: float):
+        conn.execute(
+            """INSERT OR REPLACE INTO schema_version (version, name, checksum, applied_at, duration_ms)
+               VALUES (?, ?, ?, CURRENT_TIMESTAMP, ?)""",
+            (migration.version, migration.name, checksum, round((time.perf_counter() - started) * 1000, 1))
+        )
+
+    def migrate(self) -> List[int]:
+        """Apply pending offline steps in order, each in its own transaction; returns the versions applied"""
+        with open(self.schema_file, 'r') as f:
+            schema = f.read()
+        checksum = self._checksum(schema)
+        conn = self._open()
+        applied = []
+        try:
+            for migration in self.pending(conn, schema):
+                started = time.perf_counter()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    migration.apply(conn, schema)
+                    self._record(conn, migration, checksum if migration.repeatable else None, started)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    logger.error(f"Migration {migration.version} ({migration.name}) failed, rolled back")
+                    raise
+                applied.append(migration.version)
+                logger.info(f"Applied migration {migration.version}: {migration.name} "
+                            f"({(time.perf_counter() - started) * 1000:.0f} ms)")
+        finally:
+            conn.close()
+        if not applied:
+            logger.debug("Database schema up to date")
+        return applied
+
+    def pending_online(self) -> List[Migration]:
+        with open(self.schema_file, 'r') as f:
+            schema = f.read()
+        conn = self._open()
+        try:
+            return self.pending(conn, schema, online=True)
+        finally:
+            conn.close()
+
+    def start_online(self, batch_size: int = ONLINE_BATCH_SIZE, pause: float = ONLINE_BATCH_PAUSE):
+        """Run pending online steps on a background thread"""
+        pending = self.pending_online()
+        if not pending or (self._thread and self._thread.is_alive()):
+            return
+        self._thread = threading.Thread(target=self.run_online, args=(pending, batch_size, pause),
+                                        name='migrations-online', daemon=True)
+        self._thread.start()
+
+    def run_online(self, migrations: List[Migration], batch_size: int = ONLINE_BATCH_SIZE,
+                   pause: float = ONLINE_BATCH_PAUSE):
+        """Apply online steps one committed rowid range at a time; resumable because finished rows no longer match"""
+        conn = self._open()
+        try:
+            for migration in migrations:
+                table, update = migration.online
+                started = time.perf_counter()
+                high = conn.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {table}").fetchone()[0]
+                low = conn.execute(f"SELECT COALESCE(MIN(rowid), 1) FROM {table}").fetchone()[0]
+                updated = 0
+                for first in range(low, high + 1, batch_size):
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        updated += conn.execute(update, (first, first + batch_size - 1)).rowcount
+                        conn.execute("COMMIT")
+                    except sqlite3.Error:
+                        conn.execute("ROLLBACK")
+                        raise
+                    with self._lock:
+                        self._progress[migration.version] = {
+                            'name': migration.name, 'rows_updated': updated,
+                            'done': round(min(1.0, (first + batch_size - low) / max(1, high - low + 1)), 3)
+                        }
+                    time.sleep(pause)
+                conn.execute("BEGIN IMMEDIATE")
+                self._record(conn, migration, None, started)
+                conn.execute("COMMIT")
+                logger.info(f"Applied online migration {migration.version}: {migration.name} "
+                            f"({updated} rows in {time.perf_counter() - started:.1f} s)")
+        except sqlite3.Error as e:
+            logger.error(f"Online migration stopped, will resume on next start: {str(e)}")
+        finally:
+            conn.close()
+
+    def status(self) -> Dict:
+        """Applied versions plus progress of any online step"""
+        conn = self._open()
+        try:
+            self._applied(conn)
+            rows = conn.execute("SELECT version, name, applied_at, duration_ms FROM schema_version ORDER BY version").fetchall()
+        finally:
+            conn.close()
+        applied = {row[0] for row in rows}
+        with self._lock:
+            progress = {version: dict(p) for version, p in self._progress.items() if version not in applied}
+        return {
+            'version': max(applied) if applied else 0,
+            'latest': self.migrations[-1].version if self.migrations else 0,
+            'applied': [{'version': r[0], 'name': r[1], 'applied_at': r[2], 'duration_ms': r[3]} for r in rows],
+            'pending': [{'version': m.version, 'name': m.name, 'online': bool(m.online)}
+                        for m in self.migrations if m.version not in applied],
+            'online_progress': progress
+        }
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Notifications
+Background alert dispatcher: failures are queued, de-duplicated, aggregated into one message
+per batch and rate-limited before a transport (Pushover by default) delivers them
+"""
+
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from startup import lazy_import
+
+# Loaded on the first delivery rather than at service start
+requests = lazy_import('requests')
+
+logger = logging.getLogger('grott-scheduler.notify')
+
+PUSHOVER_URL = 'https://api.pushover.net/1/messages.json'
+# Pushover rejects messages longer than this
+MAX_MESSAGE_LENGTH = 1024
+MAX_DELIVERY_TRIES = 3
+
+
+class PushoverTransport:
+    """Delivers messages through the Pushover API (or anything that speaks it, such as a local stub)"""
+
+    def __init__(self, user_key: str, api_token: str, url: str = PUSHOVER_URL, timeout: float = 10):
+        self.user_key = user_key
+        self.api_token = api_token
+        self.url = url or PUSHOVER_URL
+        self.timeout = timeout
+
+    def send(self, title: str, message: str, priority: int = 0):
+        response = requests.post(self.url, data={
+            'token': self.api_token,
+            'user': self.user_key,
+            'title': title,
+            'message': message,
+            'priority': priority
+        }, timeout=self.timeout)
+        if response.status_code != 200:
+            raise RuntimeError(f"Pushover returned HTTP {response.status_code}: {response.text[:100]}")
+
+
+class Alert:
+    """Pending failure alert; repeats of the same key are folded into one"""
+
+    __slots__ = ('key', 'name', 'message', 'first_at', 'count')
+
+    def __init__(self, key: str, name: str, message: str):
+        self.key = key
+        self.name = name
+        self.message = message
+        self.first_at = time.time()
+        self.count = 1
+
+
+class Notifier:
+    """
+    Process-wide alert pipeline with one delivery thread
+    - the first alert opens a batch; everything arriving within batch_seconds goes out as one message
+    - an alert whose key was delivered less than dedup_seconds ago is counted but not re-sent
+    - at most max_per_hour messages are sent; alerts held back by the limit join the next message
+    """
+
+    _lock = threading.Lock()
+    _queue: 'queue.Queue[Optional[Alert]]' = queue.Queue()
+    _thread: Optional[threading.Thread] = None
+    transport = None
+    title = 'Grott Scheduler Alert'
+    batch_seconds = 30.0
+    dedup_seconds = 600.0
+    max_per_hour = 6
+    _stats = {'queued': 0, 'sent': 0, 'alerts_delivered': 0, 'deduplicated': 0, 'rate_limited': 0,
+              'failed': 0, 'dropped': 0}
+
+    @classmethod
+    def configure(cls, transport=None, batch_seconds: float = None, dedup_seconds: float = None,
+                  max_per_hour: int = None):
+        """Set delivery settings; transport is any object with send(title, message, priority)"""
+        with cls._lock:
+            cls.transport = transport
+            if batch_seconds is not None:
+                cls.batch_seconds = max(0.0, float(batch_seconds))
+            if dedup_seconds is not None:
+                cls.dedup_seconds = max(0.0, float(dedup_seconds))
+            if max_per_hour is not None:
+                cls.max_per_hour = max(1, int(max_per_hour))
+
+    @classmethod
+    def notify(cls, key: str, name: str, message: str):
+        """Queue an alert without blocking the caller"""
+        with cls._lock:
+            if cls._thread is None or not cls._thread.is_alive():
+                cls._thread = threading.Thread(target=cls._work, name='notifier', daemon=True)
+                cls._thread.start()
+            cls._stats['queued'] += 1
+        cls._queue.put(Alert(key, name, message))
+
+    @classmethod
+    def flush(cls):
+        """Deliver the pending batch now (still subject to the rate limit)"""
+        cls._queue.put(None)
+
+    @classmethod
+    def _count(cls, key: str, amount: int = 1):
+        with cls._lock:
+            cls._stats[key] += amount
+
+    @classmethod
+    def _work(cls):
+        pending: Dict[str, Alert] = {}
+        delivered: Dict[str, float] = {}
+        sent_times = deque()
+        deadline = None
+        tries = 0
+
+        while True:
+            timeout = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+            try:
+                alert = cls._queue.get(timeout=timeout)
+                if alert is None:
+                    deadline = time.monotonic() if pending else None
+                elif alert.key in pending:
+                    pending[alert.key].count += 1
+                elif time.time() - delivered.get(alert.key, float('-inf')) < cls.dedup_seconds:
+                    cls._count('deduplicated')
+                else:
+                    pending[alert.key] = alert
+                    if deadline is None:
+                        deadline = time.monotonic() + cls.batch_seconds
+                if deadline is None or time.monotonic() < deadline:
+                    continue
+            except queue.Empty:
+                pass
+
+            if not pending:
+                deadline = None
+                continue
+
+            while sent_times and time.monotonic() - sent_times[0] >= 3600:
+                sent_times.popleft()
+            if len(sent_times) >= cls.max_per_hour:
+                # Hold the batch until the oldest message in the hour ages out
+                cls._count('rate_limited')
+                deadline = sent_times[0] + 3600
+                continue
+
+            alerts = sorted(pending.values(), key=lambda a: a.first_at)
+            transport = cls.transport
+            if transport is None:
+                logger.warning(f"Pushover credentials not configured, dropping {len(alerts)} alerts")
+                cls._count('dropped', len(alerts))
+                pending.clear()
+                deadline = None
+                continue
+
+            try:
+                transport.send(cls.title, cls.compose(alerts))
+                logger.info(f"Notification sent for {len(alerts)} alerts")
+                cls._count('sent')
+                cls._count('alerts_delivered', len(alerts))
+                now = time.time()
+                for alert in alerts:
+                    delivered[alert.key] = now
+                sent_times.append(time.monotonic())
+                pending.clear()
+                deadline = None
+                tries = 0
+            except Exception as e:
+                tries += 1
+                cls._count('failed')
+                logger.error(f"Failed to send notification (try {tries}/{MAX_DELIVERY_TRIES}): {str(e)}")
+                if tries >= MAX_DELIVERY_TRIES:
+                    cls._count('dropped', len(alerts))
+                    pending.clear()
+                    deadline = None
+                    tries = 0
+                else:
+                    deadline = time.monotonic() + max(cls.batch_seconds, 5.0)
+
+            # Forget delivery times that can no longer suppress anything
+            cutoff = time.time() - cls.dedup_seconds
+            for key in [key for key, at in delivered.items() if at < cutoff]:
+                del delivered[key]
+
+    @staticmethod
+    def compose(alerts: List[Alert]) -> str:
+        """One alert is sent as-is; several become a summary with one line each"""
+        if len(alerts) == 1 and alerts[0].count == 1:
+            return alerts[0].message[:MAX_MESSAGE_LENGTH]
+        minutes = max(1, round((time.time() - alerts[0].first_at) / 60))
+        names = {alert.name for alert in alerts}
+        lines = [f"{len(names)} schedule{'s' if len(names) != 1 else ''} failed in the last {minutes} minute{'s' if minutes != 1 else ''}"]
+        for alert in alerts:
+            repeat = f" (x{alert.count})" if alert.count > 1 else ''
+            lines.append(f"- {alert.name}{repeat}: {alert.message.splitlines()[-1]}")
+        message = '\n'.join(lines)
+        if len(message) > MAX_MESSAGE_LENGTH:
+            message = message[:MAX_MESSAGE_LENGTH - 3] + '...'
+        return message
+
+    @classmethod
+    def stats(cls) -> Dict:
+        with cls._lock:
+            stats = dict(cls._stats)
+        stats['pending'] = cls._queue.qsize()
+        return stats
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Register Catalog
+Process-wide, read-mostly copy of the registers and register_groups tables, so metadata
+lookups by register number don't go to SQLite. Reloaded lazily after invalidate().
+Per-inverter values stay in register_values and are not cached here.
+"""
+
+import sys
+import time
+import sqlite3
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from codec import RegisterFormat, DECIMAL, register_format
+
+logger = logging.getLogger('grott-scheduler.registers')
+
+# registers columns, in table order
+COLUMNS = ('register_number', 'name', 'description', 'write_only', 'read_register', 'value_type',
+           'type', 'min_value', 'max_value', 'category', 'group_id')
+
+
+class RegisterInfo:
+    """One registers row plus its group name, block and codec format"""
+
+    __slots__ = COLUMNS + ('group_name', 'block', 'format')
+
+    def __init__(self, row: sqlite3.Row, group_name: Optional[str], block: Optional[Tuple[int, int]]):
+        for column in COLUMNS:
+            setattr(self, column, row[column])
+        self.group_name = group_name
+        self.block = block
+        self.format = register_format(row['type'], row['value_type'])
+
+    def as_dict(self) -> Dict:
+        """The registers row, as the API has always returned it"""
+        return {column: getattr(self, column) for column in COLUMNS}
+
+
+class RegisterCatalog:
+    """Register metadata indexed by register number, with precomputed group and block membership"""
+
+    _lock = threading.Lock()
+    _connect: Optional[Callable[[], sqlite3.Connection]] = None
+    _blocks: Sequence[Tuple[int, int]] = ()
+    _block_of: Dict[int, Tuple[int, int]] = {}
+    _registers: Optional[Dict[int, RegisterInfo]] = None
+    _groups: List[Dict] = []
+    _members: Dict[Optional[int], Tuple[int, ...]] = {}
+    _stats = {'loads': 0, 'invalidations': 0, 'last_load_ms': 0.0}
+
+    @classmethod
+    def attach(cls, connect: Callable[[], sqlite3.Connection], blocks: Sequence[Tuple[int, int]] = ()):
+        """Set the connection factory and the register blocks that are always written together"""
+        cls._connect = connect
+        cls._blocks = tuple(blocks)
+        cls._block_of = {reg: block for block in cls._blocks for reg in range(block[0], block[1] + 1)}
+        cls.invalidate()
+
+    @classmethod
+    def invalidate(cls):
+        """Drop the catalog after register or group changes; the next lookup reloads it"""
+        with cls._lock:
+            cls._registers = None
+            cls._stats['invalidations'] += 1
+
+    @classmethod
+    def _load(cls) -> Dict[int, RegisterInfo]:
+        registers = cls._registers
+        if registers is not None:
+            return registers
+        with cls._lock:
+            if cls._registers is not None:
+                return cls._registers
+            started = time.perf_counter()
+            conn = cls._connect()
+            try:
+                groups = conn.execute("SELECT * FROM register_groups ORDER BY id").fetchall()
+                rows = conn.execute("SELECT * FROM registers ORDER BY group_id, register_number").fetchall()
+            finally:
+                conn.close()
+
+            names = {group['id']: group['name'] for group in groups}
+            registers = {}
+            members: Dict[Optional[int], List[int]] = {}
+            for row in rows:
+                number = row['register_number']
+                registers[number] = RegisterInfo(row, names.get(row['group_id']), cls._block_of.get(number))
+                members.setdefault(row['group_id'], []).append(number)
+
+            cls._groups = [dict(group) for group in groups]
+            cls._members = {group_id: tuple(numbers) for group_id, numbers in members.items()}
+            cls._registers = registers
+            cls._stats['loads'] += 1
+            cls._stats['last_load_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            logger.debug(f"Register catalog loaded: {len(registers)} registers, {len(groups)} groups")
+            return registers
+
+    @classmethod
+    def get(cls, register_number: int) -> Optional[RegisterInfo]:
+        return cls._load().get(int(register_number))
+
+    @classmethod
+    def all(cls) -> List[RegisterInfo]:
+        """Every register, ordered by group then number"""
+        return list(cls._load().values())
+
+    @classmethod
+    def format(cls, register_number: int) -> RegisterFormat:
+        """Codec format of a register; unknown registers are plain decimal"""
+        info = cls._load().get(int(register_number))
+        return info.format if info else DECIMAL
+
+    @classmethod
+    def formats(cls, registers: Iterable[int]) -> Dict[int, RegisterFormat]:
+        catalog = cls._load()
+        formats = {}
+        for reg in registers:
+            info = catalog.get(int(reg))
+            formats[int(reg)] = info.format if info else DECIMAL
+        return formats
+
+    @classmethod
+    def block(cls, register_number: int) -> Optional[Tuple[int, int]]:
+        """The (start, end) block a register must be written with, if any"""
+        return cls._block_of.get(register_number)
+
+    @classmethod
+    def groups(cls) -> List[Dict]:
+        cls._load()
+        return [dict(group) for group in cls._groups]
+
+    @classmethod
+    def group_registers(cls, group_id: Optional[int]) -> Tuple[int, ...]:
+        """Register numbers in a group, in number order"""
+        cls._load()
+        return cls._members.get(group_id, ())
+
+    @classmethod
+    def memory(cls) -> Dict:
+        """Size of the loaded catalog: container and record overhead plus the values they hold"""
+        registers = cls._registers
+        stats = dict(cls._stats)
+        if registers is None:
+            return dict(stats, loaded=False, registers=0, bytes=0)
+
+        seen = set()
+
+        def size(obj) -> int:
+            # Small ints and interned strings are shared, so count each object once
+            if id(obj) in seen or obj is None:
+                return 0
+            seen.add(id(obj))
+            return sys.getsizeof(obj)
+
+        total = size(registers) + size(cls._members) + size(cls._groups)
+        for number, info in registers.items():
+            total += size(number) + size(info)
+            total += sum(size(getattr(info, column)) for column in COLUMNS)
+            total += size(info.group_name) + size(info.block)
+        for group_id, numbers in cls._members.items():
+            total += size(group_id) + size(numbers)
+        for group in cls._groups:
+            total += size(group) + sum(size(value) for value in group.values())
+        return dict(stats, loaded=True, registers=len(registers), groups=len(cls._groups), bytes=total,
+                    bytes_per_register=round(total / len(registers), 1) if registers else 0)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Register Events
+Fires event schedules when register values observed by polling, sync or reads cross a threshold
+"""
+
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Set
+
+from conditions import compile_condition, format_terms, CompiledCondition
+
+logger = logging.getLogger('grott-scheduler.events')
+
+
+class EventSubscription:
+    """Trigger state for one event schedule"""
+
+    __slots__ = ('schedule_id', 'serial', 'condition', 'hysteresis', 'debounce',
+                 'latched', 'pending_since')
+
+    def __init__(self, schedule_id: int, serial: str, condition: CompiledCondition,
+                 hysteresis: float, debounce: int):
+        self.schedule_id = schedule_id
+        self.serial = serial
+        self.condition = condition
+        self.hysteresis = hysteresis
+        self.debounce = debounce
+        # None until the first full evaluation establishes a baseline
+        self.latched: Optional[bool] = None
+        self.pending_since: Optional[float] = None
+
+
+class RegisterEvents:
+    """Register-change event stream with an index from register to subscribed schedules"""
+
+    _lock = threading.RLock()
+    _values: Dict[tuple, float] = {}
+    _subscriptions: Dict[int, EventSubscription] = {}
+    _index: Dict[int, Set[int]] = {}
+    _fire: Optional[Callable[[int, str], None]] = None
+    _defer: Optional[Callable[[int, float], None]] = None
+
+    @classmethod
+    def attach(cls, fire: Callable[[int, str], None], defer: Callable[[int, float], None]):
+        """
+        Set callbacks: fire(schedule_id, details) runs a schedule,
+        defer(schedule_id, seconds) calls check_pending(schedule_id) later
+        """
+        cls._fire = fire
+        cls._defer = defer
+
+    @classmethod
+    def subscribe(cls, schedule_id: int, serial: str, expression: str,
+                  hysteresis: float = 0.0, debounce: int = 0):
+        """Register (or replace) an event schedule's trigger"""
+        condition = compile_condition(expression)
+        with cls._lock:
+            cls.unsubscribe(schedule_id)
+            subscription = EventSubscription(schedule_id, serial, condition,
+                                             float(hysteresis or 0), int(debounce or 0))
+            cls._subscriptions[schedule_id] = subscription
+            for reg in condition.registers:
+                cls._index.setdefault(reg, set()).add(schedule_id)
+            # Establish the baseline from values already seen
+            cls._evaluate(subscription)
+
+    @classmethod
+    def unsubscribe(cls, schedule_id: int):
+        with cls._lock:
+            subscription = cls._subscriptions.pop(schedule_id, None)
+            if not subscription:
+                return
+            for reg in subscription.condition.registers:
+                dependents = cls._index.get(reg)
+                if dependents:
+                    dependents.discard(schedule_id)
+                    if not dependents:
+                        del cls._index[reg]
+
+    @classmethod
+    def schedule_ids(cls) -> Set[int]:
+        with cls._lock:
+            return set(cls._subscriptions)
+
+    @classmethod
+    def subscribed_registers(cls) -> Dict[str, List[int]]:
+        """Registers event schedules depend on, grouped by inverter serial"""
+        with cls._lock:
+            registers: Dict[str, Set[int]] = {}
+            for subscription in cls._subscriptions.values():
+                registers.setdefault(subscription.serial, set()).update(subscription.condition.registers)
+            return {serial: sorted(regs) for serial, regs in registers.items()}
+
+    @classmethod
+    def publish(cls, serial: str, values: Dict[int, float]):
+        """
+        Feed observed register values into the stream
+        Only schedules subscribed to a register whose value changed are re-evaluated
+        """
+        with cls._lock:
+            changed = []
+            for reg, value in values.items():
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    continue
+                key = (serial, int(reg))
+                if cls._values.get(key) != value:
+                    cls._values[key] = value
+                    changed.append(int(reg))
+
+            affected = set()
+            for reg in changed:
+                affected.update(cls._index.get(reg, ()))
+
+            for schedule_id in sorted(affected):
+                subscription = cls._subscriptions.get(schedule_id)
+                if subscription and subscription.serial == serial:
+                    cls._evaluate(subscription)
+
+    @classmethod
+    def check_pending(cls, schedule_id: int):
+        """Re-check a debounced trigger once its debounce period has passed"""
+        with cls._lock:
+            subscription = cls._subscriptions.get(schedule_id)
+            if subscription and subscription.pending_since is not None:
+                cls._evaluate(subscription)
+
+    @classmethod
+    def _evaluate(cls, subscription: EventSubscription):
+        values = {}
+        for reg in subscription.condition.registers:
+            value = cls._values.get((subscription.serial, reg))
+            if value is None:
+                return
+            values[reg] = value
+
+        met, terms = subscription.condition.evaluate(values)
+
+        if subscription.latched is None:
+            # First full observation: a condition already true is not a crossing
+            subscription.latched = met
+            return
+
+        if subscription.latched:
+            # Re-arm only once the values move back past the threshold by the hysteresis
+            still_met, _ = subscription.condition.evaluate(values, subscription.hysteresis)
+            if not still_met:
+                subscription.latched = False
+            return
+
+        if not met:
+            subscription.pending_since = None
+            return
+
+        now = time.monotonic()
+        if subscription.debounce > 0:
+            if subscription.pending_since is None:
+                subscription.pending_since = now
+                if cls._defer:
+                    cls._defer(subscription.schedule_id, subscription.debounce)
+                return
+            # Small tolerance: the deferred check may run a moment early by the monotonic clock
+            if now - subscription.pending_since < subscription.debounce - 0.5:
+                return
+
+        subscription.latched = True
+        subscription.pending_since = None
+        details = format_terms(terms, met)
+        logger.info(f"Event trigger fired for schedule {subscription.schedule_id}: {details}")
+        if cls._fire:
+            cls._fire(subscription.schedule_id, details)
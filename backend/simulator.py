@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Schedule Simulator
+Replays schedules over a period without sending anything: fire times come from the fire calendar's
+rules and each run is expanded into the Grott requests it would make, giving per-minute request and
+byte counts, overlapping writes to the same registers and the busiest minutes per inverter
+"""
+
+import json
+import heapq
+import bisect
+import logging
+import time as time_module
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta, date, time as dt_time
+from typing import Dict, List, Sequence, Tuple
+
+import pytz
+
+from fire_calendar import FireCalendar, localize_wall_time
+from dynamic_times import DYNAMIC_TYPES
+
+logger = logging.getLogger('grott-scheduler.simulator')
+
+EPOCH = datetime(1970, 1, 1, tzinfo=pytz.utc)
+# Any Monday: daily and weekly fire times only depend on the weekday
+MONDAY = date(2024, 1, 1)
+MAX_DAYS = 366
+
+# Request line plus headers each way, and the JSON bytes per register in a read response
+HTTP_REQUEST_OVERHEAD = 150
+HTTP_RESPONSE_OVERHEAD = 150
+READ_BYTES_PER_REGISTER = 16
+
+# One HTTP request a run makes: kind is 'read', 'write' or 'custom', registers the (start, end) it touches
+Request = namedtuple('Request', 'method url kind registers')
+
+
+def request_bytes(request: Request) -> int:
+    """Estimated bytes on the wire for a request and its response"""
+    size = len(request.url) + HTTP_REQUEST_OVERHEAD + HTTP_RESPONSE_OVERHEAD
+    if request.kind == 'read' and request.registers:
+        size += READ_BYTES_PER_REGISTER * (request.registers[1] - request.registers[0] + 1)
+    elif request.kind == 'write':
+        size += len('OK')
+    return size
+
+
+def epoch_minute(moment: datetime) -> int:
+    return int((moment - EPOCH).total_seconds() // 60)
+
+
+def fires_at(fires: List[int], minute: int) -> bool:
+    """Whether a sorted fire list contains minute"""
+    i = bisect.bisect_left(fires, minute)
+    return i < len(fires) and fires[i] == minute
+
+
+class RunPlan:
+    """What one run of a schedule does: when it fires, the inverter it talks to and the requests it makes"""
+
+    __slots__ = ('schedule_id', 'name', 'spec', 'serial', 'requests', 'writes')
+
+    def __init__(self, schedule_id: int, name: str, spec: Dict, serial: str,
+                 requests: Sequence[Request], writes: Sequence[Tuple[int, int]]):
+        self.schedule_id = schedule_id
+        self.name = name
+        self.spec = spec
+        self.serial = serial
+        self.requests = tuple(requests)
+        # Register units written: a whole block, or a single register
+        self.writes = tuple(dict.fromkeys(writes))
+
+
+class ScheduleSimulator:
+    """Fire times and request load for a set of run plans over [start, end)"""
+
+    def __init__(self, start: datetime, end: datetime):
+        self.start = start
+        self.end = end
+        self.first_minute = epoch_minute(start)
+        self.minutes = max(0, epoch_minute(end) - self.first_minute)
+        self._days: Dict[str, List[Tuple[List[int], List[date]]]] = {}
+        self._fires: Dict[tuple, List[int]] = {}
+
+    def minute_label(self, index: int) -> str:
+        return (EPOCH + timedelta(minutes=self.first_minute + index)).isoformat()
+
+    def _weekdays(self, tz) -> List[Tuple[List[int], List[date]]]:
+        """
+        Per weekday (Monday first) of the local days in range: the minute index of local midnight for
+        days with a fixed UTC offset, and the days with a DST change, which go through localize_wall_time
+        """
+        weekdays = self._days.get(tz.zone)
+        if weekdays is not None:
+            return weekdays
+        weekdays = [([], []) for _ in range(7)]
+        # One day of slack on each side, as FireCalendar.expand does
+        day = self.start.astimezone(tz).date() - timedelta(days=1)
+        last_day = self.end.astimezone(tz).date() + timedelta(days=1)
+        while day <= last_day:
+            offsets = {tz.localize(datetime.combine(day, wall), is_dst=is_dst).utcoffset()
+                       for wall in (dt_time(0, 0), dt_time(23, 59)) for is_dst in (True, False)}
+            bases, dst_days = weekdays[day.weekday()]
+            if len(offsets) == 1:
+                offset = int(offsets.pop().total_seconds() // 60)
+                bases.append((day - EPOCH.date()).days * 1440 - offset - self.first_minute)
+            else:
+                dst_days.append(day)
+            day += timedelta(days=1)
+        self._days[tz.zone] = weekdays
+        return weekdays
+
+    def fire_minutes(self, spec: Dict) -> List[int]:
+        """Sorted minute indexes (from start) a schedule fires at, shared by schedules with the same timing"""
+        tz = FireCalendar.schedule_timezone(spec)
+        key = (spec.get('schedule_type'), spec.get('time'), str(spec.get('days_of_week')), spec.get('specific_date'),
+               tz.zone, spec.get('offset_minutes'), spec.get('window_minutes'))
+        fires = self._fires.get(key)
+        if fires is not None:
+            return fires
+
+        first = self.first_minute
+        if spec.get('schedule_type') in ('daily', 'weekly'):
+            # Same rule as the fire calendar, evaluated once per weekday instead of once per day
+            if isinstance(spec.get('days_of_week'), str):
+                spec = dict(spec, days_of_week=json.loads(spec['days_of_week']))
+            minutes = []
+            for weekday, (bases, dst_days) in enumerate(self._weekdays(tz)):
+                for hour, minute in FireCalendar.day_times(spec, MONDAY + timedelta(days=weekday), tz):
+                    wall = hour * 60 + minute
+                    minutes.extend([base + wall for base in bases])
+                    minutes.extend(epoch_minute(localize_wall_time(tz, day, hour, minute)) - first for day in dst_days)
+        elif spec.get('schedule_type') in DYNAMIC_TYPES + ('once',):
+            minutes = [epoch_minute(fire) - first for fire in FireCalendar.expand(spec, self.start, self.end)]
+        else:
+            minutes = []
+
+        minutes.sort()
+        fires = minutes[bisect.bisect_left(minutes, 0):bisect.bisect_left(minutes, self.minutes)]
+        self._fires[key] = fires
+        return fires
+
+    def run(self, plans: Sequence[RunPlan], top: int = 10, capacity: int = None, detail: bool = False) -> Dict:
+        """
+        Aggregate the requests every plan makes over the period
+        capacity: Grott requests per minute an inverter link can take; minutes above it are counted per inverter
+        detail: include every non-empty minute, not just the busiest
+        """
+        started = time_module.perf_counter()
+        count = self.minutes
+        totals = {'runs': 0, 'requests': 0, 'reads': 0, 'writes': 0, 'custom_requests': 0, 'bytes': 0}
+        serials: Dict[str, Dict] = {}
+        # Minute counts are built with Counter.update over whole fire lists, which runs in C
+        requests_by_serial: Dict[str, Counter] = {}
+        # serial -> [(schedule_id, bytes per run, fires)]
+        fired: Dict[str, List[Tuple[int, int, List[int]]]] = {}
+        # (serial, unit written) -> [(schedule_id, fires)]
+        writers: Dict[Tuple[str, Tuple[int, int]], List[Tuple[int, List[int]]]] = {}
+
+        for plan in plans:
+            fires = self.fire_minutes(plan.spec)
+            if not fires:
+                continue
+            grott = sum(1 for r in plan.requests if r.kind != 'custom')
+            size = sum(request_bytes(r) for r in plan.requests)
+            runs = len(fires)
+            totals['runs'] += runs
+            totals['requests'] += grott * runs
+            totals['reads'] += sum(1 for r in plan.requests if r.kind == 'read') * runs
+            totals['writes'] += sum(1 for r in plan.requests if r.kind == 'write') * runs
+            totals['custom_requests'] += (len(plan.requests) - grott) * runs
+            totals['bytes'] += size * runs
+
+            serial = serials.setdefault(plan.serial, {'schedules': 0, 'runs': 0, 'requests': 0, 'bytes': 0})
+            serial['schedules'] += 1
+            serial['runs'] += runs
+            serial['requests'] += grott * runs
+            serial['bytes'] += size * runs
+
+            per_minute = requests_by_serial.setdefault(plan.serial, Counter())
+            for _ in range(grott):
+                per_minute.update(fires)
+            fired.setdefault(plan.serial, []).append((plan.schedule_id, size, fires))
+            for unit in plan.writes:
+                writers.setdefault((plan.serial, unit), []).append((plan.schedule_id, fires))
+
+        def runs_at(serial: str, m: int) -> List[Tuple[int, int]]:
+            return [(schedule_id, size) for schedule_id, size, fires in fired[serial] if fires_at(fires, m)]
+
+        # Busiest minutes per inverter: runs queue on the inverter's worker and share its Grott link
+        minute_of_day = [0] * 1440
+        offset = self.first_minute % 1440
+        hot_spots = []
+        for serial, per_minute in requests_by_serial.items():
+            hot_spots.extend((value, serial, m) for m, value in per_minute.most_common(top) if top)
+            serials[serial]['peak_requests_per_minute'] = max(per_minute.values(), default=0)
+            if capacity:
+                serials[serial]['minutes_over_capacity'] = sum(1 for value in per_minute.values() if value > capacity)
+            for m, value in per_minute.items():
+                minute_of_day[(m + offset) % 1440] += value
+        busiest = hot_spots
+        hot_spots = []
+        for value, serial, m in heapq.nlargest(top, busiest):
+            runs = runs_at(serial, m)
+            hot_spots.append({'minute': self.minute_label(m), 'inverter_serial': serial, 'requests': value,
+                              'bytes': sum(size for _, size in runs),
+                              'schedule_ids': sorted(schedule_id for schedule_id, _ in runs)})
+
+        # Two or more schedules writing the same block or register on the same inverter in the same minute
+        overlaps = []
+        for (serial, unit), schedule_writes in writers.items():
+            if len(schedule_writes) < 2:
+                continue
+            writes_at = Counter()
+            for _, fires in schedule_writes:
+                writes_at.update(fires)
+            clashes = [m for m, value in writes_at.items() if value > 1]
+            if not clashes:
+                continue
+            first = min(clashes)
+            overlaps.append({
+                'inverter_serial': serial,
+                'registers': f"{unit[0]}-{unit[1]}" if unit[0] != unit[1] else str(unit[0]),
+                'minutes': len(clashes),
+                'max_writers': max(writes_at[m] for m in clashes),
+                'first': self.minute_label(first),
+                'schedule_ids': sorted(schedule_id for schedule_id, fires in schedule_writes if fires_at(fires, first)),
+                'writers': len(schedule_writes)
+            })
+        overlaps.sort(key=lambda overlap: (-overlap['minutes'], -overlap['max_writers']))
+
+        result = {
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+            'totals': totals,
+            'inverters': serials,
+            'peak_requests_per_minute': max((s['peak_requests_per_minute'] for s in serials.values()), default=0),
+            'minute_of_day_utc': {f"{m // 60:02d}:{m % 60:02d}": value for m, value in enumerate(minute_of_day) if value},
+            'hot_spots': hot_spots,
+            'overlapping_writes': overlaps[:top] if top else overlaps,
+            'overlapping_write_units': len(overlaps)
+        }
+        if detail:
+            bytes_by_minute = Counter()
+            for runs in fired.values():
+                for _, size, fires in runs:
+                    for m in fires:
+                        bytes_by_minute[m] += size
+            result['per_minute'] = [
+                {'minute': self.minute_label(m),
+                 'requests': sum(per_minute.get(m, 0) for per_minute in requests_by_serial.values()),
+                 'bytes': value}
+                for m, value in sorted(bytes_by_minute.items())
+            ]
+        logger.debug(f"Simulated {totals['runs']} runs over {count} minutes in "
+                     f"{(time_module.perf_counter() - started) * 1000:.0f}ms")
+        return result
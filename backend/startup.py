@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Staged Startup
+The API starts serving as soon as the database is migrated; configuration, scheduler hydration
+and journal recovery run afterwards on a background thread while /api/health reports "warming".
+Every phase is timed so slow starts can be traced to a step.
+"""
+
+import sys
+import time
+import logging
+import threading
+import importlib.util
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+logger = logging.getLogger('grott-scheduler.startup')
+
+# Set when this module is first imported, which app.py does before its own heavy imports
+PROCESS_STARTED = time.perf_counter()
+
+STARTING = 'starting'
+WARMING = 'warming'
+READY = 'ready'
+FAILED = 'failed'
+
+
+def lazy_import(name: str):
+    """
+    Import a module on first attribute access instead of now
+    The module is registered in sys.modules, so later plain imports share the same lazy module
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class Startup:
+    """Process-wide startup state and phase timings"""
+
+    _lock = threading.Lock()
+    state = STARTING
+    error: Optional[str] = None
+    _phases: List[Dict] = []
+    _progress: Dict[str, int] = {}
+    _thread: Optional[threading.Thread] = None
+
+    @classmethod
+    @contextmanager
+    def phase(cls, name: str):
+        """Time a startup phase; durations are reported by report() and logged"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = cls.record(name, started)
+            logger.info(f"Startup phase {name} took {duration * 1000:.0f} ms")
+
+    @classmethod
+    def record(cls, name: str, started: float) -> float:
+        """Record a phase measured by the caller from a perf_counter start; returns its duration"""
+        duration = time.perf_counter() - started
+        with cls._lock:
+            cls._phases.append({
+                'phase': name,
+                'started_ms': round((started - PROCESS_STARTED) * 1000, 1),
+                'duration_ms': round(duration * 1000, 1)
+            })
+        return duration
+
+    @classmethod
+    def progress(cls, key: str, done: int, total: int):
+        with cls._lock:
+            cls._progress[f'{key}_done'] = done
+            cls._progress[f'{key}_total'] = total
+
+    @classmethod
+    def set_state(cls, state: str, error: str = None):
+        with cls._lock:
+            cls.state = state
+            cls.error = error
+            if state in (READY, FAILED):
+                cls._phases.append({
+                    'phase': state,
+                    'started_ms': round((time.perf_counter() - PROCESS_STARTED) * 1000, 1),
+                    'duration_ms': 0.0
+                })
+
+    @classmethod
+    def warm(cls, steps: List):
+        """Run (name, callable) warm-up steps in order on a background thread, then mark the service ready"""
+        def run():
+            try:
+                for name, step in steps:
+                    with cls.phase(name):
+                        step()
+                cls.set_state(READY)
+                logger.info(f"Startup complete after {(time.perf_counter() - PROCESS_STARTED) * 1000:.0f} ms")
+            except Exception as e:
+                cls.set_state(FAILED, str(e))
+                logger.exception(f"Startup failed: {str(e)}")
+
+        cls.set_state(WARMING)
+        cls._thread = threading.Thread(target=run, name='startup-warm', daemon=True)
+        cls._thread.start()
+
+    @classmethod
+    def wait(cls, timeout: float = None) -> bool:
+        """Block until warm-up finishes; True if the service is ready"""
+        if cls._thread:
+            cls._thread.join(timeout)
+        return cls.state == READY
+
+    @classmethod
+    def report(cls) -> Dict:
+        with cls._lock:
+            return {
+                'state': cls.state,
+                'error': cls.error,
+                'uptime_ms': round((time.perf_counter() - PROCESS_STARTED) * 1000, 1),
+                'progress': dict(cls._progress),
+                'phases': [dict(p) for p in cls._phases]
+            }
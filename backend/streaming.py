@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Streaming Responses
+Serializes rows to a JSON array or NDJSON as they come off the cursor, compressing on the fly
+with brotli or gzip when the client accepts it, so large lists never sit in memory whole
+"""
+
+import json
+import zlib
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Raw bytes gathered before a chunk is compressed and sent
+CHUNK_SIZE = 64 * 1024
+
+NDJSON = 'application/x-ndjson'
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Accept-Encoding as {coding: q}"""
+    encodings = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        encodings[coding.strip().lower()] = q
+    return encodings
+
+
+def negotiate_encoding(header: str) -> Optional[str]:
+    """'br' (if brotli is installed), 'gzip' or None for identity"""
+    encodings = accepted_encodings(header)
+    wildcard = encodings.get('*', 0)
+    for coding in (('br',) if brotli else ()) + ('gzip',):
+        if encodings.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+def json_chunks(records: Iterable, ndjson: bool = False) -> Iterator[bytes]:
+    """A JSON array (or one object per line) of records, in chunks of about CHUNK_SIZE bytes"""
+    buffer = []
+    size = 0
+    separator = '' if ndjson else '['
+    for record in records:
+        text = separator + json.dumps(record) + ('\n' if ndjson else '')
+        separator = '' if ndjson else ','
+        buffer.append(text)
+        size += len(text)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer).encode()
+            buffer = []
+            size = 0
+    if not ndjson:
+        buffer.append('[]' if separator == '[' else ']')
+    if buffer:
+        yield ''.join(buffer).encode()
+
+
+def compress(chunks: Iterable[bytes], encoding: Optional[str]) -> Iterator[bytes]:
+    """Compress a chunk stream; each chunk is flushed so the client can start parsing"""
+    if encoding is None:
+        yield from chunks
+        return
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=5)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def stream_records(records: Iterable, request, transform: Callable = None, headers: Dict = None,
+                   ndjson: bool = None) -> Response:
+    """
+    Stream records as a JSON array, or NDJSON with ?format=ndjson / Accept: application/x-ndjson,
+    compressed per the request's Accept-Encoding
+    """
+    if ndjson is None:
+        ndjson = request.args.get('format') == 'ndjson' or NDJSON in request.headers.get('Accept', '')
+    if transform:
+        records = map(transform, records)
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    response = Response(
+        compress(json_chunks(records, ndjson), encoding),
+        mimetype=NDJSON if ndjson else 'application/json',
+        headers=headers
+    )
+    response.headers['Vary'] = 'Accept-Encoding'
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
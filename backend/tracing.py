@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Execution Tracing
+Per-execution spans (schedule lookup, condition read, payload build, Grott calls, sleeps, DB writes)
+recorded through a context variable, packed into one compact JSON value per execution
+"""
+
+import json
+import time
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Span categories, to tell the datalogger from SQLite from our own code
+GROTT = 'grott'
+DB = 'db'
+WAIT = 'wait'
+CODE = 'code'
+
+_current: contextvars.ContextVar = contextvars.ContextVar('execution_trace', default=None)
+
+
+class Trace:
+    """Spans of one execution, as offsets from its start"""
+
+    __slots__ = ('start', 'spans', 'depth')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        # (name, start offset s, duration s, depth, category, attrs)
+        self.spans: List[tuple] = []
+        self.depth = 0
+
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def add(self, name: str, started: float, duration: float, category: str = None, attrs: Dict = None):
+        """Record a span measured by the caller (perf_counter start and seconds)"""
+        self.spans.append((name, started - self.start, duration, self.depth, category, attrs or None))
+
+    def pack(self) -> str:
+        """[total_ms, [[name, start_ms, duration_ms, depth, category, attrs], ...]] without whitespace"""
+        spans = sorted(self.spans, key=lambda s: (s[1], s[3]))
+        return json.dumps([
+            round(self.elapsed_ms(), 2),
+            [[name, round(start * 1000, 2), round(duration * 1000, 2), depth, category] + ([attrs] if attrs else [])
+             for name, start, duration, depth, category, attrs in spans]
+        ], separators=(',', ':'))
+
+
+@contextmanager
+def tracing():
+    """Start a trace for the current thread's execution"""
+    trace = Trace()
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, category: str = None, **attrs):
+    """
+    Time a block as a span of the current trace; a no-op outside a trace
+    Yields the attrs dict so the block can add details (status code, register range, ...)
+    """
+    trace = _current.get()
+    if trace is None:
+        yield attrs
+        return
+    started = time.perf_counter()
+    trace.depth += 1
+    try:
+        yield attrs
+    finally:
+        trace.depth -= 1
+        trace.add(name, started, time.perf_counter() - started, category, attrs)
+
+
+def unpack(packed: str) -> Optional[Dict]:
+    """Packed trace to {'total_ms', 'spans': [{name, start_ms, duration_ms, depth, category, ...attrs}]}"""
+    if not packed:
+        return None
+    total_ms, spans = json.loads(packed)
+    return {
+        'total_ms': total_ms,
+        'spans': [
+            dict({'name': s[0], 'start_ms': s[1], 'duration_ms': s[2], 'depth': s[3], 'category': s[4]},
+                 **(s[5] if len(s) > 5 else {}))
+            for s in spans
+        ]
+    }
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(packed_traces: List[str], limit: int = 10) -> Dict:
+    """
+    Aggregate packed traces into the slowest phases and a time split by category
+    Time in uncategorised container spans (condition, command, verify) that no child span
+    accounts for is reported as 'unattributed', i.e. our own code
+    """
+    phases: Dict[str, List[float]] = {}
+    categories: Dict[str, float] = {}
+    total = 0.0
+    executions = 0
+    for packed in packed_traces:
+        if not packed:
+            continue
+        total_ms, spans = json.loads(packed)
+        executions += 1
+        total += total_ms
+        for s in spans:
+            phases.setdefault(s[0], []).append(s[2])
+            if s[4]:
+                categories[s[4]] = categories.get(s[4], 0.0) + s[2]
+
+    report = [
+        {
+            'phase': name,
+            'count': len(durations),
+            'total_ms': round(sum(durations), 2),
+            'avg_ms': round(sum(durations) / len(durations), 2),
+            'p95_ms': round(percentile(durations, 0.95), 2),
+            'max_ms': round(max(durations), 2)
+        }
+        for name, durations in phases.items()
+    ]
+    report.sort(key=lambda p: p['total_ms'], reverse=True)
+    attributed = sum(categories.values())
+    categories['unattributed'] = max(0.0, total - attributed)
+    return {
+        'executions': executions,
+        'total_ms': round(total, 2),
+        'avg_execution_ms': round(total / executions, 2) if executions else 0,
+        'slowest_phases': report[:limit],
+        'by_category': {
+            name: {'total_ms': round(ms, 2), 'share': round(ms / total, 3) if total else 0}
+            for name, ms in sorted(categories.items(), key=lambda item: item[1], reverse=True)
+        }
+    }
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Grott Scheduler - Write Index
+Which enabled schedules write which registers on which inverter, and the value each leaves them at.
+Kept current as schedules are saved, so conflicting writes are found by looking up the registers
+involved and sweeping their writers' fire calendars in time order, never by comparing every
+schedule with every other.
+"""
+
+import heapq
+import sqlite3
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import pytz
+
+from fire_calendar import FireCalendar
+
+logger = logging.getLogger('grott-scheduler.conflicts')
+
+# (inverter serial, {register: value}) for each schedule row, in order
+WritesLoader = Callable[[List[sqlite3.Row]], List[Tuple[str, Dict[int, int]]]]
+
+
+class WriteIndex:
+    """(inverter, register) -> {schedule_id: value written}, over enabled schedules"""
+
+    _lock = threading.RLock()
+    _connect: Optional[Callable[[], sqlite3.Connection]] = None
+    _writes_of: Optional[WritesLoader] = None
+    _block_of: Callable[[int], Optional[Tuple[int, int]]] = staticmethod(lambda register: None)
+    _writers: Optional[Dict[Tuple[str, int], Dict[int, int]]] = None
+    # schedule_id -> (serial, {register: value}), to take a schedule out again
+    _schedules: Dict[int, Tuple[str, Dict[int, int]]] = {}
+
+    @classmethod
+    def attach(cls, connect: Callable[[], sqlite3.Connection], writes_of: WritesLoader,
+               block_of: Callable[[int], Optional[Tuple[int, int]]] = None):
+        """Set the connection factory, the function giving what schedule rows write, and the register block lookup"""
+        cls._connect = connect
+        cls._writes_of = writes_of
+        if block_of:
+            cls._block_of = staticmethod(block_of)
+        cls.invalidate()
+
+    @classmethod
+    def invalidate(cls):
+        """Drop the index after bulk changes; the next lookup rebuilds it from the database"""
+        with cls._lock:
+            cls._writers = None
+            cls._schedules = {}
+
+    @classmethod
+    def _add(cls, schedule_id: int, serial: str, targets: Dict[int, int]):
+        if not targets:
+            return
+        cls._schedules[schedule_id] = (serial, targets)
+        for register, value in targets.items():
+            cls._writers.setdefault((serial, register), {})[schedule_id] = value
+
+    @classmethod
+    def _remove(cls, schedule_id: int):
+        serial, targets = cls._schedules.pop(schedule_id, (None, {}))
+        for register in targets:
+            writers = cls._writers.get((serial, register))
+            if writers is not None:
+                writers.pop(schedule_id, None)
+                if not writers:
+                    del cls._writers[(serial, register)]
+
+    @classmethod
+    def _load(cls) -> Dict[Tuple[str, int], Dict[int, int]]:
+        writers = cls._writers
+        if writers is not None:
+            return writers
+        with cls._lock:
+            if cls._writers is not None:
+                return cls._writers
+            conn = cls._connect()
+            try:
+                rows = conn.execute("SELECT * FROM schedules WHERE enabled = 1").fetchall()
+            finally:
+                conn.close()
+            cls._writers = {}
+            cls._schedules = {}
+            for row, (serial, targets) in zip(rows, cls._writes_of(rows)):
+                cls._add(row['id'], serial, targets)
+            logger.debug(f"Write index loaded: {len(cls._schedules)} writing schedules, {len(cls._writers)} registers")
+            return cls._writers
+
+    @classmethod
+    def update(cls, schedules: Dict[int, Optional[sqlite3.Row]]):
+        """Re-index saved schedules; None or a disabled row takes the schedule out"""
+        with cls._lock:
+            if cls._writers is None:
+                # Not built yet; the first lookup reads the current rows
+                return
+            rows = [row for row in schedules.values() if row is not None and row['enabled']]
+            writes = dict(zip((row['id'] for row in rows), cls._writes_of(rows)))
+            for schedule_id in schedules:
+                cls._remove(schedule_id)
+                if schedule_id in writes:
+                    cls._add(schedule_id, *writes[schedule_id])
+
+    @classmethod
+    def writers(cls, serial: str, register: int) -> Dict[int, int]:
+        """{schedule_id: value} for the schedules that write a register on an inverter"""
+        with cls._lock:
+            return dict(cls._load().get((serial, register), {}))
+
+    @classmethod
+    def block_writers(cls, serial: str, start: int, end: int) -> Dict[int, Dict[int, int]]:
+        """{schedule_id: {register: value}} for the schedules that write any of registers start..end"""
+        with cls._lock:
+            index = cls._load()
+            found: Dict[int, Dict[int, int]] = {}
+            for register in range(start, end + 1):
+                for schedule_id, value in index.get((serial, register), {}).items():
+                    found.setdefault(schedule_id, {})[register] = value
+            return found
+
+    @classmethod
+    def stats(cls) -> Dict:
+        with cls._lock:
+            index = cls._load()
+            return {'schedules': len(cls._schedules), 'registers': len(index),
+                    'shared_registers': sum(1 for writers in index.values() if len(writers) > 1)}
+
+    @classmethod
+    def conflicts(cls, window_minutes: int, days: int, schedule_ids: Iterable[int] = None, serial: str = None,
+                  registers: Iterable[int] = None, now: datetime = None) -> List[Dict]:
+        """
+        Pairs of schedules that write different values to the same register on the same inverter with
+        fire times no more than window_minutes apart, over the next days
+        schedule_ids: only conflicts involving these schedules (the save-time check)
+        Returns one entry per pair and inverter, listing every register the two disagree on
+        """
+        now = now or datetime.now(pytz.utc)
+        end = now + timedelta(days=days)
+        window = timedelta(minutes=window_minutes)
+        focus: Optional[Set[int]] = set(schedule_ids) if schedule_ids is not None else None
+        registers = set(registers) if registers is not None else None
+
+        with cls._lock:
+            shared = []
+            for (register_serial, register), writers in cls._load().items():
+                if len(writers) < 2 or len(set(writers.values())) < 2:
+                    continue
+                if (serial and register_serial != serial) or (registers is not None and register not in registers):
+                    continue
+                if focus is not None:
+                    values = {value for schedule_id, value in writers.items() if schedule_id in focus}
+                    if not values:
+                        continue
+                    # Only writers that disagree with a focus schedule can be in a reported pair
+                    writers = {schedule_id: value for schedule_id, value in writers.items()
+                               if schedule_id in focus or values - {value}}
+                shared.append((register_serial, register, dict(writers)))
+
+        # Each schedule's fires are looked up once, however many registers it shares
+        involved = sorted({schedule_id for _, _, writers in shared for schedule_id in writers})
+        fires: Dict[int, List[datetime]] = {}
+        for fire, schedule_id in FireCalendar.window(now, end, involved):
+            fires.setdefault(schedule_id, []).append(fire)
+
+        pairs: Dict[Tuple[str, int, int], Dict] = {}
+        for register_serial, register, writers in shared:
+            streams = [[(fire, schedule_id) for fire in fires.get(schedule_id, ())] for schedule_id in writers]
+            # Recent fires per value written; a fire only needs comparing with the other values' fires
+            recent: Dict[int, deque] = {}
+            for fire, schedule_id in heapq.merge(*streams):
+                value = writers[schedule_id]
+                for other_value, queue in recent.items():
+                    while queue and fire - queue[0][0] > window:
+                        queue.popleft()
+                    if other_value == value:
+                        continue
+                    for other_fire, other_id in queue:
+                        if focus is not None and schedule_id not in focus and other_id not in focus:
+                            continue
+                        first, second = sorted((schedule_id, other_id))
+                        pair = pairs.setdefault((register_serial, first, second), {
+                            'inverter_serial': register_serial,
+                            'schedule_ids': [first, second],
+                            'registers': {},
+                            'first': other_fire,
+                            'occurrences': {}
+                        })
+                        pair['registers'][register] = [writers[first], writers[second]]
+                        pair['first'] = min(pair['first'], other_fire)
+                        pair['occurrences'].setdefault(register, set()).add(other_fire)
+                recent.setdefault(value, deque()).append((fire, schedule_id))
+
+        conflicts = []
+        for pair in sorted(pairs.values(), key=lambda p: (p['first'], p['schedule_ids'])):
+            blocks = sorted({cls._block_of(register) for register in pair['registers']} - {None})
+            conflicts.append({
+                'inverter_serial': pair['inverter_serial'],
+                'schedule_ids': pair['schedule_ids'],
+                'registers': [{'register': register, 'values': values}
+                              for register, values in sorted(pair['registers'].items())],
+                'blocks': [f"{start}-{end}" for start, end in blocks],
+                'first': pair['first'].isoformat(),
+                'occurrences': max(len(times) for times in pair['occurrences'].values())
+            })
+        return conflicts
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+"""
+End-to-end load benchmark for the scheduler against the stub Grott server
+Runs the backend in-process on a temporary database and reports throughput,
+p50/p99 latency and database statements per schedule execution
+
+Usage:
+    python3 benchmark.py --schedules 2000 --devices 4 --clients 8 --duration 10
+    python3 benchmark.py --json results.json
+    python3 benchmark.py --baseline results.json --tolerance 0.2   # exit 1 on regression
+    python3 benchmark.py --startup 1000,10000   # time to first request / ready only
+    python3 benchmark.py --simulate 10000 --days 365   # offline schedule replay only
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import sqlite3
+import logging
+import subprocess
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, 'backend'))
+
+from grott_stub import start_stub
+
+API_ENDPOINTS = [
+    '/api/schedules',
+    '/api/stats',
+    '/api/health',
+    '/api/logs?limit=50',
+    '/api/schedules/calendar?days=1',
+]
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Throughput and latency summary, latencies in milliseconds"""
+    return {
+        'count': len(latencies),
+        'errors': errors,
+        'seconds': round(elapsed, 3),
+        'throughput_per_sec': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 0.50), 2) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99), 2) if latencies else None,
+        'max_ms': round(max(latencies), 2) if latencies else None,
+    }
+
+
+class StatementCounter:
+    """Counts SQL statements run through Database connections"""
+
+    def __init__(self, database):
+        self.count = 0
+        self.lock = threading.Lock()
+        self.enabled = False
+        original = database.get_connection
+
+        def counted_connection():
+            conn = original()
+            conn.set_trace_callback(self.trace)
+            return conn
+
+        database.get_connection = staticmethod(counted_connection)
+
+    def trace(self, statement):
+        if self.enabled:
+            with self.lock:
+                self.count += 1
+
+    def measure(self):
+        with self.lock:
+            self.count = 0
+        self.enabled = True
+
+    def stop(self) -> int:
+        self.enabled = False
+        return self.count
+
+
+def start_backend(workdir, grott_port, devices, queue_size):
+    """Import the backend on a temporary database and serve it on a free port"""
+    import app as backend
+    from werkzeug.serving import make_server
+
+    for name in ('grott-scheduler', 'werkzeug', 'apscheduler'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    backend.DATABASE_PATH = os.path.join(workdir, 'benchmark.db')
+    backend.Database.init_database()
+
+    config = {
+        'grott_host': '127.0.0.1',
+        'grott_port': str(grott_port),
+        'retry_delay': '0',
+        'max_retries': '2',
+        'device_queue_size': str(queue_size),
+    }
+    for key, value in config.items():
+        backend.Database.execute("UPDATE config SET value = ? WHERE key = ?", (value, key))
+
+    serials = [backend.InverterCommand.resolve_serial()]
+    for n in range(1, devices):
+        serial = f"BENCH{n:05d}"
+        backend.ensure_device(serial)
+        serials.append(serial)
+
+    counter = StatementCounter(backend.Database)
+    backend.initialize_scheduler()
+
+    server = make_server('127.0.0.1', 0, backend.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return backend, server, serials, counter
+
+
+def run_clients(clients, jobs, func):
+    """Run func(job) for every job on a pool of client threads; returns (latencies_ms, errors, elapsed)"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def timed(job):
+        nonlocal errors
+        started = time.perf_counter()
+        ok = func(job)
+        elapsed = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(timed, jobs))
+    return latencies, errors, time.perf_counter() - started
+
+
+def bench_create(api, session_factory, count, serials, clients, rng):
+    """Create schedules through the API from concurrent clients"""
+    local = threading.local()
+    writes = [(1044, 0, 2), (608, 10, 100), (1070, 0, 100), (1091, 0, 100), (1100, 0, 2359)]
+
+    def create(n):
+        session = getattr(local, 'session', None) or session_factory()
+        local.session = session
+        register, low, high = rng.choice(writes)
+        schedule = {
+            'name': f'Benchmark {n}',
+            'schedule_type': rng.choice(['daily', 'weekly']),
+            'time': f'{rng.randrange(24):02d}:{rng.randrange(60):02d}',
+            'days_of_week': rng.sample(range(7), rng.randint(1, 7)),
+            'command_type': 'register',
+            'register_number': register,
+            'register_value': rng.randint(low, high) if register != 1100 else rng.choice([0, 530, 1915]),
+            'inverter_serial': serials[n % len(serials)],
+            'pushover_enabled': False,
+        }
+        response = session.post(f'{api}/api/schedules', json=schedule, timeout=60)
+        return response.status_code == 201
+
+    return run_clients(clients, range(count), create)
+
+
+def bench_execute(backend, counter, schedule_ids):
+    """Dispatch every schedule to its device worker and time each run from queue to completion"""
+    latencies = []
+    lock = threading.Lock()
+    counter.measure()
+    started = time.perf_counter()
+
+    futures = []
+    for schedule_id in schedule_ids:
+        queued = time.perf_counter()
+        future = backend.ScheduleExecutor.dispatch(schedule_id)
+        if future is None:
+            continue
+
+        def done(_, queued=queued):
+            with lock:
+                latencies.append((time.perf_counter() - queued) * 1000)
+
+        future.add_done_callback(done)
+        futures.append(future)
+
+    errors = 0
+    for future in futures:
+        try:
+            future.result(timeout=600)
+        except Exception:
+            errors += 1
+    elapsed = time.perf_counter() - started
+    statements = counter.stop()
+    errors += len(schedule_ids) - len(futures)
+    return latencies, errors, elapsed, statements
+
+
+def bench_api(api, session_factory, clients, duration):
+    """Concurrent read-only API clients for a fixed duration, latency per endpoint"""
+    deadline = time.perf_counter() + duration
+    per_endpoint = {endpoint: [] for endpoint in API_ENDPOINTS}
+    errors = {endpoint: 0 for endpoint in API_ENDPOINTS}
+    lock = threading.Lock()
+
+    def client(index):
+        session = session_factory()
+        n = index
+        while time.perf_counter() < deadline:
+            endpoint = API_ENDPOINTS[n % len(API_ENDPOINTS)]
+            n += 1
+            started = time.perf_counter()
+            try:
+                ok = session.get(f'{api}{endpoint}', timeout=60).status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                per_endpoint[endpoint].append(elapsed)
+                if not ok:
+                    errors[endpoint] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {endpoint: summarize(samples, elapsed, errors[endpoint]) for endpoint, samples in per_endpoint.items()}
+    all_samples = [s for samples in per_endpoint.values() for s in samples]
+    results['all'] = summarize(all_samples, elapsed, sum(errors.values()))
+    return results
+
+
+def seed_schedules(db_path, count, rng):
+    """Create a migrated database holding count enabled daily/weekly schedules, written directly"""
+    from migrations import Migrator
+    Migrator(lambda: sqlite3.connect(db_path), os.path.join(BASE_DIR, 'database', 'schema.sql')).migrate()
+    conn = sqlite3.connect(db_path)
+    # Nothing listens on port 9, so schedules that fall due during the run fail fast
+    conn.executemany("UPDATE config SET value = ? WHERE key = ?",
+                     [('127.0.0.1', 'grott_host'), ('9', 'grott_port'), ('1', 'max_retries'), ('0', 'retry_delay')])
+    conn.executemany(
+        """INSERT INTO schedules (name, schedule_type, time, days_of_week, command_type, register_number,
+                                  register_value, pushover_enabled)
+           VALUES (?, ?, ?, ?, 'register', 1044, ?, 0)""",
+        [(f'Startup {n}', rng.choice(['daily', 'weekly']), f'{rng.randrange(24):02d}:{rng.randrange(60):02d}',
+          json.dumps(rng.sample(range(7), rng.randint(1, 7))), str(rng.randint(0, 2))) for n in range(count)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def start_service(db_path, log_file):
+    """Start the backend as its own process the way systemd does; returns (process, port, spawned_at)"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    code = (f"import sys; sys.path.insert(0, {os.path.join(BASE_DIR, 'backend')!r}); import app; "
+            f"app.DATABASE_PATH = {db_path!r}; app.LOG_FILE = {log_file!r}; app.main('127.0.0.1', {port})")
+    spawned_at = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return process, port, spawned_at
+
+
+def bench_startup(workdir, counts, rng, timeout=300):
+    """
+    Time from process spawn to the first answered request and to a fully hydrated scheduler,
+    for a first start (no stored next run times) and a restart on the same database
+    """
+    results = {}
+    for count in counts:
+        db_path = os.path.join(workdir, f'startup-{count}.db')
+        seed_schedules(db_path, count, rng)
+        for run in ('first_start', 'restart'):
+            process, port, spawned_at = start_service(db_path, os.path.join(workdir, f'startup-{count}.log'))
+            first_request = ready = None
+            health = {}
+            try:
+                while time.perf_counter() - spawned_at < timeout:
+                    try:
+                        health = requests.get(f'http://127.0.0.1:{port}/api/health', timeout=5).json()
+                    except requests.RequestException:
+                        time.sleep(0.005)
+                        continue
+                    if first_request is None:
+                        first_request = time.perf_counter() - spawned_at
+                    if health['startup']['state'] in ('ready', 'failed'):
+                        ready = time.perf_counter() - spawned_at
+                        break
+                    time.sleep(0.01)
+            finally:
+                process.terminate()
+                process.wait()
+            results[f'{count}_{run}'] = {
+                'schedules': count,
+                'first_request_ms': round(first_request * 1000, 1) if first_request else None,
+                'ready_ms': round(ready * 1000, 1) if ready else None,
+                'state': health.get('startup', {}).get('state'),
+                'phases': {p['phase']: p['duration_ms'] for p in health.get('startup', {}).get('phases', [])}
+            }
+    return results
+
+
+def bench_simulate(workdir, count, days, rng):
+    """Time an offline replay of count seeded schedules over days through /api/schedules/simulate"""
+    import app as backend
+
+    logging.getLogger('grott-scheduler').setLevel(logging.WARNING)
+    backend.DATABASE_PATH = os.path.join(workdir, f'simulate-{count}.db')
+    seed_schedules(backend.DATABASE_PATH, count, rng)
+    started = time.perf_counter()
+    response = backend.app.test_client().get(f'/api/schedules/simulate?days={days}&top=5')
+    elapsed = time.perf_counter() - started
+    report = response.get_json()
+    return {
+        'schedules': count,
+        'days': days,
+        'elapsed_ms': round(elapsed * 1000, 1),
+        'runs': report['totals']['runs'],
+        'requests': report['totals']['requests'],
+        'bytes': report['totals']['bytes'],
+        'peak_requests_per_minute': report['peak_requests_per_minute'],
+        'overlapping_write_units': report['overlapping_write_units']
+    }
+
+
+def print_startup_report(results):
+    print()
+    print(f"{'run':<22} {'first request ms':>17} {'ready ms':>10}  phases (ms)")
+    for label, result in results.items():
+        phases = ', '.join(f"{name} {ms:.0f}" for name, ms in result['phases'].items() if name not in ('ready', 'failed'))
+        print(f"{label:<22} {result['first_request_ms'] or 0:>17} {result['ready_ms'] or 0:>10}  {phases}")
+
+
+def compare(results, baseline, tolerance):
+    """Regressions beyond tolerance: lower throughput, higher p99 or more DB statements"""
+    regressions = []
+    checks = [
+        ('create', 'throughput_per_sec', 'higher'),
+        ('create', 'p99_ms', 'lower'),
+        ('execute', 'throughput_per_sec', 'higher'),
+        ('execute', 'p99_ms', 'lower'),
+        ('execute', 'db_statements_per_execution', 'lower'),
+        ('api', 'throughput_per_sec', 'higher'),
+        ('api', 'p99_ms', 'lower'),
+    ]
+    for phase, metric, better in checks:
+        current = results.get(phase, {}).get(metric)
+        previous = baseline.get(phase, {}).get(metric)
+        if phase == 'api':
+            current = results['api']['all'].get(metric)
+            previous = baseline.get('api', {}).get('all', {}).get(metric)
+        if not current or not previous:
+            continue
+        change = (current - previous) / previous
+        if (better == 'higher' and change < -tolerance) or (better == 'lower' and change > tolerance):
+            regressions.append(f"{phase}.{metric}: {previous} -> {current} ({change:+.0%})")
+    return regressions
+
+
+def print_report(results):
+    print()
+    print(f"{'phase':<40} {'count':>7} {'err':>5} {'per sec':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    rows = [('create schedules (API)', results['create']), ('execute schedules', results['execute'])]
+    rows += [(f"api {endpoint}", summary) for endpoint, summary in results['api'].items()]
+    for label, summary in rows:
+        print(f"{label:<40} {summary['count']:>7} {summary['errors']:>5} {summary['throughput_per_sec'] or 0:>9} "
+              f"{summary['p50_ms'] or 0:>9} {summary['p99_ms'] or 0:>9}")
+    execute = results['execute']
+    print()
+    print(f"DB statements per execution: {execute['db_statements_per_execution']}")
+    print(f"Grott requests per execution: {execute['grott_requests_per_execution']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scheduler load benchmark against the stub Grott server')
+    parser.add_argument('--schedules', type=int, default=2000)
+    parser.add_argument('--devices', type=int, default=4, help='inverters behind the stub grottserver')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent API clients')
+    parser.add_argument('--duration', type=float, default=10, help='seconds of API read load')
+    parser.add_argument('--latency-ms', type=float, default=5, help='stub Grott response latency')
+    parser.add_argument('--jitter-ms', type=float, default=2)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='stub Grott HTTP 500 rate')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--baseline', help='compare with results from an earlier --json run')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed regression vs baseline (0.2 = 20%%)')
+    parser.add_argument('--keep', action='store_true', help='keep the temporary database')
+    parser.add_argument('--startup', help='only measure service startup for these schedule counts, e.g. 1000,10000')
+    parser.add_argument('--simulate', type=int, help='only time an offline replay of this many schedules')
+    parser.add_argument('--days', type=int, default=365, help='replay period for --simulate')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix='grott-bench-')
+
+    if args.startup:
+        try:
+            results = bench_startup(workdir, [int(n) for n in args.startup.split(',')], rng)
+        finally:
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+        print_startup_report(results)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
+        return
+    if args.simulate:
+        try:
+            results = bench_simulate(workdir, args.simulate, args.days, rng)
+        finally:
+            if not args.keep:
+                shutil.rmtree(workdir, ignore_errors=True)
+        print(json.dumps(results, indent=2))
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump(results, f, indent=2)
+        return
+    grott_server, stub = start_stub(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                                    error_rate=args.error_rate, seed=args.seed)
+    backend, api_server, serials, counter = start_backend(
+        workdir, grott_server.server_address[1], args.devices, queue_size=args.schedules
+    )
+    api = f"http://127.0.0.1:{api_server.server_address[1]}"
+    print(f"Benchmark: {args.schedules} schedules, {args.devices} devices, {args.clients} clients, "
+          f"Grott latency {args.latency_ms}ms, database {workdir}")
+
+    def session_factory():
+        return requests.Session()
+
+    try:
+        latencies, errors, elapsed = bench_create(api, session_factory, args.schedules, serials, args.clients, rng)
+        results = {'create': summarize(latencies, elapsed, errors)}
+
+        schedule_ids = [row['id'] for row in backend.Database.fetch_all("SELECT id FROM schedules ORDER BY id")]
+        grott_before = stub.stats['requests']
+        latencies, errors, elapsed, statements = bench_execute(backend, counter, schedule_ids)
+        results['execute'] = summarize(latencies, elapsed, errors)
+        executed = max(1, len(latencies))
+        results['execute']['db_statements_per_execution'] = round(statements / executed, 1)
+        results['execute']['grott_requests_per_execution'] = round((stub.stats['requests'] - grott_before) / executed, 2)
+
+        results['api'] = bench_api(api, session_factory, args.clients, args.duration)
+        results['settings'] = vars(args)
+    finally:
+        api_server.shutdown()
+        grott_server.shutdown()
+        backend.scheduler.shutdown(wait=False)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+pytest setup: the backend modules import each other by plain module name, and app_module gives a
+test the app with its own database
+test_schedule_chains.py drives a running scheduler over HTTP, so it is run directly rather than collected
+"""
+
+import os
+import sys
+import queue
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+collect_ignore = ['test_schedule_chains.py']
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    """The backend app module, pointed at a fresh database in tmp_path"""
+    import app
+    monkeypatch.setattr(app, 'DATABASE_PATH', str(tmp_path / 'scheduler.db'))
+    # The journal writer keeps one connection; start a new writer (and queue) on this database
+    monkeypatch.setattr(app.CommandJournal, '_queue', queue.Queue())
+    monkeypatch.setattr(app.CommandJournal, '_thread', None)
+    app.Database.init_database()
+    return app
+
+
+@pytest.fixture
+def grott(app_module, monkeypatch):
+    """A grott_stub server the app sends its inverter requests to, with no retry delay; yields the stub"""
+    from grott_stub import start_stub
+    # requests is imported lazily; load it here rather than racing for it from worker threads
+    app_module.requests.Session
+    monkeypatch.setattr(app_module.CircuitBreakers, '_breakers', {})
+    monkeypatch.setattr(app_module, 'multiregister_unsupported', set())
+    server, stub = start_stub()
+    for key, value in (('grott_host', '127.0.0.1'), ('grott_port', str(server.server_address[1])),
+                       ('retry_delay', '0')):
+        app_module.Database.execute("UPDATE config SET value = ? WHERE key = ?", (value, key))
+    yield stub
+    server.shutdown()
+    server.server_close()
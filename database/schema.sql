@@ -17,16 +17,60 @@ INSERT OR IGNORE INTO config (key, value, description) VALUES
     ('inverter_serial', 'NTCRBLR00Y', 'Default inverter serial number'),
     ('pushover_user_key', '', 'Pushover user key for notifications'),
     ('pushover_api_token', '', 'Pushover API token'),
+    ('pushover_api_url', 'https://api.pushover.net/1/messages.json', 'Pushover messages endpoint (point at a local stub for testing)'),
     ('max_retries', '5', 'Maximum retry attempts for failed commands'),
-    ('retry_delay', '10', 'Delay in seconds between retries');
+    ('retry_delay', '10', 'Delay in seconds between retries'),
+    ('timezone', 'UTC', 'Default timezone for schedule times (e.g. Europe/London)'),
+    ('calendar_days', '7', 'Days of fire times to precompute per schedule'),
+    ('conflict_window_minutes', '5', 'Schedules writing different values to a register this many minutes apart or less are flagged as conflicting'),
+    ('register_cache_seconds', '30', 'Register values read within this many seconds are reused by condition checks'),
+    ('skip_unchanged_writes', '0', 'Skip register writes when the last-confirmed value already matches (1 = on)'),
+    ('skip_unchanged_max_age', '300', 'Seconds a read or acknowledged write counts as confirmed state'),
+    ('skip_unchanged_verify', '0', 'Read the register once before skipping a write (1 = on)'),
+    ('verify_writes', '0', 'Read back written registers after each run and retry on mismatch (1 = on)'),
+    ('verify_delay_seconds', '2', 'Seconds to wait before reading back written registers'),
+    ('verify_retries', '2', 'Times to re-send writes that did not read back correctly'),
+    ('device_queue_size', '20', 'Pending commands allowed per inverter before new ones are rejected'),
+    ('device_workers', '1', 'Commands run concurrently per inverter'),
+    ('custom_workers', '2', 'Custom HTTP requests and scripts run concurrently, apart from the inverter workers'),
+    ('custom_queue_size', '20', 'Pending custom commands allowed before new ones are rejected'),
+    ('custom_timeout', '10', 'Seconds a custom command may take unless it sets its own timeout (at most 300)'),
+    ('custom_max_output_kb', '64', 'Response or script output kept per custom command, in KB'),
+    ('custom_memory_mb', '256', 'Address space limit for custom scripts, in MB'),
+    ('custom_script_dir', '', 'Directory custom scripts are run from, relative to the install directory (empty = script steps disabled)'),
+    ('circuit_window', '10', 'Recent Grott calls per inverter considered by the circuit breaker'),
+    ('circuit_min_calls', '4', 'Calls needed in the window before the circuit can open'),
+    ('circuit_failure_threshold', '0.5', 'Failure ratio in the window that opens the circuit'),
+    ('circuit_open_seconds', '30', 'Seconds an open circuit waits before a probe read (doubles while probes fail)'),
+    ('circuit_max_open_seconds', '600', 'Longest wait between probe reads'),
+    ('circuit_probe_register', '1044', 'Register read to probe an open circuit'),
+    ('circuit_requeue_max_age', '3600', 'Runs deferred longer than this are not re-queued when the circuit closes'),
+    ('journal_enabled', '1', 'Journal each command before it is sent so interrupted commands are reconciled on restart (1 = on)'),
+    ('journal_commit_window_ms', '5', 'Milliseconds the journal writer waits to group concurrent writes into one commit'),
+    ('journal_replay_max_age', '900', 'Interrupted writes older than this many seconds are not replayed on restart'),
+    ('journal_retention_days', '7', 'Days settled journal entries are kept'),
+    ('notify_batch_seconds', '30', 'Seconds to gather failure alerts into one notification'),
+    ('notify_dedup_seconds', '600', 'The same schedule failing the same way is not re-notified within this many seconds'),
+    ('notify_max_per_hour', '6', 'Most notifications sent per hour; alerts held back join the next one'),
+    ('log_format', 'text', 'Log line format: text or json'),
+    ('log_level', 'INFO', 'Default log level'),
+    ('log_levels', 'apscheduler=WARNING,werkzeug=WARNING', 'Per-subsystem levels, e.g. grott-scheduler.events=DEBUG,grott-scheduler.circuit=WARNING'),
+    ('log_max_bytes', '10485760', 'Rotate the log file at this size'),
+    ('log_backup_count', '5', 'Rotated log files kept'),
+    ('log_sample_burst', '20', 'INFO/DEBUG lines allowed per call site per sampling period (0 = no sampling)'),
+    ('log_sample_seconds', '10', 'Sampling period in seconds'),
+    ('trace_executions', '1', 'Store per-phase timings with each execution log (1 = on)'),
+    ('event_poll_seconds', '0', 'Poll registers used by event schedules every N seconds (0 = only on sync/reads)'),
+    ('latitude', '', 'Site latitude for sunrise/sunset schedules (decimal degrees, north positive)'),
+    ('longitude', '', 'Site longitude for sunrise/sunset schedules (decimal degrees, east positive)');
 
 -- Schedules table
 CREATE TABLE IF NOT EXISTS schedules (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     name TEXT NOT NULL,
     description TEXT,
-    schedule_type TEXT NOT NULL, -- 'daily', 'weekly', 'once', 'conditional'
-    time TEXT NOT NULL, -- HH:MM format
+    schedule_type TEXT NOT NULL, -- 'daily', 'weekly', 'once', 'sunrise', 'sunset', 'tariff', 'event'
+    time TEXT NOT NULL, -- HH:MM format (unused by sunrise/sunset/tariff/event)
     days_of_week TEXT, -- JSON array for weekly: [0,1,2,3,4,5,6] (0=Monday)
     specific_date TEXT, -- YYYY-MM-DD for one-time schedules
     command_type TEXT NOT NULL, -- 'register', 'multiregister', 'template', 'custom'
@@ -38,13 +82,20 @@ CREATE TABLE IF NOT EXISTS schedules (
     multiregister_value TEXT,
     template_name TEXT,
     custom_command TEXT,
-    condition_type TEXT, -- 'none', 'soc', 'register_value'
+    condition_type TEXT, -- 'none', 'soc', 'register_value', 'expression'
     condition_register INTEGER,
     condition_operator TEXT, -- '<', '>', '=', '<=', '>='
     condition_value TEXT,
+    condition_expression TEXT, -- e.g. 'soc(1014) < 30 and priority(1044) != 2'
+    trigger_expression TEXT, -- event: fires when this becomes true, e.g. 'soc(1014) < 20'
+    trigger_hysteresis REAL DEFAULT 0, -- event: re-arm only once values move this far back past the threshold
+    trigger_debounce_seconds INTEGER DEFAULT 0, -- event: expression must stay true this long before firing
     enabled BOOLEAN DEFAULT 1,
     pushover_enabled BOOLEAN DEFAULT 1,
     inverter_serial TEXT,
+    timezone TEXT, -- IANA timezone name, NULL uses the install default
+    offset_minutes INTEGER DEFAULT 0, -- sunrise/sunset/tariff: minutes added to the computed time
+    window_minutes INTEGER DEFAULT 60, -- tariff: length of the cheapest window to find
     parent_schedule_id INTEGER DEFAULT NULL,
     execution_order INTEGER DEFAULT 0,
     continue_on_parent_failure BOOLEAN DEFAULT 0,
@@ -70,10 +121,36 @@ CREATE TABLE IF NOT EXISTS execution_logs (
     condition_details TEXT,
     parent_execution_id INTEGER DEFAULT NULL,
     execution_order INTEGER DEFAULT 0,
+    outcome TEXT, -- 'success', 'failed', 'condition_not_met', 'suppressed', 'verify_failed', 'queue_full', 'circuit_open', 'recovered'
+    trace TEXT, -- packed per-phase timings: [total_ms, [[name, start_ms, duration_ms, depth, category, attrs?], ...]]
     FOREIGN KEY (schedule_id) REFERENCES schedules(id) ON DELETE SET NULL,
     FOREIGN KEY (parent_execution_id) REFERENCES execution_logs(id) ON DELETE SET NULL
 );
 
+-- Write-ahead command journal: intent is committed before a command is sent, outcome after
+CREATE TABLE IF NOT EXISTS command_journal (
+    id TEXT PRIMARY KEY,
+    schedule_id INTEGER, -- NULL for bulk device commands
+    inverter_serial TEXT NOT NULL,
+    command TEXT NOT NULL, -- JSON command as sent
+    state TEXT NOT NULL DEFAULT 'pending', -- 'pending', 'success', 'failed', 'confirmed', 'replayed', 'abandoned', 'unknown'
+    response TEXT,
+    attempts INTEGER DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    completed_at TIMESTAMP,
+    process_id TEXT -- the service process that wrote the entry; recovery only settles earlier processes' entries
+);
+
+-- Tariff periods table (used by 'tariff' schedules to find the cheapest window)
+CREATE TABLE IF NOT EXISTS tariff_periods (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT,
+    start_time TEXT NOT NULL, -- HH:MM, inclusive
+    end_time TEXT NOT NULL, -- HH:MM, exclusive; at or before start_time wraps past midnight
+    rate REAL NOT NULL, -- price per kWh
+    days_of_week TEXT -- JSON array (0=Monday), NULL applies every day
+);
+
 -- Templates table  
 CREATE TABLE IF NOT EXISTS templates (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -172,18 +249,34 @@ INSERT OR IGNORE INTO registers (register_number, name, description, write_only,
     (122, 'Export Limit Enable', 'Export limit enable/disable', 0, NULL, 'boolean', 1, 0, 1, 'grid', 8),
     (123, 'Export Limit Power', 'Export limit power percentage', 0, NULL, 'decimal', 1, 0, 100, 'grid', 8);
 
--- Register values cache table (source of truth for register values)
+-- Inverters behind the grottserver
+CREATE TABLE IF NOT EXISTS devices (
+    serial TEXT PRIMARY KEY,
+    name TEXT,
+    enabled BOOLEAN DEFAULT 1,
+    queue_size INTEGER, -- pending commands allowed (NULL = device_queue_size)
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT OR IGNORE INTO devices (serial, name)
+    SELECT value, 'Default inverter' FROM config WHERE key = 'inverter_serial';
+
+-- Register values cache table (source of truth for register values), per inverter
 CREATE TABLE IF NOT EXISTS register_values (
-    register_number INTEGER PRIMARY KEY,
+    inverter_serial TEXT NOT NULL,
+    register_number INTEGER NOT NULL,
     current_value INTEGER NOT NULL DEFAULT 0,
     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     last_read_from_inverter TIMESTAMP,
+    last_written_at TIMESTAMP, -- last write the inverter acknowledged
+    PRIMARY KEY (inverter_serial, register_number),
     FOREIGN KEY (register_number) REFERENCES registers(register_number)
 );
 
--- Initialize register values for all known registers
+-- Initialize register values for all known registers on the default inverter
 -- Values are stored as decimals, converted to hex for transmission when type=0
-INSERT OR IGNORE INTO register_values (register_number, current_value) VALUES
+INSERT OR IGNORE INTO register_values (inverter_serial, register_number, current_value)
+SELECT (SELECT value FROM config WHERE key = 'inverter_serial'), column1, column2 FROM (VALUES
     -- Grid First (1070-1088)
     (1070, 100), (1071, 10), (1072, 0), (1073, 0), (1074, 0), (1075, 0), (1076, 0), (1077, 0), (1078, 0), (1079, 0),
     (1080, 0), (1081, 0), (1082, 0), (1083, 0), (1084, 0), (1085, 0), (1086, 0), (1087, 0), (1088, 0),
@@ -195,7 +288,7 @@ INSERT OR IGNORE INTO register_values (register_number, current_value) VALUES
     -- Export Limit (122-123)
     (122, 0), (123, 0),
     -- Other
-    (608, 0), (1044, 0);
+    (608, 0), (1044, 0));
 
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_schedules_enabled ON schedules(enabled);
@@ -204,4 +297,114 @@ CREATE INDEX IF NOT EXISTS idx_schedules_parent ON schedules(parent_schedule_id)
 CREATE INDEX IF NOT EXISTS idx_execution_logs_schedule_id ON execution_logs(schedule_id);
 CREATE INDEX IF NOT EXISTS idx_execution_logs_executed_at ON execution_logs(executed_at DESC);
 CREATE INDEX IF NOT EXISTS idx_execution_logs_parent ON execution_logs(parent_execution_id);
+CREATE INDEX IF NOT EXISTS idx_command_journal_state ON command_journal(state);
 CREATE INDEX IF NOT EXISTS idx_register_values_updated ON register_values(last_updated DESC);
+
+-- Change counter for /api/sync: the latest version of each changed record, deleted ones as tombstones
+-- Triggers delete and re-insert the record's row rather than INSERT OR REPLACE, because an outer
+-- INSERT OR IGNORE would override the trigger's conflict handling
+CREATE TABLE IF NOT EXISTS sync_changes (
+    version INTEGER PRIMARY KEY AUTOINCREMENT, -- monotonic, never reused
+    record_type TEXT NOT NULL, -- table name
+    record_key TEXT NOT NULL, -- primary key of the changed row
+    deleted BOOLEAN DEFAULT 0,
+    UNIQUE (record_type, record_key)
+);
+
+CREATE TRIGGER IF NOT EXISTS sync_schedules_insert AFTER INSERT ON schedules BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'schedules' AND record_key = NEW.id;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('schedules', NEW.id, 0);
+END;
+
+-- Not fired by updates of next_execution_at alone (scheduler hydration), which clients don't show
+CREATE TRIGGER IF NOT EXISTS sync_schedules_update AFTER UPDATE OF
+        name, description, schedule_type, time, days_of_week, specific_date, command_type,
+        register_number, register_name, register_value, multiregister_start, multiregister_end, multiregister_value,
+        template_name, custom_command, condition_type, condition_register, condition_operator, condition_value,
+        condition_expression, trigger_expression, trigger_hysteresis, trigger_debounce_seconds, enabled,
+        pushover_enabled, inverter_serial, timezone, offset_minutes, window_minutes, parent_schedule_id,
+        execution_order, continue_on_parent_failure, last_executed_at
+    ON schedules BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'schedules' AND record_key = NEW.id;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('schedules', NEW.id, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sync_schedules_delete AFTER DELETE ON schedules BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'schedules' AND record_key = OLD.id;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('schedules', OLD.id, 1);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sync_registers_insert AFTER INSERT ON registers BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'registers' AND record_key = NEW.register_number;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('registers', NEW.register_number, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sync_registers_update AFTER UPDATE ON registers BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'registers' AND record_key = NEW.register_number;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('registers', NEW.register_number, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sync_registers_delete AFTER DELETE ON registers BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'registers' AND record_key = OLD.register_number;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('registers', OLD.register_number, 1);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sync_register_groups_insert AFTER INSERT ON register_groups BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'register_groups' AND record_key = NEW.id;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('register_groups', NEW.id, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sync_register_groups_update AFTER UPDATE ON register_groups BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'register_groups' AND record_key = NEW.id;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('register_groups', NEW.id, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sync_register_groups_delete AFTER DELETE ON register_groups BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'register_groups' AND record_key = OLD.id;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('register_groups', OLD.id, 1);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sync_templates_insert AFTER INSERT ON templates BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'templates' AND record_key = NEW.id;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('templates', NEW.id, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sync_templates_update AFTER UPDATE ON templates BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'templates' AND record_key = NEW.id;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('templates', NEW.id, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sync_templates_delete AFTER DELETE ON templates BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'templates' AND record_key = OLD.id;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('templates', OLD.id, 1);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sync_config_insert AFTER INSERT ON config BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'config' AND record_key = NEW.key;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('config', NEW.key, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sync_config_update AFTER UPDATE ON config BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'config' AND record_key = NEW.key;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('config', NEW.key, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sync_config_delete AFTER DELETE ON config BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'config' AND record_key = OLD.key;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('config', OLD.key, 1);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sync_devices_insert AFTER INSERT ON devices BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'devices' AND record_key = NEW.serial;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('devices', NEW.serial, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sync_devices_update AFTER UPDATE ON devices BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'devices' AND record_key = NEW.serial;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('devices', NEW.serial, 0);
+END;
+
+CREATE TRIGGER IF NOT EXISTS sync_devices_delete AFTER DELETE ON devices BEGIN
+    DELETE FROM sync_changes WHERE record_type = 'devices' AND record_key = OLD.serial;
+    INSERT INTO sync_changes (record_type, record_key, deleted) VALUES ('devices', OLD.serial, 1);
+END;
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Stub Grott server for testing and benchmarking without an inverter
+Implements the grottserver /inverter API (register and multiregister reads/writes)
+with configurable latency, error rates and register state
+
+Usage:
+    python3 grott_stub.py --port 5782 --latency-ms 50 --jitter-ms 20 --error-rate 0.01
+    python3 grott_stub.py --state registers.json    # {"1044": 1, "1070": 100, ...}
+
+Control endpoints:
+    GET  /stub/state            register values per inverter
+    PUT  /stub/state            {"serial": "...", "registers": {"1044": 2}}
+    GET  /stub/stats            request counts
+    PUT  /stub/config           {"latency_ms": 0, "error_rate": 0.5, "down": true}
+                                ("drop_writes": 2 acknowledges the next 2 writes without applying them)
+    GET  /stub/pushover         notifications received on POST /1/messages.json
+                                (set pushover_api_url to http://<stub>/1/messages.json)
+"""
+
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs, parse_qsl
+
+# Write-only registers and the register their value can be read back from
+READ_ALIASES = {608: 1109}
+
+
+class GrottStub:
+    """In-memory inverter state and fault injection shared by all request threads"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0.0,
+                 timeout_rate: float = 0.0, multiregister: bool = True, initial: dict = None, seed: int = None):
+        self.lock = threading.Lock()
+        self.latency_ms = float(latency_ms)
+        self.jitter_ms = float(jitter_ms)
+        self.error_rate = float(error_rate)
+        self.timeout_rate = float(timeout_rate)
+        self.multiregister = bool(multiregister)
+        self.down = False
+        # Writes still to be acknowledged but not applied, as an inverter that ignores a write would
+        self.drop_writes = 0
+        self.initial = {int(k): int(v) for k, v in (initial or {}).items()}
+        self.registers = {}
+        self.random = random.Random(seed)
+        self.notifications = []
+        self.stats = {'requests': 0, 'reads': 0, 'writes': 0, 'multiregister_reads': 0,
+                      'multiregister_writes': 0, 'errors': 0, 'timeouts': 0, 'dropped_writes': 0}
+
+    def inverter(self, serial: str) -> dict:
+        with self.lock:
+            if serial not in self.registers:
+                self.registers[serial] = dict(self.initial)
+            return self.registers[serial]
+
+    def configure(self, **settings):
+        with self.lock:
+            for key in ('latency_ms', 'jitter_ms', 'error_rate', 'timeout_rate', 'multiregister', 'down', 'drop_writes'):
+                if key in settings:
+                    setattr(self, key, type(getattr(self, key))(settings[key]))
+
+    def count(self, key: str):
+        with self.lock:
+            self.stats[key] += 1
+
+    def dropped(self) -> bool:
+        """Whether to acknowledge this write without applying it"""
+        with self.lock:
+            if self.drop_writes <= 0:
+                return False
+            self.drop_writes -= 1
+            self.stats['dropped_writes'] += 1
+            return True
+
+    def fault(self):
+        """Apply latency and pick an injected fault: None, 'error' or 'timeout'"""
+        with self.lock:
+            delay = max(0.0, self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            roll = self.random.random()
+            down = self.down
+            timeout_rate, error_rate = self.timeout_rate, self.error_rate
+        if delay:
+            time.sleep(delay)
+        if down:
+            return 'error'
+        if roll < timeout_rate:
+            return 'timeout'
+        if roll < timeout_rate + error_rate:
+            return 'error'
+        return None
+
+
+class GrottHandler(BaseHTTPRequestHandler):
+    """grottserver-compatible request handler"""
+
+    stub: GrottStub = None
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status: int, body, content_type: str = 'text/plain'):
+        data = (json.dumps(body) if not isinstance(body, str) else body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type if isinstance(body, str) else 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def body(self) -> dict:
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}') if length else {}
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/1/messages.json':
+            return self.send(404, 'Not found')
+        length = int(self.headers.get('Content-Length') or 0)
+        form = dict(parse_qsl(self.rfile.read(length).decode()))
+        with self.stub.lock:
+            self.stub.notifications.append(form)
+        return self.send(200, {'status': 1, 'request': str(len(self.stub.notifications))})
+
+    def handle_request(self, method: str):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+
+        if url.path.startswith('/stub/'):
+            return self.handle_control(method, url.path)
+        if url.path != '/inverter':
+            return self.send(404, 'Not found')
+
+        stub = self.stub
+        stub.count('requests')
+        fault = stub.fault()
+        if fault == 'timeout':
+            stub.count('timeouts')
+            # Hold the connection open long enough for client timeouts to fire
+            time.sleep(35)
+            return self.send(504, 'Timeout')
+        if fault == 'error':
+            stub.count('errors')
+            return self.send(500, 'Inverter not responding')
+
+        serial = params.get('inverter')
+        if not serial:
+            return self.send(400, 'no or invalid inverter id specified')
+        registers = stub.inverter(serial)
+        command = params.get('command')
+
+        try:
+            if command == 'register':
+                register = int(params['register'])
+                if method == 'GET':
+                    stub.count('reads')
+                    return self.send(200, {'value': registers.get(register, 0)})
+                stub.count('writes')
+                value = int(params['value'])
+                if stub.dropped():
+                    return self.send(200, 'OK')
+                with stub.lock:
+                    registers[register] = value
+                    if register in READ_ALIASES:
+                        registers[READ_ALIASES[register]] = value
+                return self.send(200, 'OK')
+
+            if command == 'multiregister':
+                if not stub.multiregister:
+                    return self.send(400, 'invalid command')
+                start = int(params['startregister'])
+                end = int(params['endregister'])
+                if end < start or end - start > 124:
+                    return self.send(400, 'invalid register range')
+                if method == 'GET':
+                    stub.count('multiregister_reads')
+                    values = {str(reg): registers.get(reg, 0) for reg in range(start, end + 1)}
+                    return self.send(200, {'values': values})
+                stub.count('multiregister_writes')
+                value = params['value']
+                if len(value) != (end - start + 1) * 4:
+                    return self.send(400, 'value length does not match register range')
+                if stub.dropped():
+                    return self.send(200, 'OK')
+                with stub.lock:
+                    for i, reg in enumerate(range(start, end + 1)):
+                        registers[reg] = int(value[i * 4:i * 4 + 4], 16)
+                return self.send(200, 'OK')
+        except (KeyError, ValueError) as e:
+            return self.send(400, f'invalid request: {e}')
+
+        return self.send(400, 'invalid command')
+
+    def handle_control(self, method: str, path: str):
+        stub = self.stub
+        if path == '/stub/state':
+            if method == 'PUT':
+                data = self.body()
+                registers = stub.inverter(data.get('serial', 'NTCRBLR00Y'))
+                with stub.lock:
+                    registers.update({int(k): int(v) for k, v in data.get('registers', {}).items()})
+                return self.send(200, 'OK')
+            with stub.lock:
+                return self.send(200, {serial: {str(k): v for k, v in sorted(regs.items())}
+                                       for serial, regs in stub.registers.items()})
+        if path == '/stub/pushover':
+            with stub.lock:
+                return self.send(200, list(stub.notifications))
+        if path == '/stub/stats':
+            with stub.lock:
+                return self.send(200, dict(stub.stats))
+        if path == '/stub/config' and method == 'PUT':
+            stub.configure(**self.body())
+            return self.send(200, 'OK')
+        return self.send(404, 'Not found')
+
+
+def start_stub(port: int = 0, host: str = '127.0.0.1', **settings):
+    """Start a stub server in a background thread; returns (server, stub). Port 0 picks a free port."""
+    stub = GrottStub(**settings)
+    handler = type('BoundGrottHandler', (GrottHandler,), {'stub': stub})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stub
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub Grott server')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5782)
+    parser.add_argument('--latency-ms', type=float, default=0, help='mean response latency')
+    parser.add_argument('--jitter-ms', type=float, default=0, help='uniform +/- jitter on latency')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with HTTP 500')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='fraction of requests that hang past client timeouts')
+    parser.add_argument('--no-multiregister', action='store_true', help='reject multiregister commands like older grottserver')
+    parser.add_argument('--state', help='JSON file with initial register values')
+    parser.add_argument('--seed', type=int, help='random seed for reproducible fault injection')
+    args = parser.parse_args()
+
+    initial = {}
+    if args.state:
+        with open(args.state) as f:
+            initial = json.load(f)
+
+    server, stub = start_stub(
+        args.port, args.host,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        timeout_rate=args.timeout_rate, multiregister=not args.no_multiregister,
+        initial=initial, seed=args.seed
+    )
+    print(f"Stub Grott server listening on {args.host}:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -71,28 +71,9 @@ if [ -f "scheduler.db" ]; then
     cp scheduler.db "scheduler.db.backup.$(date +%Y%m%d_%H%M%S)"
 fi
 
-# Initialize database with schema
+# Create or migrate the database schema
 source "$VENV_DIR/bin/activate"
-python3 << EOF
-import sqlite3
-import os
-
-db_path = 'scheduler.db'
-schema_path = 'schema.sql'
-
-# Create database
-conn = sqlite3.connect(db_path)
-
-# Load and execute schema
-with open(schema_path, 'r') as f:
-    schema = f.read()
-    conn.executescript(schema)
-
-conn.commit()
-conn.close()
-
-print("Database initialized successfully")
-EOF
+python3 migrate.py
 deactivate
 
 # Create logs directory
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Tests for the Grott circuit breaker against grott_stub: it opens after failures and fails fast,
+conditional runs that can't read their registers are deferred rather than retried, and closing the
+circuit re-queues them
+"""
+
+import time
+
+import pytest
+
+SERIAL = 'NTCRBLR00Y'
+
+
+@pytest.fixture
+def breakers(app_module, grott, monkeypatch):
+    """CircuitBreakers with a short open period, and a client for creating schedules"""
+    breakers = app_module.CircuitBreakers
+    monkeypatch.setattr(breakers, 'open_seconds', 0.2)
+    monkeypatch.setattr(breakers, 'min_calls', 4)
+    monkeypatch.setattr(breakers, 'failure_threshold', 0.5)
+    grott.initial = {1014: 10, 1044: 0}
+    return breakers
+
+
+def add_schedule(appmod, **fields):
+    schedule = dict({'name': 'charge', 'schedule_type': 'daily', 'time': '10:00', 'command_type': 'register',
+                     'register_number': 1044, 'register_value': 1}, **fields)
+    response = appmod.app.test_client().post('/api/schedules', json=schedule)
+    assert response.status_code in (200, 201), response.get_json()
+    return response.get_json()['id']
+
+
+def last_log(appmod, schedule_id):
+    return appmod.Database.fetch_one(
+        "SELECT outcome, success, attempts, error_message FROM execution_logs WHERE schedule_id = ? ORDER BY id DESC LIMIT 1",
+        (schedule_id,)
+    )
+
+
+def settle(appmod):
+    """Wait for work queued on the inverter's worker and the journal writer"""
+    appmod.DeviceWorkers.submit(SERIAL, lambda: None).result(timeout=30)
+    appmod.CommandJournal.write([("SELECT 1", ())])
+
+
+def test_circuit_opens_after_failures_and_fails_fast(app_module, grott, breakers):
+    schedule_id = add_schedule(app_module)
+    grott.configure(down=True)
+
+    app_module.ScheduleExecutor.execute_schedule(schedule_id)
+    assert breakers.states()[SERIAL]['state'] == 'open'
+    assert not last_log(app_module, schedule_id)['success']
+
+    requests_before = grott.stats['requests']
+    start = time.monotonic()
+    success, response, attempts = app_module.InverterCommand.execute_command(
+        {'type': 'register', 'register': 1044, 'value': 1}, SERIAL)
+    assert (success, attempts) == (False, 0)
+    assert 'circuit open' in response
+    assert grott.stats['requests'] == requests_before
+    assert time.monotonic() - start < 0.1
+
+
+def test_conditional_run_is_deferred_and_requeued_on_close(app_module, grott, breakers):
+    schedule_id = add_schedule(app_module, condition_type='expression', condition_expression='soc(1014) < 30')
+    grott.configure(down=True)
+    for _ in range(breakers.min_calls):
+        breakers.record(SERIAL, False, 'HTTP 500')
+    assert breakers.states()[SERIAL]['state'] == 'open'
+
+    requests_before = grott.stats['requests']
+    app_module.ScheduleExecutor.execute_schedule(schedule_id)
+
+    log = last_log(app_module, schedule_id)
+    assert (log['outcome'], log['success']) == ('circuit_open', 0)
+    assert breakers.states()[SERIAL]['deferred_schedules'] == [schedule_id]
+    assert grott.stats['requests'] == requests_before
+
+    # The probe fails while the inverter is still down, and the run stays deferred
+    time.sleep(0.25)
+    breakers.probe_due()
+    assert breakers.states()[SERIAL]['state'] == 'open'
+    assert breakers.states()[SERIAL]['deferred_schedules'] == [schedule_id]
+
+    grott.configure(down=False)
+    time.sleep(0.6)
+    breakers.probe_due()
+    settle(app_module)
+
+    assert breakers.states()[SERIAL]['state'] == 'closed'
+    assert breakers.states()[SERIAL]['deferred_schedules'] == []
+    assert last_log(app_module, schedule_id)['outcome'] == 'success'
+    assert grott.inverter(SERIAL)[1044] == 1
+
+
+def test_failed_condition_read_on_closed_circuit_is_not_deferred(app_module, grott, breakers):
+    schedule_id = add_schedule(app_module, condition_type='expression', condition_expression='soc(1014) < 30')
+    grott.configure(error_rate=1.0)
+
+    app_module.ScheduleExecutor.execute_schedule(schedule_id)
+
+    assert last_log(app_module, schedule_id)['outcome'] == 'failed'
+    assert breakers.states()[SERIAL]['deferred_schedules'] == []
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Tests for the register codec: single-register encode/decode per format, scaling and signed
+words, packed times and whole-block payloads
+"""
+
+import pytest
+
+from codec import (CodecError, DECIMAL, register_format, encode, decode,
+                   encode_block, decode_block, round_trip)
+
+HEX_TIME = register_format(0, 'time')
+DEC_TIME = register_format(1, 'time')
+SIGNED = register_format(1, 'signed')
+BOOLEAN = register_format(1, 'boolean')
+TENTHS = register_format(1, 'decimal:0.1')
+SIGNED_TENTHS = register_format(1, 'signed:0.1')
+
+
+@pytest.mark.parametrize('fmt, value, word', [
+    (DECIMAL, 0, 0),
+    (DECIMAL, 65535, 0xFFFF),
+    (SIGNED, -1, 0xFFFF),
+    (SIGNED, -32768, 0x8000),
+    (SIGNED, 32767, 0x7FFF),
+    (BOOLEAN, 1, 1),
+    (HEX_TIME, 1915, 0x130F),
+    (HEX_TIME, 0, 0),
+    (DEC_TIME, 1915, 1915),
+    (TENTHS, 52.3, 523),
+    (SIGNED_TENTHS, -12.3, 0xFF85),
+])
+def test_round_trip(fmt, value, word):
+    assert encode(value, fmt) == word
+    assert decode(word, fmt) == value
+
+
+def test_scaled_values_decode_exactly():
+    # No float noise: 523 * 0.1 would otherwise be 52.300000000000004
+    assert decode(523, TENTHS) == 52.3
+    assert decode(encode('52.30', TENTHS), TENTHS) == 52.3
+
+
+def test_string_values_are_accepted():
+    assert encode('100') == 100
+    assert encode('-5', SIGNED) == 0xFFFB
+
+
+@pytest.mark.parametrize('fmt, value', [
+    (DECIMAL, 65536),
+    (DECIMAL, -1),
+    (DECIMAL, 1.5),
+    (DECIMAL, 'abc'),
+    (SIGNED, 32768),
+    (SIGNED, -32769),
+    (BOOLEAN, 2),
+    (HEX_TIME, 2400),
+    (HEX_TIME, 1960),
+])
+def test_unrepresentable_values_raise(fmt, value):
+    with pytest.raises(CodecError):
+        encode(value, fmt)
+
+
+def test_invalid_packed_time_word_is_returned_as_is():
+    # A word that isn't HH*256+mm was already HHmm
+    assert decode(0x3000, HEX_TIME) == 0x3000
+
+
+def test_register_format_parsing():
+    assert register_format(1, 'decimal:0.1') is TENTHS
+    assert register_format(None, None).plain
+    assert register_format(1, 'nonsense').kind == 'decimal'
+    assert register_format(1, 'decimal:x').scale is None
+    assert HEX_TIME.packed_time and not DEC_TIME.packed_time
+
+
+def test_block_round_trip():
+    formats = [DECIMAL, HEX_TIME, HEX_TIME, BOOLEAN, SIGNED, TENTHS]
+    values = [100, 1915, 630, 1, -20, 52.3]
+    payload = encode_block(values, formats)
+    assert payload == '0064130f061e0001ffec020b'
+    assert decode_block(payload, formats) == values
+    assert round_trip(values, formats) == []
+
+
+def test_block_accepts_strings_and_floats():
+    formats = [DECIMAL, DECIMAL]
+    assert encode_block(['1', 2.0], formats) == '00010002'
+
+
+def test_block_errors():
+    formats = [DECIMAL, SIGNED]
+    with pytest.raises(CodecError):
+        encode_block([1], formats)
+    with pytest.raises(CodecError):
+        encode_block([1, 40000], formats)
+    with pytest.raises(CodecError):
+        decode_block('0001', formats)
+    with pytest.raises(CodecError):
+        decode_block('zz01ffff', formats)
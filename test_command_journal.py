@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Tests for command journal recovery against grott_stub: entries an earlier process left pending are
+confirmed, replayed or abandoned, and entries this process has in flight are left alone
+"""
+
+import json
+
+import pytest
+
+SERIAL = 'NTCRBLR00Y'
+
+
+@pytest.fixture
+def journal(app_module, grott):
+    """add(command, process_id, age_seconds, schedule_id) -> id of a pending entry; settled() -> {id: state}"""
+    grott.initial = {1044: 2, 1060: 0, 1061: 0}
+
+    def add(command, process_id='earlier-process', age_seconds=10, schedule_id=None):
+        entry_id = f"entry-{add.count}"
+        add.count += 1
+        app_module.Database.execute(
+            """INSERT INTO command_journal (id, schedule_id, inverter_serial, command, state, created_at, process_id)
+               VALUES (?, ?, ?, ?, 'pending', datetime('now', ?), ?)""",
+            (entry_id, schedule_id, SERIAL, json.dumps(command), f'-{age_seconds} seconds', process_id)
+        )
+        return entry_id
+    add.count = 0
+    return add
+
+
+def recover(app_module):
+    """Run recovery and wait for the device worker and the journal writer to finish it"""
+    app_module.recover_command_journal()
+    app_module.DeviceWorkers.submit(SERIAL, lambda: None).result(timeout=30)
+    app_module.CommandJournal.write([("SELECT 1", ())])
+    return {row['id']: row['state'] for row in app_module.Database.fetch_all("SELECT id, state FROM command_journal")}
+
+
+def test_earlier_entries_are_settled(app_module, grott, journal):
+    landed = journal({'type': 'register', 'register': 1044, 'value': 2})
+    lost = journal({'type': 'register', 'register': 1060, 'value': 7})
+    stale = journal({'type': 'register', 'register': 1061, 'value': 9}, age_seconds=3600)
+    legacy = journal({'type': 'register', 'register': 1044, 'value': 2}, process_id=None)
+    read = journal({'type': 'read', 'register': 1044})
+    custom = journal({'type': 'custom', 'url': 'http://example.invalid/'})
+
+    states = recover(app_module)
+
+    assert states == {landed: 'confirmed', lost: 'replayed', stale: 'abandoned', legacy: 'confirmed',
+                      read: 'abandoned', custom: 'unknown'}
+    registers = grott.inverter(SERIAL)
+    assert registers[1060] == 7
+    assert registers[1061] == 0
+    assert grott.stats['writes'] == 1
+
+
+def test_disabled_schedule_is_not_replayed(app_module, grott, journal):
+    schedule_id = app_module.Database.execute(
+        "INSERT INTO schedules (name, schedule_type, time, command_type, enabled) VALUES ('charge', 'daily', '02:00', 'register', 0)"
+    ).lastrowid
+    entry = journal({'type': 'register', 'register': 1060, 'value': 7}, schedule_id=schedule_id)
+
+    assert recover(app_module) == {entry: 'abandoned'}
+    assert grott.stats['writes'] == 0
+    log = app_module.Database.fetch_one("SELECT outcome, success FROM execution_logs WHERE schedule_id = ?", (schedule_id,))
+    assert (log['outcome'], log['success']) == ('recovered', 0)
+
+
+def test_own_entries_are_left_alone(app_module, grott, journal):
+    # Written this second by this process: a command still being sent, not one a restart interrupted
+    own = journal({'type': 'register', 'register': 1060, 'value': 7},
+                  process_id=app_module.CommandJournal.process_id, age_seconds=0)
+    earlier = journal({'type': 'register', 'register': 1044, 'value': 2}, age_seconds=0)
+
+    assert recover(app_module) == {own: 'pending', earlier: 'confirmed'}
+    assert grott.stats['writes'] == 0
+
+
+def test_intent_records_process(app_module):
+    entry_id = app_module.CommandJournal.intent(None, SERIAL, {'type': 'read', 'register': 1044})
+    row = app_module.Database.fetch_one("SELECT state, process_id FROM command_journal WHERE id = ?", (entry_id,))
+    assert (row['state'], row['process_id']) == ('pending', app_module.CommandJournal.process_id)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Tests for condition expressions: parsing, precedence, the registers a condition reads,
+error messages, and the hysteresis margin event triggers evaluate with
+"""
+
+import pytest
+
+from conditions import compile_condition, legacy_expression, format_terms, ConditionError
+
+
+def evaluate(expression, values, margin=0.0):
+    return compile_condition(expression).evaluate(values, margin)[0]
+
+
+def test_registers_are_collected_once_and_sorted():
+    compiled = compile_condition("soc(1014) < 30 and priority(1044) != 2 or soc(1014) > 90")
+    assert compiled.registers == (1014, 1044)
+
+
+@pytest.mark.parametrize('expression, values, met', [
+    ("soc(1014) < 30", {1014: 20}, True),
+    ("soc(1014) < 30", {1014: 30}, False),
+    ("soc(1014) <= 30", {1014: 30}, True),
+    ("register(1044) = 2", {1044: 2}, True),
+    ("register(1044) == 2", {1044: 1}, False),
+    ("30 > soc(1014)", {1014: 20}, True),
+    ("soc(1014) < limit(1015)", {1014: 20, 1015: 25}, True),
+    ("soc(1014) < 30.5", {1014: 30.25}, True),
+    ("soc(1014) > -5", {1014: -4}, True),
+])
+def test_comparisons(expression, values, met):
+    assert evaluate(expression, values) is met
+
+
+def test_and_binds_tighter_than_or():
+    expression = "a(1) = 1 or a(2) = 1 and a(3) = 1"
+    assert evaluate(expression, {1: 1, 2: 0, 3: 0})
+    assert not evaluate(expression, {1: 0, 2: 1, 3: 0})
+    assert not evaluate("(a(1) = 1 or a(2) = 1) and a(3) = 1", {1: 1, 2: 0, 3: 0})
+
+
+def test_not_and_keywords_are_case_insensitive():
+    assert evaluate("NOT soc(1014) < 30", {1014: 50})
+    assert evaluate("not not soc(1014) < 30", {1014: 20})
+    assert evaluate("soc(1014) > 10 AND soc(1014) < 30", {1014: 20})
+
+
+def test_terms_report_each_comparison_evaluated():
+    met, terms = compile_condition("soc(1014) < 30 and priority(1044) != 2").evaluate({1014: 20, 1044: 1})
+    assert met
+    assert [term['term'] for term in terms] == ["soc(1014) < 30", "priority(1044) != 2"]
+    assert terms[0] == {'term': "soc(1014) < 30", 'left': 20, 'operator': '<', 'right': 30.0, 'met': True}
+    assert format_terms(terms, met) == "soc(1014) < 30: 20 < 30 = True; priority(1044) != 2: 1 != 2 = True => True"
+
+
+@pytest.mark.parametrize('expression, message', [
+    ("", "Empty condition"),
+    ("soc(1014) < 30 &", "Unexpected character"),
+    ("30 < 40", "at least one register"),
+    ("(soc(1014) < 30", "Expected )"),
+    ("soc(1014) < 30 soc(1014)", "Unexpected 'soc'"),
+    ("soc(1014) <", "found end of expression"),
+    ("soc(10.5) < 3", "Invalid register number"),
+    ("soc(1014) and 3", "Expected op"),
+])
+def test_invalid_expressions(expression, message):
+    with pytest.raises(ConditionError, match=message.replace('(', r'\(').replace(')', r'\)')):
+        compile_condition(expression)
+
+
+def test_compiled_conditions_are_cached_by_text():
+    assert compile_condition("soc(1014) < 31") is compile_condition("  soc(1014) < 31 ")
+
+
+def test_legacy_columns():
+    assert legacy_expression(1014, '<', '30') == "register(1014) < 30"
+    assert legacy_expression('1014', '>=', 12.5) == "register(1014) >= 12.5"
+    with pytest.raises(ConditionError):
+        legacy_expression(1014, '~', 30)
+    with pytest.raises(ConditionError):
+        legacy_expression(None, '<', 30)
+
+
+@pytest.mark.parametrize('expression, value, margin, met', [
+    # A met condition stays met until the value moves past the threshold by the margin
+    ("soc(1014) < 30", 32, 5, True),
+    ("soc(1014) < 30", 36, 5, False),
+    ("soc(1014) > 30", 28, 5, True),
+    ("soc(1014) > 30", 24, 5, False),
+    ("soc(1014) <= 30", 35, 5, True),
+    # Equality has no direction to widen
+    ("soc(1014) = 30", 31, 5, False),
+    # Negation widens the inner threshold the other way
+    ("not soc(1014) < 30", 28, 5, True),
+    ("not soc(1014) < 30", 24, 5, False),
+])
+def test_hysteresis_margin(expression, value, margin, met):
+    assert evaluate(expression, {1014: value}, margin) is met
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Tests for configuration values: PUT /api/config rejects values that can't be used before storing
+anything, and a bad value already stored falls back to its default instead of failing startup
+"""
+
+import pytest
+
+
+@pytest.fixture
+def client(app_module, monkeypatch):
+    monkeypatch.setattr(app_module.LogSetup, 'setup', lambda *args, **kwargs: None)
+    return app_module.app.test_client()
+
+
+def stored(appmod, key):
+    return appmod.Database.fetch_one("SELECT value FROM config WHERE key = ?", (key,))['value']
+
+
+def store(appmod, key, value):
+    appmod.Database.execute("UPDATE config SET value = ? WHERE key = ?", (value, key))
+
+
+@pytest.mark.parametrize('key, value', [
+    ('log_level', 'LOUD'),
+    ('log_levels', 'apscheduler=WARNING,werkzeug'),
+    ('log_levels', 'apscheduler=CHATTY'),
+    ('log_format', 'xml'),
+    ('log_max_bytes', 'ten'),
+    ('log_backup_count', '-1'),
+    ('log_sample_burst', '2.5'),
+    ('log_sample_seconds', 'nan'),
+    ('timezone', 'Mars/Olympus'),
+    ('circuit_window', '0'),
+    ('circuit_failure_threshold', '2'),
+    ('journal_commit_window_ms', 'inf'),
+    ('journal_retention_days', 'week'),
+    ('device_workers', '0'),
+    ('device_queue_size', 'x'),
+])
+def test_invalid_values_are_rejected(client, app_module, key, value):
+    before = stored(app_module, key)
+    response = client.put('/api/config', json=[{'key': 'max_retries', 'value': '3'}, {'key': key, 'value': value}])
+
+    assert response.status_code == 400
+    assert response.get_json()['error']
+    assert stored(app_module, key) == before
+    assert stored(app_module, 'max_retries') == '5'
+
+
+@pytest.mark.parametrize('key, value', [
+    ('log_level', 'debug'),
+    ('log_levels', 'apscheduler=ERROR, grott-scheduler.events=DEBUG'),
+    ('log_levels', ''),
+    ('log_max_bytes', '0'),
+    ('circuit_failure_threshold', '0.25'),
+    ('event_poll_seconds', ''),
+    ('device_workers', '2'),
+])
+def test_valid_values_are_stored(client, app_module, key, value):
+    response = client.put('/api/config', json=[{'key': key, 'value': value}])
+
+    assert response.status_code == 200
+    assert stored(app_module, key) == value
+
+
+def test_stored_bad_values_fall_back_to_defaults(app_module, monkeypatch):
+    calls = []
+    monkeypatch.setattr(app_module.LogSetup, 'setup', lambda *args, **kwargs: calls.append(kwargs))
+    for key, value in [('log_level', 'LOUD'), ('log_max_bytes', 'ten'), ('log_sample_seconds', ''),
+                       ('circuit_window', 'many'), ('journal_commit_window_ms', '-5')]:
+        store(app_module, key, value)
+
+    app_module.configure_logging()
+    app_module.configure_circuit_breakers()
+    app_module.configure_command_journal()
+
+    assert calls[0]['level'] == 'INFO'
+    assert calls[0]['max_bytes'] == 10 * 1024 * 1024
+    assert calls[0]['sample_seconds'] == 10
+    assert app_module.CircuitBreakers.window == 10
+    assert app_module.CommandJournal.commit_window == pytest.approx(0.005)
+
+
+def test_config_number():
+    import app
+    assert app.config_number({'retry_delay': ' 7 '}, 'retry_delay') == 7
+    assert app.config_number({'retry_delay': '7.5'}, 'retry_delay') == 10
+    assert app.config_number({}, 'circuit_failure_threshold') == 0.5
+    assert app.config_number({'circuit_failure_threshold': '0.2'}, 'circuit_failure_threshold') == 0.2
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Tests for custom command script steps: scripts must resolve inside custom_script_dir, a timeout or
+runaway output stops the script's whole session, and a command run from a pool worker runs in place
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+from custom_commands import CustomCommands, CustomCommandError
+
+
+@pytest.fixture
+def scripts(tmp_path, monkeypatch):
+    """write(name, body): an executable script in a fresh script_dir"""
+    script_dir = tmp_path / 'scripts'
+    script_dir.mkdir()
+    monkeypatch.setattr(CustomCommands, 'script_dir', str(script_dir.resolve()))
+    monkeypatch.setattr(CustomCommands, 'max_output', 1024)
+    monkeypatch.setattr(CustomCommands, 'counts', dict.fromkeys(CustomCommands.counts, 0))
+
+    def write(name, body):
+        path = script_dir / name
+        path.write_text(body)
+        path.chmod(0o755)
+        return path
+    write.dir = script_dir
+    return write
+
+
+def alive(pid: int) -> bool:
+    """Whether pid is a running (not exited or zombie) process"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+
+def test_script_in_dir_runs(scripts):
+    scripts('hello.sh', '#!/bin/sh\necho "hello $1"\n')
+    assert CustomCommands.execute({'script': 'hello.sh', 'args': ['world']}) == (True, 'hello world\n')
+
+
+def test_python_script_and_exit_status(scripts):
+    scripts('fail.py', 'import sys\nprint("no")\nsys.exit(3)\n')
+    success, result = CustomCommands.execute({'script': 'fail.py'})
+    assert not success
+    assert 'status 3' in result
+
+
+@pytest.mark.parametrize('name', ['../outside.sh', 'sub/../../outside.sh', '/bin/sh', 'missing.sh', '.'])
+def test_paths_outside_script_dir_are_rejected(scripts, name):
+    (scripts.dir.parent / 'outside.sh').write_text('#!/bin/sh\necho escaped\n')
+    (scripts.dir / 'sub').mkdir()
+    with pytest.raises(CustomCommandError):
+        CustomCommands.script_path(name)
+    success, result = CustomCommands.execute({'script': name})
+    assert not success
+    assert 'escaped' not in result
+
+
+def test_symlink_out_of_script_dir_is_rejected(scripts):
+    outside = scripts.dir.parent / 'outside.sh'
+    outside.write_text('#!/bin/sh\necho escaped\n')
+    outside.chmod(0o755)
+    (scripts.dir / 'link.sh').symlink_to(outside)
+    with pytest.raises(CustomCommandError):
+        CustomCommands.script_path('link.sh')
+
+
+def test_disabled_without_script_dir(scripts, monkeypatch):
+    scripts('hello.sh', '#!/bin/sh\necho hello\n')
+    monkeypatch.setattr(CustomCommands, 'script_dir', '')
+    success, result = CustomCommands.execute({'script': 'hello.sh'})
+    assert not success
+    assert 'disabled' in result
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc'), reason='needs /proc to check processes')
+def test_timeout_kills_process_group(scripts):
+    scripts('hang.sh', '#!/bin/sh\nsleep 30 &\necho $! > child.pid\nsleep 30\n')
+
+    start = time.monotonic()
+    success, result = CustomCommands.execute({'script': 'hang.sh', 'timeout': 1})
+    assert not success
+    assert 'did not finish within 1s' in result
+    assert time.monotonic() - start < 5
+    assert CustomCommands.counts['timeouts'] == 1
+
+    child = int((scripts.dir / 'child.pid').read_text())
+    deadline = time.monotonic() + 2
+    while alive(child) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not alive(child)
+
+
+def test_output_is_truncated(scripts):
+    scripts('chatty.sh', '#!/bin/sh\nhead -c 5000 /dev/zero | tr "\\0" x\n')
+    success, result = CustomCommands.execute({'script': 'chatty.sh'})
+    assert success
+    assert result == 'x' * 1024
+    assert CustomCommands.counts['truncated'] == 1
+
+
+def test_runaway_output_stops_script(scripts):
+    scripts('flood.sh', '#!/bin/sh\nwhile :; do echo xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx; done\n')
+    start = time.monotonic()
+    success, result = CustomCommands.execute({'script': 'flood.sh', 'timeout': 30})
+    assert not success
+    assert 'stopped after more than 1024 bytes' in result
+    assert time.monotonic() - start < 5
+    assert CustomCommands.counts['truncated'] == 1
+
+
+def test_run_from_pool_worker_runs_in_place(monkeypatch):
+    monkeypatch.setattr(CustomCommands, '_pool', None)
+    monkeypatch.setattr(CustomCommands, 'workers', 1)
+    threads = []
+
+    def execute(command_data):
+        threads.append(threading.current_thread())
+        return True, 'OK'
+    monkeypatch.setattr(CustomCommands, 'execute', execute)
+
+    def schedule():
+        outer = threading.current_thread()
+        return outer, CustomCommands.run({'url': 'http://example.invalid/'})
+
+    # One worker: a nested submit would wait for itself
+    outer, result = CustomCommands.submit(schedule).result(timeout=5)
+    assert result == (True, 'OK')
+    assert threads == [outer]
+
+    assert CustomCommands.run({'url': 'http://example.invalid/'}) == (True, 'OK')
+    assert threads[1] is not threading.current_thread()
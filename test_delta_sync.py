@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Tests for /api/sync: a client that keeps the returned version gets back only the records changed
+or deleted since then, whichever path made the change
+"""
+
+import pytest
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def add_schedule(client, name):
+    return client.post('/api/schedules', json={
+        'name': name, 'schedule_type': 'daily', 'time': '10:00', 'command_type': 'register',
+        'register_number': 1044, 'register_value': 2
+    }).get_json()['id']
+
+
+def sync(client, since=None, types=None):
+    query = '&'.join(f"{key}={value}" for key, value in (('since', since), ('types', types)) if value is not None)
+    response = client.get(f'/api/sync?{query}')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_full_sync_without_since(client):
+    kept = add_schedule(client, 'kept')
+
+    result = sync(client)
+    assert result['full']
+    assert [s['id'] for s in result['changes']['schedules']['changed']] == [kept]
+    assert result['changes']['registers']['changed']
+    assert any(c['key'] == 'timezone' for c in result['changes']['config']['changed'])
+
+
+def test_only_changed_and_deleted_since_version(client):
+    kept = add_schedule(client, 'kept')
+    edited = add_schedule(client, 'edited')
+    removed = add_schedule(client, 'removed')
+    version = sync(client)['version']
+
+    assert client.put(f'/api/schedules/{edited}', json={
+        'name': 'edited again', 'schedule_type': 'daily', 'time': '11:00', 'command_type': 'register',
+        'register_number': 1044, 'register_value': 1
+    }).status_code == 200
+    assert client.delete(f'/api/schedules/{removed}').status_code == 200
+    client.put('/api/config', json=[{'key': 'max_retries', 'value': '3'}])
+
+    result = sync(client, version)
+    assert not result['full']
+    assert result['version'] > version
+    assert set(result['changes']) == {'schedules', 'config'}
+    schedules = result['changes']['schedules']
+    assert [(s['id'], s['name']) for s in schedules['changed']] == [(edited, 'edited again')]
+    assert schedules['deleted'] == [removed]
+    assert [(c['key'], c['value']) for c in result['changes']['config']['changed']] == [('max_retries', '3')]
+    assert kept not in [s['id'] for s in schedules['changed']]
+
+    later = sync(client, result['version'])
+    assert later['changes'] == {}
+    assert later['version'] == result['version']
+
+
+def test_changes_outside_the_api_are_included(client, app_module):
+    schedule_id = add_schedule(client, 'ran')
+    version = sync(client)['version']
+
+    app_module.Database.execute("UPDATE schedules SET last_executed_at = CURRENT_TIMESTAMP WHERE id = ?", (schedule_id,))
+
+    result = sync(client, version, 'schedules,registers')
+    assert [s['id'] for s in result['changes']['schedules']['changed']] == [schedule_id]
+    assert 'registers' not in result['changes']
+
+
+def test_types_filter_and_future_version(client):
+    add_schedule(client, 'one')
+    version = sync(client)['version']
+    add_schedule(client, 'two')
+
+    assert sync(client, version, 'config')['changes'] == {}
+    # A version the server never issued (e.g. after restoring an older database) means start over
+    assert sync(client, version + 1000)['full']
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Tests for POST /api/schedules/<id>/execute: it runs the schedule on its worker and waits, answers
+404 for a schedule that doesn't exist and 503 only when the command queue is full
+"""
+
+import pytest
+
+from device_workers import DeviceQueueFull
+
+
+@pytest.fixture
+def schedule(app_module, grott):
+    response = app_module.app.test_client().post('/api/schedules', json={
+        'name': 'grid first', 'schedule_type': 'daily', 'time': '10:00', 'command_type': 'register',
+        'register_number': 1044, 'register_value': 2
+    })
+    return response.get_json()['id']
+
+
+def test_runs_schedule(app_module, grott, schedule):
+    response = app_module.app.test_client().post(f'/api/schedules/{schedule}/execute')
+
+    assert response.status_code == 200
+    assert grott.inverter('NTCRBLR00Y')[1044] == 2
+
+
+def test_missing_schedule_is_404(app_module, grott):
+    response = app_module.app.test_client().post('/api/schedules/999/execute')
+
+    assert response.status_code == 404
+    assert grott.stats['requests'] == 0
+
+
+def test_full_queue_is_503(app_module, grott, schedule, monkeypatch):
+    def submit(serial, func, *args, **kwargs):
+        raise DeviceQueueFull(f"Command queue for {serial} is full (20 pending)")
+    monkeypatch.setattr(app_module.DeviceWorkers, 'submit', submit)
+
+    response = app_module.app.test_client().post(f'/api/schedules/{schedule}/execute')
+
+    assert response.status_code == 503
+    log = app_module.Database.fetch_one("SELECT outcome FROM execution_logs WHERE schedule_id = ?", (schedule,))
+    assert log['outcome'] == 'queue_full'
+    assert grott.stats['requests'] == 0
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Tests for the migration runner: upgrading a database created by the original schema, the
+online outcome backfill, re-running repeatable steps and rolling back a failed step
+"""
+
+import os
+import sqlite3
+
+import pytest
+
+from migrations import Migrator, Migration, MIGRATIONS, table_columns
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'schema.sql')
+
+# The tables as the first release created them: register_values keyed by register only,
+# no outcome column on execution_logs
+BASELINE = """
+CREATE TABLE config (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT UNIQUE NOT NULL,
+    value TEXT,
+    description TEXT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO config (key, value) VALUES ('inverter_serial', 'ABC123'), ('grott_host', '10.0.0.2');
+
+CREATE TABLE schedules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    description TEXT,
+    schedule_type TEXT NOT NULL,
+    time TEXT NOT NULL,
+    days_of_week TEXT,
+    specific_date TEXT,
+    command_type TEXT NOT NULL,
+    register_number INTEGER,
+    register_name TEXT,
+    register_value TEXT,
+    multiregister_start INTEGER,
+    multiregister_end INTEGER,
+    multiregister_value TEXT,
+    template_name TEXT,
+    custom_command TEXT,
+    condition_type TEXT,
+    condition_register INTEGER,
+    condition_operator TEXT,
+    condition_value TEXT,
+    enabled BOOLEAN DEFAULT 1,
+    pushover_enabled BOOLEAN DEFAULT 1,
+    inverter_serial TEXT,
+    parent_schedule_id INTEGER DEFAULT NULL,
+    execution_order INTEGER DEFAULT 0,
+    continue_on_parent_failure BOOLEAN DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_executed_at TIMESTAMP,
+    next_execution_at TIMESTAMP
+);
+INSERT INTO schedules (name, schedule_type, time, command_type, register_number, register_value)
+VALUES ('Grid first', 'daily', '06:00', 'register', 1044, '2');
+
+CREATE TABLE execution_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    schedule_id INTEGER,
+    schedule_name TEXT,
+    executed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    command TEXT,
+    success BOOLEAN,
+    attempts INTEGER DEFAULT 1,
+    response TEXT,
+    error_message TEXT,
+    condition_met BOOLEAN,
+    condition_details TEXT,
+    parent_execution_id INTEGER DEFAULT NULL,
+    execution_order INTEGER DEFAULT 0
+);
+INSERT INTO execution_logs (schedule_id, schedule_name, success, condition_met) VALUES
+    (1, 'Grid first', 1, 1), (1, 'Grid first', 0, 1), (1, 'Grid first', 1, 0), (1, 'Grid first', 1, NULL), (1, 'Grid first', 0, 1);
+
+CREATE TABLE registers (
+    register_number INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT,
+    write_only BOOLEAN DEFAULT 0,
+    read_register INTEGER,
+    value_type TEXT,
+    type INTEGER DEFAULT 0,
+    min_value INTEGER,
+    max_value INTEGER,
+    category TEXT,
+    group_id INTEGER
+);
+INSERT INTO registers (register_number, name, value_type, type, group_id) VALUES
+    (1044, 'Priority Mode', 'decimal', 1, 1),
+    (1100, 'Battery First Start Time 1', 'time', 1, NULL),
+    (1102, 'Battery First Enable 1', 'boolean', 0, NULL),
+    (5000, 'Custom', 'decimal', 1, NULL);
+
+CREATE TABLE register_values (
+    register_number INTEGER PRIMARY KEY,
+    current_value INTEGER NOT NULL DEFAULT 0,
+    last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_read_from_inverter TIMESTAMP
+);
+INSERT INTO register_values (register_number, current_value) VALUES (1044, 2), (1070, 80);
+"""
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / 'scheduler.db')
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE)
+    conn.close()
+    return path
+
+
+def connect_to(path):
+    return lambda: sqlite3.connect(path)
+
+
+def query(path, sql, params=()):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+
+
+def test_upgrades_baseline_database(database):
+    migrator = Migrator(connect_to(database), SCHEMA_FILE)
+    assert migrator.migrate() == [m.version for m in MIGRATIONS if not m.online]
+
+    conn = sqlite3.connect(database)
+    try:
+        # register_values is keyed per inverter, the old values belonging to the default one
+        assert 'inverter_serial' in table_columns(conn, 'register_values')
+        assert conn.execute("SELECT inverter_serial, current_value FROM register_values WHERE register_number = 1044").fetchall() == [('ABC123', 2)]
+        assert conn.execute("SELECT current_value FROM register_values WHERE register_number = 1070").fetchone() == (80,)
+        # Columns added since the table was created, with their defaults on existing rows
+        assert {'timezone', 'condition_expression', 'trigger_expression'} <= set(table_columns(conn, 'schedules'))
+        assert conn.execute("SELECT window_minutes FROM schedules").fetchone() == (60,)
+        assert 'outcome' in table_columns(conn, 'execution_logs')
+        # Tables the first release didn't have, and seeded config
+        assert conn.execute("SELECT COUNT(*) FROM command_journal").fetchone() == (0,)
+        assert conn.execute("SELECT value FROM config WHERE key = 'grott_host'").fetchone() == ('10.0.0.2',)
+        assert conn.execute("SELECT COUNT(*) FROM config WHERE key = 'device_queue_size'").fetchone() == (1,)
+        # Registers from before groups existed are grouped and typed
+        groups = dict(conn.execute("SELECT register_number, group_id || '/' || type FROM registers "
+                                   "WHERE register_number IN (1044, 1100, 1102, 5000)").fetchall())
+        assert groups == {1044: '1/1', 1100: '4/0', 1102: '4/1', 5000: '1/1'}
+    finally:
+        conn.close()
+
+    assert migrator.migrate() == []
+
+
+def test_online_backfill(database):
+    migrator = Migrator(connect_to(database), SCHEMA_FILE)
+    migrator.migrate()
+    pending = migrator.pending_online()
+    assert [m.version for m in pending] == [m.version for m in MIGRATIONS if m.online]
+    assert migrator.status()['pending']
+
+    migrator.run_online(pending, batch_size=2, pause=0)
+
+    outcomes = [row[0] for row in query(database, "SELECT outcome FROM execution_logs ORDER BY id")]
+    assert outcomes == ['success', 'failed', 'condition_not_met', 'success', 'failed']
+    status = migrator.status()
+    assert status['pending'] == [] and status['version'] == status['latest']
+    assert migrator.pending_online() == []
+
+
+def test_repeatable_step_reruns_when_schema_changes(database, tmp_path):
+    Migrator(connect_to(database), SCHEMA_FILE).migrate()
+    changed = tmp_path / 'schema.sql'
+    with open(SCHEMA_FILE) as f:
+        changed.write_text(f.read() + "\nINSERT OR IGNORE INTO config (key, value) VALUES ('new_key', '1');\n")
+
+    repeatable = [m.version for m in MIGRATIONS if m.repeatable]
+    assert Migrator(connect_to(database), str(changed)).migrate() == repeatable
+    assert query(database, "SELECT value FROM config WHERE key = 'new_key'") == [('1',)]
+    assert Migrator(connect_to(database), str(changed)).migrate() == []
+
+
+def test_failed_step_rolls_back(database):
+    def create_then_fail(conn, schema):
+        conn.execute("CREATE TABLE half_done (id INTEGER)")
+        raise RuntimeError("boom")
+
+    migrator = Migrator(connect_to(database), SCHEMA_FILE, [
+        Migration(1, 'Works', lambda conn, schema: conn.execute("CREATE TABLE done (id INTEGER)")),
+        Migration(2, 'Fails', create_then_fail),
+    ])
+    with pytest.raises(RuntimeError):
+        migrator.migrate()
+
+    tables = {row[0] for row in query(database, "SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert 'done' in tables and 'half_done' not in tables
+    assert query(database, "SELECT version FROM schema_version") == [(1,)]
+
+
+def test_creates_new_database(tmp_path):
+    path = str(tmp_path / 'new.db')
+    migrator = Migrator(connect_to(path), SCHEMA_FILE)
+    migrator.migrate()
+    assert query(path, "SELECT value FROM config WHERE key = 'inverter_serial'")
+    assert 'inverter_serial' in [row[1] for row in query(path, "PRAGMA table_info(register_values)")]
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Tests for register range reads against grott_stub: one multiregister request where grottserver
+supports it, single reads per inverter where it doesn't, and no fallback for transient failures
+"""
+
+import pytest
+
+SERIAL = 'NTCRBLR00Y'
+OTHER = 'OTHERINV01'
+
+
+@pytest.fixture
+def read(app_module, grott):
+    """read(start, end, serial): InverterCommand.read_register_range against the stub"""
+    config = app_module.InverterCommand.get_config()
+    base_url = f"http://{config['grott_host']}:{config['grott_port']}/inverter"
+    grott.initial = {1070: 100, 1071: 2300, 1072: 5}
+
+    def read(start, end, serial=SERIAL):
+        return app_module.InverterCommand.read_register_range(base_url, serial, start, end)
+    return read
+
+
+def test_multiregister_read(read, grott, app_module):
+    assert read(1070, 1072) == {1070: 100, 1071: 2300, 1072: 5}
+    assert grott.stats['multiregister_reads'] == 1
+    assert grott.stats['reads'] == 0
+    assert not app_module.multiregister_unsupported
+
+
+def test_rejected_command_falls_back_for_that_inverter_only(read, grott, app_module):
+    grott.configure(multiregister=False)
+
+    assert read(1070, 1072) == {1070: 100, 1071: 2300, 1072: 5}
+    assert app_module.multiregister_unsupported == {SERIAL}
+    assert grott.stats['reads'] == 3
+    assert app_module.CircuitBreakers.states()[SERIAL]['failures'] == 0
+
+    requests_before = grott.stats['requests']
+    read(1070, 1072)
+    assert grott.stats['requests'] - requests_before == 3
+
+    grott.configure(multiregister=True)
+    read(1070, 1072, OTHER)
+    assert grott.stats['multiregister_reads'] == 1
+
+
+def test_unusable_response_falls_back(read, grott, app_module, monkeypatch):
+    real_get = app_module.requests.get
+
+    class Garbled:
+        status_code = 200
+
+        def json(self):
+            return {'value': 'not hex'}
+
+    def get(url, **kwargs):
+        return Garbled() if 'multiregister' in url else real_get(url, **kwargs)
+    monkeypatch.setattr(app_module.requests, 'get', get)
+
+    assert read(1070, 1072) == {1070: 100, 1071: 2300, 1072: 5}
+    assert app_module.multiregister_unsupported == {SERIAL}
+
+
+def test_server_errors_do_not_fall_back(read, grott, app_module):
+    grott.configure(error_rate=1.0)
+    assert read(1070, 1072) == {}
+    assert not app_module.multiregister_unsupported
+
+    grott.configure(error_rate=0.0)
+    app_module.CircuitBreakers.probe(SERIAL)
+    assert read(1070, 1072) == {1070: 100, 1071: 2300, 1072: 5}
+    assert grott.stats['multiregister_reads'] == 1
+
+
+def test_transport_errors_do_not_fall_back(read, grott, app_module, monkeypatch):
+    def get(url, **kwargs):
+        raise app_module.requests.ConnectionError('connection refused')
+    monkeypatch.setattr(app_module.requests, 'get', get)
+
+    assert read(1070, 1072) == {}
+    assert not app_module.multiregister_unsupported
+
+
+def test_closing_circuit_retries_multiregister(read, grott, app_module):
+    grott.configure(multiregister=False)
+    read(1070, 1072)
+    grott.configure(multiregister=True)
+
+    app_module.CircuitBreakers.probe(SERIAL)
+    assert not app_module.multiregister_unsupported
+    read(1070, 1072)
+    assert grott.stats['multiregister_reads'] == 1
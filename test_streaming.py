@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Tests for streamed responses: a stream keeps its read transaction open until the last row is sent,
+and schedules must still be able to write meanwhile
+"""
+
+import time
+
+ROWS = 2000
+
+
+def add_logs(appmod, count=ROWS):
+    conn = appmod.Database.get_connection()
+    conn.executemany(
+        "INSERT INTO execution_logs (schedule_name, command, success, outcome) VALUES (?, '{}', 1, 'success')",
+        [(f"log {i}",) for i in range(count)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed_write(appmod):
+    start = time.monotonic()
+    appmod.Database.execute("UPDATE config SET value = 'Europe/London' WHERE key = 'timezone'")
+    return time.monotonic() - start
+
+
+def test_database_runs_in_wal_mode(app_module):
+    assert app_module.Database.fetch_one("PRAGMA journal_mode")[0] == 'wal'
+
+
+def test_write_while_iterating(app_module):
+    add_logs(app_module)
+    rows = app_module.Database.iterate("SELECT * FROM execution_logs", batch_size=100)
+    assert next(rows)['schedule_name'] == 'log 0'
+
+    assert timed_write(app_module) < 1
+    assert app_module.Database.fetch_one("SELECT value FROM config WHERE key = 'timezone'")['value'] == 'Europe/London'
+    assert sum(1 for _ in rows) == ROWS - 1
+
+
+def test_write_while_response_is_streaming(app_module):
+    add_logs(app_module)
+    response = app_module.app.test_client().get(f'/api/logs?limit={ROWS}', buffered=False)
+    body = iter(response.response)
+    first = next(body)
+
+    assert timed_write(app_module) < 1
+    rest = b''.join(body)
+    response.close()
+    assert (first + rest).count(b'"schedule_name"') == ROWS
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Tests for server-side value validation against grott_stub: values outside a register's range or
+format are rejected before any request reaches grottserver, whether sent directly, saved in a
+schedule or already stored in one
+"""
+
+import pytest
+
+SERIAL = 'NTCRBLR00Y'
+BLOCK = '0064' * 19
+
+
+@pytest.mark.parametrize('command', [
+    {'type': 'register', 'register': 1044, 'value': 3},
+    {'type': 'register', 'register': 1044, 'value': -1},
+    {'type': 'register', 'register': 1044, 'value': 'grid'},
+    {'type': 'register', 'register': 1044, 'value': ''},
+    {'type': 'register', 'register': 1090, 'value': 101},
+    {'type': 'register', 'register': 1080, 'value': 2575},
+    {'type': 'register', 'register': 1080, 'value': 2400},
+    {'type': 'register', 'register': 1080, 'value': '12:30'},
+    {'type': 'register', 'register': 'x', 'value': 1},
+    {'type': 'multiregister', 'start_register': 1070, 'end_register': 1088, 'value': BLOCK[:-4]},
+    {'type': 'multiregister', 'start_register': 1070, 'end_register': 1088, 'value': 'zz' + BLOCK[2:]},
+    {'type': 'multiregister', 'start_register': 1088, 'end_register': 1070, 'value': BLOCK},
+])
+def test_invalid_command_is_not_sent(app_module, grott, command):
+    success, response, attempts = app_module.InverterCommand.execute_command(command, SERIAL)
+
+    assert (success, attempts) == (False, 0)
+    assert response
+    assert grott.stats['requests'] == 0
+
+
+@pytest.mark.parametrize('command', [
+    {'type': 'register', 'register': 1044, 'value': 2},
+    {'type': 'register', 'register': 1080, 'value': 2230},
+])
+def test_valid_command_is_sent(app_module, grott, command):
+    success, response, attempts = app_module.InverterCommand.execute_command(command, SERIAL)
+
+    assert (success, attempts) == (True, 1)
+    assert grott.stats['writes'] + grott.stats['multiregister_writes'] == 1
+
+
+@pytest.mark.parametrize('register, value', [(1044, 5), (1080, 2575), (1090, 'fast')])
+def test_schedule_with_invalid_value_is_rejected(app_module, grott, register, value):
+    response = app_module.app.test_client().post('/api/schedules', json={
+        'name': 'bad', 'schedule_type': 'daily', 'time': '10:00', 'command_type': 'register',
+        'register_number': register, 'register_value': value
+    })
+
+    assert response.status_code == 400
+    assert str(register) in response.get_json()['error']
+    assert app_module.Database.fetch_one("SELECT COUNT(*) AS n FROM schedules")['n'] == 0
+
+
+def test_stored_invalid_value_fails_without_request(app_module, grott):
+    client = app_module.app.test_client()
+    schedule_id = client.post('/api/schedules', json={
+        'name': 'grid first', 'schedule_type': 'daily', 'time': '10:00', 'command_type': 'register',
+        'register_number': 1044, 'register_value': 2
+    }).get_json()['id']
+    # Edited in the database directly, past the API's checks
+    app_module.Database.execute("UPDATE schedules SET register_value = '9' WHERE id = ?", (schedule_id,))
+
+    app_module.ScheduleExecutor.execute_schedule(schedule_id)
+
+    log = app_module.Database.fetch_one(
+        "SELECT outcome, success, error_message FROM execution_logs WHERE schedule_id = ?", (schedule_id,))
+    assert (log['outcome'], log['success']) == ('invalid', 0)
+    assert 'above the maximum' in log['error_message']
+    assert grott.stats['requests'] == 0
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Tests for the write index: which schedules write which registers, kept current by update(),
+and the conflict sweep over their fire calendars
+"""
+
+import sqlite3
+from datetime import datetime
+
+import pytest
+import pytz
+
+from fire_calendar import FireCalendar
+from write_index import WriteIndex
+
+NOW = datetime(2024, 3, 4, 0, 0, tzinfo=pytz.utc)
+DAYS = 3
+
+
+def block_of(register):
+    return (1070, 1088) if 1070 <= register <= 1088 else None
+
+
+@pytest.fixture
+def schedules(tmp_path):
+    """add(id, time, register, value, serial): a daily UTC schedule in the table and the fire calendar"""
+    path = str(tmp_path / 'schedules.db')
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE schedules (id INTEGER PRIMARY KEY, enabled BOOLEAN, inverter_serial TEXT,
+                                            time TEXT, writes TEXT)""")
+    conn.commit()
+
+    def connect():
+        connection = sqlite3.connect(path)
+        connection.row_factory = sqlite3.Row
+        return connection
+
+    def writes_of(rows):
+        # writes is "register=value,register=value"
+        return [(row['inverter_serial'], {int(reg): int(value) for reg, value in
+                                          (pair.split('=') for pair in row['writes'].split(','))})
+                for row in rows]
+
+    def add(schedule_id, time, writes, serial='INV1', enabled=True):
+        conn.execute("INSERT OR REPLACE INTO schedules VALUES (?, ?, ?, ?, ?)",
+                     (schedule_id, enabled, serial, time, ','.join(f"{reg}={value}" for reg, value in writes.items())))
+        conn.commit()
+        FireCalendar.build(schedule_id, {'schedule_type': 'daily', 'time': time, 'timezone': 'UTC'}, NOW)
+        return schedule_id
+
+    def row(schedule_id):
+        connection = connect()
+        try:
+            return connection.execute("SELECT * FROM schedules WHERE id = ?", (schedule_id,)).fetchone()
+        finally:
+            connection.close()
+
+    add.row = row
+    WriteIndex.attach(connect, writes_of, block_of)
+    yield add
+    for (schedule_id,) in conn.execute("SELECT id FROM schedules"):
+        FireCalendar.invalidate(schedule_id)
+    conn.close()
+    WriteIndex.invalidate()
+
+
+def conflicts(**kwargs):
+    return WriteIndex.conflicts(5, DAYS, now=NOW, **kwargs)
+
+
+def test_different_values_close_together_conflict(schedules):
+    schedules(1, '06:00', {1044: 1})
+    schedules(2, '06:03', {1044: 2})
+    assert conflicts() == [{
+        'inverter_serial': 'INV1',
+        'schedule_ids': [1, 2],
+        'registers': [{'register': 1044, 'values': [1, 2]}],
+        'blocks': [],
+        'first': '2024-03-04T06:00:00+00:00',
+        'occurrences': DAYS
+    }]
+
+
+@pytest.mark.parametrize('second', [
+    (2, '06:03', {1044: 1}, 'INV1'),   # same value
+    (2, '06:10', {1044: 2}, 'INV1'),   # outside the window
+    (2, '06:03', {1044: 2}, 'INV2'),   # another inverter
+    (2, '06:03', {1045: 2}, 'INV1'),   # another register
+])
+def test_no_conflict(schedules, second):
+    schedules(1, '06:00', {1044: 1})
+    schedule_id, time, writes, serial = second
+    schedules(schedule_id, time, writes, serial)
+    assert conflicts() == []
+
+
+def test_window_edge_is_inclusive(schedules):
+    schedules(1, '06:00', {1044: 1})
+    schedules(2, '06:05', {1044: 2})
+    assert len(conflicts()) == 1
+
+
+def test_registers_and_blocks_are_grouped_per_pair(schedules):
+    schedules(1, '06:00', {1080: 600, 1081: 700, 1044: 1})
+    schedules(2, '06:01', {1080: 615, 1081: 700, 1044: 2})
+    [conflict] = conflicts()
+    assert conflict['registers'] == [{'register': 1044, 'values': [1, 2]}, {'register': 1080, 'values': [600, 615]}]
+    assert conflict['blocks'] == ['1070-1088']
+
+
+def test_focus_on_saved_schedules(schedules):
+    schedules(1, '06:00', {1044: 1})
+    schedules(2, '06:02', {1044: 2})
+    schedules(3, '12:00', {1044: 1})
+    schedules(4, '12:01', {1044: 0})
+    assert [c['schedule_ids'] for c in conflicts()] == [[1, 2], [3, 4]]
+    assert [c['schedule_ids'] for c in conflicts(schedule_ids=[4])] == [[3, 4]]
+    assert [c['schedule_ids'] for c in conflicts(schedule_ids=[1])] == [[1, 2]]
+
+
+def test_filters(schedules):
+    schedules(1, '06:00', {1044: 1, 1090: 10})
+    schedules(2, '06:02', {1044: 2, 1090: 20})
+    schedules(3, '06:00', {1044: 1}, serial='INV2')
+    schedules(4, '06:01', {1044: 2}, serial='INV2')
+    assert [c['inverter_serial'] for c in conflicts(serial='INV2')] == ['INV2']
+    [conflict] = conflicts(serial='INV1', registers=[1090])
+    assert conflict['registers'] == [{'register': 1090, 'values': [10, 20]}]
+
+
+def test_update_keeps_index_current(schedules):
+    schedules(1, '06:00', {1044: 1})
+    schedules(2, '06:10', {1044: 2})
+    assert conflicts() == []
+    assert WriteIndex.writers('INV1', 1044) == {1: 1, 2: 2}
+
+    # Moved into the window
+    schedules(2, '06:04', {1044: 2})
+    WriteIndex.update({2: schedules.row(2)})
+    assert len(conflicts()) == 1
+
+    # Disabled, then deleted
+    schedules(2, '06:04', {1044: 2}, enabled=False)
+    WriteIndex.update({2: schedules.row(2)})
+    assert conflicts() == [] and WriteIndex.writers('INV1', 1044) == {1: 1}
+    WriteIndex.update({1: None})
+    assert WriteIndex.writers('INV1', 1044) == {}
+
+
+def test_block_writers_and_stats(schedules):
+    schedules(1, '06:00', {1080: 600, 1044: 1})
+    schedules(2, '07:00', {1081: 700, 1044: 1})
+    assert WriteIndex.block_writers('INV1', 1070, 1088) == {1: {1080: 600}, 2: {1081: 700}}
+    assert WriteIndex.stats() == {'schedules': 2, 'registers': 3, 'shared_registers': 1}
+
+
+def test_disabled_rows_are_not_loaded(schedules):
+    schedules(1, '06:00', {1044: 1})
+    schedules(2, '06:01', {1044: 2}, enabled=False)
+    WriteIndex.invalidate()
+    assert conflicts() == []
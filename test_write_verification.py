@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for read-after-write verification against grott_stub: a write that didn't land is found by
+the batched read-back, re-sent, and logged verify_failed once verify_retries are used up
+"""
+
+import pytest
+
+SERIAL = 'NTCRBLR00Y'
+
+
+@pytest.fixture
+def schedule(app_module, grott):
+    """A schedule writing Grid First (1044 = 2) with verification on; returns its id"""
+    grott.initial = {1044: 0}
+    for key, value in (('verify_writes', '1'), ('verify_delay_seconds', '0'), ('verify_retries', '1')):
+        app_module.Database.execute("UPDATE config SET value = ? WHERE key = ?", (value, key))
+    response = app_module.app.test_client().post('/api/schedules', json={
+        'name': 'grid first', 'schedule_type': 'daily', 'time': '10:00', 'command_type': 'register',
+        'register_number': 1044, 'register_value': 2
+    })
+    return response.get_json()['id']
+
+
+def run(appmod, schedule_id):
+    appmod.ScheduleExecutor.execute_schedule(schedule_id)
+    return appmod.Database.fetch_one(
+        "SELECT outcome, success, attempts, response, error_message FROM execution_logs WHERE schedule_id = ? ORDER BY id DESC LIMIT 1",
+        (schedule_id,)
+    )
+
+
+def test_landed_write_is_read_back_once(app_module, grott, schedule):
+    log = run(app_module, schedule)
+    assert (log['outcome'], log['success']) == ('success', 1)
+    assert grott.stats['writes'] == 1
+    assert grott.stats['reads'] + grott.stats['multiregister_reads'] == 1
+
+
+def test_mismatch_is_resent(app_module, grott, schedule):
+    grott.configure(drop_writes=1)
+
+    log = run(app_module, schedule)
+    assert (log['outcome'], log['success']) == ('success', 1)
+    assert grott.stats['writes'] == 2
+    assert grott.stats['reads'] + grott.stats['multiregister_reads'] == 2
+    assert grott.inverter(SERIAL)[1044] == 2
+
+
+def test_mismatch_after_retries_is_verify_failed(app_module, grott, schedule):
+    grott.configure(drop_writes=10)
+
+    log = run(app_module, schedule)
+    assert (log['outcome'], log['success']) == ('verify_failed', 0)
+    assert 'register 1044 is 0, expected 2' in log['error_message']
+    # The original write plus one re-send, each read back
+    assert grott.stats['writes'] == 2
+    assert grott.stats['reads'] + grott.stats['multiregister_reads'] == 2
+    assert grott.inverter(SERIAL)[1044] == 0